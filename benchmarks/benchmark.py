@@ -0,0 +1,321 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+"""
+Measure the scan performance against local stand-ins for the probe tools:
+fake ping and arping executables and a fake DNS resolver, each case runs in
+a new process with an empty database
+"""
+
+import argparse
+import functools
+import json
+import os
+import os.path
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIR_FAKEBIN = os.path.join(DIR_BENCHMARKS, 'fakebin')
+# The modules are imported from the source tree
+sys.path.insert(0, os.path.dirname(DIR_BENCHMARKS))
+from nimn.constants import (ENGINES_LIST,  # noqa: E402
+                            ENGINE_SOCKETS,
+                            ENGINE_THREADS,
+                            TOOL_TCP,
+                            TOOLS_LIST)
+from fake_resolver import FakeResolver  # noqa: E402
+
+# Benchmarking network from RFC 2544
+BENCHMARK_NETWORK = '198.18.0.0'
+CASE_SCAN = 'do_scan'
+# The TCP tool has no ports to check without a listener on each host
+TOOLS_BENCHMARK = tuple(tool for tool in TOOLS_LIST if tool != TOOL_TCP)
+CASES_LIST = (CASE_SCAN, ) + TOOLS_BENCHMARK
+# The sockets engine sends real packets instead of using the stand-ins
+ENGINES_BENCHMARK = tuple(engine for engine in ENGINES_LIST
+                          if engine != ENGINE_SOCKETS)
+# Seconds between the threads count samples
+SAMPLE_INTERVAL = 0.01
+
+
+def parse_list(values, convert=str):
+    """Parse the values separated by , ignoring the empty items"""
+    return [convert(value.strip()) for value in values.split(',')
+            if value.strip()]
+
+
+def get_command_line():
+    """Parse the benchmark command line arguments"""
+    parser = argparse.ArgumentParser(description='Scan performance '
+                                                 'benchmark')
+    parser.add_argument('--sizes',
+                        type=str,
+                        default='24,20,16',
+                        action='store',
+                        help='network prefix lengths separated by , '
+                             '(default 24,20,16)')
+    parser.add_argument('--cases',
+                        type=str,
+                        default=','.join(CASES_LIST),
+                        action='store',
+                        help='cases separated by , from {cases}'.format(
+                            cases=', '.join(CASES_LIST)))
+    parser.add_argument('-E', '--engine',
+                        type=str,
+                        default=ENGINE_THREADS,
+                        choices=ENGINES_BENCHMARK,
+                        action='store',
+                        help='engine used to scan the hosts')
+    parser.add_argument('-W', '--workers',
+                        type=int,
+                        default=64,
+                        action='store',
+                        help='number of parallel workers')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.005,
+                        action='store',
+                        help='seconds before each fake reply')
+    parser.add_argument('--loss',
+                        type=int,
+                        default=50,
+                        action='store',
+                        help='percent of addresses without replies')
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=1,
+                        action='store',
+                        help='runs of each case, the fastest run is kept')
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        action='store',
+                        help='save the results as JSON')
+    parser.add_argument('-b', '--baseline',
+                        type=str,
+                        action='store',
+                        help='compare the results with a saved baseline')
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=0.1,
+                        action='store',
+                        help='max hosts per second fraction lost compared '
+                             'to the baseline (default 0.1)')
+    # Options for a single case in the child process
+    parser.add_argument('--case',
+                        type=str,
+                        action='store',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--size',
+                        type=int,
+                        action='store',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--resolver-port',
+                        type=int,
+                        action='store',
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def use_fake_resolver(port):
+    """Send the hostname queries of every engine to the fake resolver"""
+    from nimn.resolver import Resolver
+    import nimn.tools.hostname_resolver as hostname_resolver
+
+    def getfqdn(name=''):
+        answers = Resolver(nameservers=['127.0.0.1'], port=port).resolve(
+            [name])
+        return answers.get(name, (None, None))[0] or name
+
+    socket.getfqdn = getfqdn
+    hostname_resolver.read_nameservers = lambda: ['127.0.0.1']
+    hostname_resolver.Resolver = functools.partial(Resolver, port=port)
+
+
+def run_case(arguments):
+    """Run a single case and print its measures as JSON"""
+    use_fake_resolver(arguments.resolver_port)
+    from nimn.app import Application
+    from nimn.network import network_cidr
+    sys.argv = ['nimn.py',
+                '{network}/{size}'.format(network=BENCHMARK_NETWORK,
+                                          size=arguments.size),
+                '--engine', arguments.engine,
+                '--workers', str(arguments.workers),
+                '--timeout', '1',
+                '--quiet']
+    app = Application()
+    app.startup()
+    network = app.get_networks()[0]
+    for tool in TOOLS_BENCHMARK:
+        app.tools[tool].checks = 1
+        app.tools[tool].timeout = 1
+    # Sample the threads count during the case
+    threads = [threading.active_count()]
+    stopped = threading.Event()
+
+    def sample_threads():
+        while not stopped.wait(SAMPLE_INTERVAL):
+            # Exclude the sampler thread
+            threads.append(threading.active_count() - 1)
+
+    sampler = threading.Thread(target=sample_threads)
+    sampler.daemon = True
+    sampler.start()
+    started = time.time()
+    if arguments.case == CASE_SCAN:
+        results = app.do_scan(network)
+        alive = sum(1 for host in results.values() if host.alive)
+    else:
+        tool = app.tools[arguments.case]
+        tool.prepare()
+        for address in network.range():
+            tool.execute(address)
+        tool.start()
+        results = tool.process()
+        alive = sum(1 for (address, data) in results.items()
+                    if data.data and data.data != address)
+    wall_time = time.time() - started
+    stopped.set()
+    sampler.join()
+    app.detections_writer.close()
+    print(json.dumps({
+        'hosts': len(network.range()),
+        'alive': alive,
+        'wall_time': wall_time,
+        'hosts_per_second': len(network.range()) / wall_time,
+        # Kilobytes on Linux
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'threads': max(threads),
+    }))
+
+
+def run_benchmarks(arguments):
+    """Run each case in a new process and return the results"""
+    resolver = FakeResolver(latency=arguments.latency, loss=arguments.loss)
+    resolver.start()
+    config_dir = tempfile.mkdtemp(prefix='nimn-benchmark-')
+    results = {}
+    try:
+        for size in parse_list(arguments.sizes, int):
+            for case in parse_list(arguments.cases):
+                if case not in CASES_LIST:
+                    raise ValueError('Unknown case: {case}'.format(
+                        case=case))
+                # Use an empty database for each case
+                case_dir = os.path.join(config_dir,
+                                        '{case}-{size}'.format(case=case,
+                                                               size=size))
+                env = dict(os.environ)
+                env['PATH'] = os.pathsep.join((DIR_FAKEBIN, env['PATH']))
+                env['XDG_CONFIG_HOME'] = case_dir
+                env['FAKE_LATENCY'] = str(arguments.latency)
+                env['FAKE_LATENCY_MS'] = str(arguments.latency * 1000)
+                env['FAKE_LOSS'] = str(arguments.loss)
+                name = '{case}/{size}'.format(case=case, size=size)
+                for _ in range(max(arguments.repeat, 1)):
+                    output = subprocess.check_output(
+                        [sys.executable, os.path.abspath(__file__),
+                         '--case', case,
+                         '--size', str(size),
+                         '--engine', arguments.engine,
+                         '--workers', str(arguments.workers),
+                         '--resolver-port', str(resolver.port)],
+                        env=env)
+                    shutil.rmtree(case_dir, ignore_errors=True)
+                    measures = json.loads(
+                        output.decode('utf-8').strip().split('\n')[-1])
+                    if (name not in results or
+                            measures['hosts_per_second'] >
+                            results[name]['hosts_per_second']):
+                        results[name] = measures
+                print('{name:<16} {hosts:>7} hosts {wall_time:>9.2f} s '
+                      '{hosts_per_second:>10.1f} hosts/s '
+                      '{peak_rss:>9} KB {threads:>5} threads'.format(
+                          name=name, **results[name]))
+    finally:
+        resolver.stop()
+        shutil.rmtree(config_dir, ignore_errors=True)
+    return results
+
+
+def compare_baseline(results, baseline, tolerance):
+    """Print the changes from the baseline and return the regressions"""
+    regressions = []
+    for (name, measures) in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = (measures['hosts_per_second'] /
+                 baseline[name]['hosts_per_second'])
+        regressed = ratio < 1 - tolerance
+        print('{name:<16} {ratio:>+8.1%} hosts/s {rss:>+8.1%} peak RSS'
+              '{status}'.format(
+                  name=name,
+                  ratio=ratio - 1,
+                  rss=(float(measures['peak_rss']) /
+                       baseline[name]['peak_rss'] - 1),
+                  status='  REGRESSION' if regressed else ''))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    arguments = get_command_line()
+    if arguments.case:
+        run_case(arguments)
+        return 0
+    results = run_benchmarks(arguments)
+    report = {
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'settings': {
+            'engine': arguments.engine,
+            'workers': arguments.workers,
+            'latency': arguments.latency,
+            'loss': arguments.loss,
+            'repeat': arguments.repeat,
+        },
+        'results': results,
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as file_output:
+            json.dump(report, file_output, indent=2, sort_keys=True)
+    if arguments.baseline:
+        with open(arguments.baseline, 'r') as file_baseline:
+            baseline = json.load(file_baseline)
+        if baseline['settings'] != report['settings']:
+            print('The baseline was measured with different settings: '
+                  '{settings}'.format(settings=baseline['settings']))
+        if compare_baseline(results, baseline['results'],
+                            arguments.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
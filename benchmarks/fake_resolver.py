@@ -0,0 +1,127 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import heapq
+import select
+import socket
+import struct
+import threading
+import time
+
+from nimn.resolver import (DNS_HEADER,
+                           DNS_RECORD,
+                           DNS_FLAG_QR,
+                           DNS_FLAG_RD,
+                           DNS_TYPE_PTR,
+                           DNS_CLASS_IN,
+                           DNS_RCODE_NOERROR,
+                           DNS_RCODE_NXDOMAIN,
+                           read_name)
+
+# Flag for the recursion available in the responses
+DNS_FLAG_RA = 0x0080
+# TTL of the fake answers
+FAKE_TTL = 3600
+
+
+def is_lost(address, loss):
+    """Check if the address is in the reproducible loss percent"""
+    fields = [int(field) for field in address.split('.')]
+    return (fields[2] * 256 + fields[3]) * 37 % 100 < loss
+
+
+class FakeResolver(object):
+    """
+    Local DNS server answering the PTR queries after a latency, the
+    addresses lost by the fake tools get negative answers
+    """
+    def __init__(self, latency=0.005, loss=50):
+        self.latency = latency
+        self.loss = loss
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.port = self.socket.getsockname()[1]
+        # Responses to send as (due time, index, response, destination)
+        self.pending = []
+        self.queries = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.socket.close()
+
+    def serve(self):
+        """Receive the queries and send the responses when due"""
+        while not self.stopped.is_set():
+            timeout = 0.1
+            if self.pending:
+                timeout = min(timeout,
+                              max(self.pending[0][0] - time.time(), 0))
+            if select.select([self.socket], [], [], timeout)[0]:
+                (data, source) = self.socket.recvfrom(512)
+                response = self.get_response(data)
+                if response:
+                    self.queries += 1
+                    heapq.heappush(self.pending,
+                                   (time.time() + self.latency,
+                                    self.queries, response, source))
+            while self.pending and self.pending[0][0] <= time.time():
+                (_, _, response, destination) = heapq.heappop(self.pending)
+                self.socket.sendto(response, destination)
+
+    def get_response(self, data):
+        """Build the response for a PTR query, returns None if invalid"""
+        try:
+            (query_id, flags, questions, _, _, _) = DNS_HEADER.unpack_from(
+                data)
+            (name, offset) = read_name(data, DNS_HEADER.size)
+            (qtype, qclass) = struct.unpack_from('!HH', data, offset)
+        except (struct.error, ValueError):
+            return None
+        if flags & DNS_FLAG_QR or questions != 1 or qtype != DNS_TYPE_PTR:
+            return None
+        question = data[DNS_HEADER.size:offset + 4]
+        labels = name.split('.')
+        address = '.'.join(reversed(labels[:4]))
+        if (len(labels) != 6 or labels[4:] != ['in-addr', 'arpa'] or
+                is_lost(address, self.loss)):
+            return DNS_HEADER.pack(query_id,
+                                   DNS_FLAG_QR | DNS_FLAG_RD | DNS_FLAG_RA |
+                                   DNS_RCODE_NXDOMAIN,
+                                   1, 0, 0, 0) + question
+        hostname = b''
+        for label in ('host-' + address.replace('.', '-'), 'bench'):
+            hostname += struct.pack('!B', len(label)) + label.encode('ascii')
+        hostname += b'\x00'
+        # The answer name points to the question name
+        return (DNS_HEADER.pack(query_id,
+                                DNS_FLAG_QR | DNS_FLAG_RD | DNS_FLAG_RA |
+                                DNS_RCODE_NOERROR,
+                                1, 1, 0, 0) + question +
+                struct.pack('!H', 0xc000 | DNS_HEADER.size) +
+                DNS_RECORD.pack(DNS_TYPE_PTR, DNS_CLASS_IN, FAKE_TTL,
+                                len(hostname)) +
+                hostname)
@@ -18,7 +18,11 @@
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
 ##
 
+import cProfile
+import json
 import os.path
+import signal
+import socket
 import time
 from collections import OrderedDict
 
@@ -28,18 +32,69 @@ from .constants import (
     TOOL_PING,
     TOOL_ARPING,
     TOOL_HOSTNAME,
+    TOOL_TCP,
+    ENGINE_THREADS,
+    ENGINE_ASYNCIO,
+    ENGINE_SOCKETS,
+    ENGINE_BATCH,
+    OUTPUT_TABLE,
+    OUTPUT_CSV,
+    OUTPUT_NDJSON,
+    SCAN_PREVIOUS,
+    STORAGE_CHANGES,
     VERBOSE_LEVEL_QUIET,
     VERBOSE_LEVEL_HIGH,
     VERBOSE_LEVEL_DEBUG
 )
 from .settings import Settings
-from .dbhosts import DBHosts, MAC_ADDRESS, HOSTNAME
+from .dbhosts import (DBHosts,
+                      DetectionsWriter,
+                      ChangesWriter,
+                      MAC_ADDRESS,
+                      HOSTNAME)
 from .command_line import CommandLine
-from .network import Network, network_range, network_cidr
+from . import profiler
+from .discovery6 import Discovery6, MULTICAST_ALL_NODES
+from .metrics import (REGISTRY,
+                      QUEUE_DEPTH,
+                      ACTIVE_WORKERS,
+                      WORKERS_LIMIT,
+                      SCANS,
+                      SCAN_SECONDS,
+                      SCAN_HOSTS,
+                      SCAN_ALIVE,
+                      SCAN_RATE,
+                      SCAN_TIMESTAMP)
+from .passive import PassiveListener
+from .network import (Network,
+                      LinkNetwork,
+                      InterleavedTargets,
+                      TargetSpace)
+from .neighbours import get_neighbours
+from .pipeline import Pipeline, parse_stages, empty_results
+from .scheduler import Scheduler, parse_intervals
+from .tiers import TierSelector, parse_tiers
+from .output import TableWriter, CSVWriter, NDJSONWriter, host_record
 from .printf import printf
-from .tools.ping import Ping
-from .tools.arping import ARPing
-from .tools.hostname import Hostname
+from .tools.async_queue import asyncio
+from .tools.concurrency import (ConcurrencyController,
+                                InterfaceLimiter,
+                                RateLimiter,
+                                parse_limits)
+from .tools.ping import Ping, PingAsync
+from .tools.ping_socket import PingSocket
+from .tools.ping_batch import PingBatch
+from .tools.arping import ARPing, ARPingAsync
+from .tools.arping_socket import ARPingSocket, get_route_interface
+from .tools.arping_batch import ARPingBatch
+from .tools.hostname import Hostname, HostnameAsync
+from .tools.hostname_resolver import HostnameResolver
+from .tools.local_names import LocalNames
+from .tools.rtt_estimator import RttEstimator, MAX_RTO
+from .tools.tcp_connect import TcpConnect, parse_ports
+from .tools.socket_sweep import SocketSweep
+from .tools.tool_results import ToolResults, HostResults, is_alive
+
 
 class Application(object):
     def __init__(self):
@@ -49,145 +104,498 @@ class Application(object):
         self.settings = Settings(self.command_line)
         self.dbhosts = DBHosts(self.settings)
         self.check_command_line()
+        self.writers = {
+            OUTPUT_TABLE: TableWriter,
+            OUTPUT_CSV: CSVWriter,
+            OUTPUT_NDJSON: NDJSONWriter,
+        }
 
     def startup(self):
         """Configure the application during the startup"""
-        self.tools = {
-            TOOL_PING: Ping(self.settings),
-            TOOL_ARPING: ARPing(self.settings),
-            TOOL_HOSTNAME: Hostname(self.settings),
-        }
+        if self.arguments.engine == ENGINE_ASYNCIO:
+            # Use a single event loop for all the tools
+            self.tools = {
+                TOOL_PING: PingAsync(self.settings),
+                TOOL_ARPING: ARPingAsync(self.settings),
+                TOOL_HOSTNAME: HostnameAsync(self.settings),
+            }
+        elif self.arguments.engine == ENGINE_SOCKETS:
+            # Use native sockets where available
+            self.tools = {
+                TOOL_PING: PingSocket(self.settings),
+                TOOL_ARPING: ARPingSocket(self.settings),
+                TOOL_HOSTNAME: HostnameResolver(self.settings,
+                                                self.dbhosts),
+            }
+        elif self.arguments.engine == ENGINE_BATCH:
+            # Use a single batch tool process for each scan
+            self.tools = {
+                TOOL_PING: PingBatch(self.settings),
+                TOOL_ARPING: ARPingBatch(self.settings),
+                TOOL_HOSTNAME: Hostname(self.settings),
+            }
+        else:
+            # Use worker threads for each tool
+            self.tools = {
+                TOOL_PING: Ping(self.settings),
+                TOOL_ARPING: ARPing(self.settings),
+                TOOL_HOSTNAME: Hostname(self.settings),
+            }
+        if self.arguments.tcp_ports:
+            # The TCP connections use non-blocking sockets with every engine
+            self.tools[TOOL_TCP] = TcpConnect(self.settings)
+        # Tools used for the scans
+        self.tools_list = tuple(tool for tool in TOOLS_LIST
+                                if tool in self.tools)
+        # Complete the hostnames from the local names replies
+        self.local_names = (LocalNames(self.settings)
+                            if self.arguments.local_names else None)
+        # Limit the requests in flight for each tool
+        rate_limiter = (RateLimiter(self.arguments.rate)
+                        if self.arguments.rate else None)
+        for tool in self.tools_list:
+            self.tools[tool].controller = ConcurrencyController(
+                initial=self.arguments.workers,
+                maximum=(self.arguments.max_workers[tool]
+                         if self.arguments.adaptive else None),
+                adaptive=self.arguments.adaptive,
+                rate_limiter=rate_limiter)
+        for tool in self.tools_list:
+            # Metrics read from the tools when exposed
+            controller = self.tools[tool].controller
+            QUEUE_DEPTH.set_function((tool, ),
+                                     self.tools[tool].get_queue_depth)
+            ACTIVE_WORKERS.set_function(
+                (tool, ), lambda controller=controller: controller.running)
+            WORKERS_LIMIT.set_function(
+                (tool, ), lambda controller=controller: controller.limit)
+        if self.arguments.profile:
+            # Record the spans of the scan phases, the tools and the hosts
+            profiler.set_tracer(profiler.Tracer())
+        # Round trip times for each network and tool
+        self.estimators = {}
+        # Save the detections from a background thread
+        if self.arguments.storage == STORAGE_CHANGES:
+            self.detections_writer = ChangesWriter(self.settings)
+        else:
+            self.detections_writer = DetectionsWriter(self.settings)
+        if self.arguments.pipeline:
+            # Check each host through the pipeline stages
+            self.pipeline = Pipeline(tools=self.tools,
+                                     stages=self.arguments.stages,
+                                     settings=self.settings)
+        else:
+            self.pipeline = None
 
     def run(self):
         """Execute the application"""
-        if self.arguments.configuration:
-            # Use a saved configuration for network
-            networks_list = self.dbhosts.list_networks()
-            network = networks_list[self.arguments.network[0]]
-        else:
-            # Use the command line arguments for network
-            if '-' in self.arguments.network[0]:
-                # Network IP range
-                (ip1, ip2) = network_range(self.arguments.network[0])
-            elif '/' in self.arguments.network:
-                # Network CIDR
-                (ip1, ip2) = network_cidr(self.arguments.network[0])
-            else:
-                # Single IP address
-                ip1 = self.arguments.network[0]
-                ip2 = ip1
-            network = Network(name='-',
-                              ip1=ip1,
-                              ip2=ip2)
+        networks = self.get_networks()
         # Set tools parameters
-        for tool in TOOLS_LIST:
+        for tool in self.tools_list:
             self.tools[tool].interface = self.arguments.interface
             self.tools[tool].checks = self.arguments.checks
             self.tools[tool].timeout = self.arguments.timeout
-        results = OrderedDict()
+        if TOOL_TCP in self.tools:
+            self.tools[TOOL_TCP].ports = self.arguments.tcp_ports
+            self.tools[TOOL_TCP].port_timeout = self.arguments.tcp_timeout
+            self.tools[TOOL_TCP].max_sockets = self.arguments.tcp_sockets
+        if self.local_names:
+            self.local_names.interface = self.arguments.interface
+            self.local_names.checks = self.arguments.checks
+            self.local_names.timeout = self.arguments.timeout
+            self.local_names.rate_limiter = (
+                self.tools[TOOL_HOSTNAME].controller.rate_limiter)
+        if self.arguments.interface_workers:
+            # Limit the requests in flight for each interface
+            interface_limiter = InterfaceLimiter(
+                self.arguments.interface_workers)
+            for network in networks:
+                interface_limiter.add(self.get_network_interface(network),
+                                      network.range())
+            for tool in self.tools_list:
+                self.tools[tool].controller.interface_limiter = (
+                    interface_limiter)
+        if self.arguments.metrics_listen:
+            # Expose the metrics from a background thread
+            try:
+                REGISTRY.serve(*self.arguments.metrics_listen)
+            except socket.error as error:
+                self.settings.log_normal(
+                    'Unable to expose the metrics on {address}:{port}: '
+                    '{error}'.format(address=self.arguments.metrics_listen[0],
+                                     port=self.arguments.metrics_listen[1],
+                                     error=error))
+        # Results for each network
+        self.results = OrderedDict()
+        writer = self.writers[self.arguments.output_format](
+            flush_interval=self.arguments.flush_interval)
+        titled = len(networks) > 1
+        if self.arguments.tiers:
+            # Check the addresses in tiers from the hosts history
+            self.tier_selector = TierSelector(
+                settings=self.settings,
+                warm_every=self.arguments.tiers[0],
+                full_every=self.arguments.tiers[1],
+                warm_days=self.arguments.warm_days)
+        else:
+            self.tier_selector = None
+        cpu_profile = cProfile.Profile() if self.arguments.cprofile else None
+        if cpu_profile:
+            cpu_profile.enable()
+        try:
+            if self.arguments.passive:
+                self.run_passive(networks, writer)
+            elif self.arguments.daemon:
+                self.run_daemon(networks, writer, titled)
+            else:
+                self.run_watch(networks, writer, titled)
+        finally:
+            writer.close()
+            self.detections_writer.close()
+            if cpu_profile:
+                cpu_profile.disable()
+                cpu_profile.dump_stats(self.arguments.cprofile)
+            self.write_profile()
+        return self.results
+
+    def write_profile(self):
+        """Write the recorded spans to the profile file"""
+        if self.arguments.profile:
+            profiler.tracer.write(self.arguments.profile,
+                                  self.arguments.profile_format)
+
+    def run_watch(self, networks, writer, titled):
+        """Scan the networks once or again after each watch interval"""
+        while True:
+            # Keep only the spans of the last scan in watch mode
+            profiler.tracer.clear()
+            with profiler.tracer.span('scan', 'phase'):
+                self.write_scans(networks, writer, titled)
+            # Exit from loop
+            if not self.arguments.watch:
+                break
+            self.write_profile()
+            if self.arguments.output_format != OUTPUT_TABLE:
+                # Loop for watch mode without messages in the output
+                self.settings.log_normal(
+                    'Watch mode, sleeping for {wait} seconds'.format(
+                        wait=self.arguments.watch))
+                time.sleep(self.arguments.watch)
+            else:
+                # Loop for watch mode
+                printf('')
+                printf('Watch mode, sleeping for {wait} seconds...'.format(
+                           wait=self.arguments.watch), end='', flush=True)
+                time.sleep(self.arguments.watch)
+                printf(' scanning now')
+
+    def run_daemon(self, networks, writer, titled):
+        """Scan the networks on their schedule until SIGTERM is received"""
+        scheduler = Scheduler(settings=self.settings,
+                              overrun=self.arguments.overrun)
+        for network in networks:
+            scheduler.add(network=network,
+                          interval=self.arguments.intervals.get(
+                              network.name, self.arguments.intervals[None]),
+                          jitter=self.arguments.jitter)
+        # Stop after the running scans
+        signal.signal(signal.SIGTERM,
+                      lambda signum, frame: scheduler.stop())
         while True:
-            scan_results = self.do_scan(network)
-            # Prints command, output and errors
-            is_verbose = (self.command_line.arguments.verbose_level >=
-                          VERBOSE_LEVEL_HIGH)
-            for ip in scan_results:
-                for tool in TOOLS_LIST:
-                    if is_verbose or scan_results[ip][tool].error:
+            due_networks = scheduler.get_due()
+            if due_networks is None:
+                break
+            # Keep only the spans of the last scan
+            profiler.tracer.clear()
+            with profiler.tracer.span('scan', 'phase'):
+                self.write_scans(due_networks, writer, titled)
+            self.write_profile()
+            scheduler.reschedule()
+        self.settings.log_normal('Daemon stopped')
+
+    def run_passive(self, networks, writer):
+        """
+        Save and write the hosts found from the ARP and DHCP traffic until
+        SIGTERM is received or the capture file ends
+        """
+        listener = PassiveListener(settings=self.settings,
+                                   interface=self.arguments.interface,
+                                   filename=self.arguments.passive_file)
+        # Stop after the current frame
+        signal.signal(signal.SIGTERM,
+                      lambda signum, frame: listener.stop())
+        compares = dict((network, self.get_compare(network))
+                        for network in networks)
+        started = time.time()
+        scan_ids = dict((network, self.dbhosts.start_scan(
+                            network=str(network),
+                            options=json.dumps(self.get_scan_options(),
+                                               sort_keys=True)))
+                        for network in networks)
+        for network in networks:
+            self.results[str(network)] = OrderedDict()
+        writer.begin()
+        try:
+            for (ip, mac, hostname, source) in listener.listen():
+                for network in networks:
+                    if ip in network.range():
+                        break
+                else:
+                    # Host outside the networks
+                    continue
+                network_results = self.results[str(network)]
+                host = HostResults(alive=True,
+                                   latency=None,
+                                   mac=mac,
+                                   hostname=hostname or ip)
+                if ip in network_results:
+                    if (network_results[ip].mac == mac and
+                            hostname in (None, network_results[ip].hostname)):
+                        # Host already found
+                        continue
+                    # Merge results
+                    network_results[ip].merge(ip, host)
+                    host = network_results[ip]
+                else:
+                    network_results[ip] = host
+                self.settings.log_verbose(
+                    'Found {ip} from {source}'.format(ip=ip, source=source))
+                self.detections_writer.add_detection(
+                    scan_id=scan_ids[network],
+                    ip=ip,
+                    mac=host.mac,
+                    hostname=host.hostname,
+                    alive=host.alive)
+                # Compare data and write results
+                (host_symbol, detail_msg) = self.compare_host(
+                    ip, host, compares[network])
+                if host_symbol is None or (host_symbol == ' ' and
+                                           self.arguments.changed):
+                    continue
+                writer.write_host(host_record(
+                    timestamp=int(time.time()),
+                    network=str(network),
+                    status=host_symbol,
+                    ip=ip,
+                    mac=host.mac,
+                    hostname=host.hostname,
+                    alive=host.alive,
+                    latency=host.latency,
+                    message=detail_msg))
+                # Write each host as soon as it's found
+                writer.flush()
+        except (socket.error, IOError, ValueError) as error:
+            self.settings.log_normal(
+                'Unable to listen to the traffic: {error}'.format(
+                    error=error))
+        finally:
+            writer.end()
+            for network in networks:
+                hosts_count = len(self.results[str(network)])
+                self.finish_scan(network, scan_ids[network],
+                                 hosts_count, hosts_count, started)
+        self.settings.log_normal('Passive mode stopped')
+
+    def write_scans(self, networks, writer, titled):
+        """Scan the networks and write the results"""
+        is_verbose = (self.command_line.arguments.verbose_level >=
+                      VERBOSE_LEVEL_HIGH)
+        # Get data to compare
+        with profiler.tracer.span('compare', 'phase'):
+            compares = dict((network, self.get_compare(network))
+                            for network in networks)
+        # Get the addresses to check
+        with profiler.tracer.span('tiers', 'phase'):
+            targets = dict((network, self.get_tier_targets(network))
+                           for network in networks)
+        timestamp = int(time.time())
+        for (network, hosts) in self.scan_networks(networks, targets):
+            compare = compares[network]
+            if not self.arguments.collect:
+                # Keep only the results of the last scan
+                self.results[str(network)] = OrderedDict()
+            network_results = self.results.setdefault(str(network),
+                                                      OrderedDict())
+            writer.begin(title=(self.get_network_title(network)
+                                if titled else None))
+            for (ip, data) in hosts:
+                # Prints command, output and errors
+                for tool in self.tools_list:
+                    if is_verbose or data[tool].error:
                         self.settings.log_normal(
                             'IP: {ip} TOOL: {tool}'.format(ip=ip, tool=tool))
                     self.settings.log_verbose(
                         'Command line for IP {ip} [{tool}]: {data}'.format(
                             ip=ip,
                             tool=tool,
-                            data=scan_results[ip][tool].command))
+                            data=data[tool].command))
                     self.settings.log_verbose_max(
                         'Output: {output}'.format(
-                            output=scan_results[ip][tool].output))
-                    if is_verbose or scan_results[ip][tool].error:
+                            output=data[tool].output))
+                    if is_verbose or data[tool].error:
                         self.settings.log_normal(
                             'Error: {error}'.format(
-                                error=scan_results[ip][tool].error))
-            # Sum results in collect option
-            if self.arguments.collect:
-                for ip in scan_results:
+                                error=data[tool].error))
+                # Keep only the parsed results
+                host = HostResults.from_tools(data)
+                # Sum results in collect option
+                if self.arguments.collect:
                     # Add missing host
-                    if ip not in results:
-                        results[ip] = scan_results[ip]
+                    if ip not in network_results:
+                        network_results[ip] = host
                     # Merge results
-                    if scan_results[ip][TOOL_ARPING].data is not None:
-                        results[ip][TOOL_ARPING].data = (
-                            scan_results[ip][TOOL_ARPING].data)
-                    if scan_results[ip][TOOL_HOSTNAME].data != ip:
-                        results[ip][TOOL_HOSTNAME].data = (
-                            scan_results[ip][TOOL_HOSTNAME].data)
-            else:
-                results = scan_results
-            # Compare data or print results
-            if self.arguments.timestamp is not None:
-                compare = self.dbhosts.get_detections(self.arguments.timestamp)
-            printf('S IP Address          MAC address         Hostname'
-                   '                      Message')
-            printf('-' * 120)
-            for ip in results:
-                detail_msg = ''
-                host_mac = results[ip][TOOL_ARPING].data
-                if host_mac is None:
-                    host_mac = '-'
-                host_hostname = results[ip][TOOL_HOSTNAME].data
-                host_ping = results[ip][TOOL_PING].data
-                if self.arguments.timestamp is None:
-                    # No compare
-                    host_symbol = '>'
+                    network_results[ip].merge(ip, host)
+                    host = network_results[ip]
                 else:
-                    # Compare results
-                    if ip not in compare and (host_mac != '-'
-                                              or host_hostname
-                                              or host_ping):
-                        # New host but no information, skipped
-                        continue
-                    elif ip not in compare:
-                        # New host
-                        host_symbol = '+'
-                        detail_msg = 'New host added'
-                    elif host_mac == '-' and compare[ip][MAC_ADDRESS].data:
-                        host_symbol = '-'
-                        detail_msg = ('MAC address lost: {mac}').format(
-                                          mac=compare[ip][MAC_ADDRESS].data)
-                    elif (compare[ip][MAC_ADDRESS].data !=
-                            results[ip][TOOL_ARPING].data):
-                        host_symbol = 'M'
-                        detail_msg = ('MAC address changed: old {mac}').format(
-                                          mac=compare[ip][MAC_ADDRESS].data)
-                    elif (compare[ip][HOSTNAME].data !=
-                            results[ip][TOOL_HOSTNAME].data):
-                        host_symbol = 'h'
-                        detail_msg = ('Hostname changed: old {old}').format(
-                                          old=compare[ip][HOSTNAME].data)
-                    else:
-                        host_symbol = ' '
+                    network_results[ip] = host
+                # Compare data and write results
+                (host_symbol, detail_msg) = self.compare_host(ip, host,
+                                                              compare)
+                if host_symbol is None:
+                    continue
                 if host_symbol != ' ' or not self.arguments.changed:
-                    printf('{symbol} {ip:20}{mac:20}{hostname:30}{message}'.format(
-                           symbol=host_symbol,
-                           ip=ip,
-                           mac=host_mac,
-                           hostname=host_hostname,
-                           ping=host_ping,
-                           message=detail_msg
-                          ))
-            # Exit from loop
-            if not self.arguments.watch:
-                break
-            else:
-                # Loop for watch mode
-                printf('')
-                printf('Watch mode, sleeping for {wait} seconds...'.format(
-                           wait=self.arguments.watch), end='', flush=True)
-                time.sleep(self.arguments.watch)
-                printf(' scanning now')
-        return results
+                    with profiler.tracer.span('output', 'output', address=ip):
+                        writer.write_host(host_record(
+                            timestamp=timestamp,
+                            network=str(network),
+                            status=host_symbol,
+                            ip=ip,
+                            mac=host.mac,
+                            hostname=host.hostname,
+                            alive=host.alive,
+                            latency=host.latency,
+                            message=detail_msg))
+            writer.end()
+
+    def get_networks(self):
+        """Get the networks to scan"""
+        if self.arguments.ipv6:
+            # Discover the hosts on the interface link
+            return [LinkNetwork(name='-',
+                                interface=self.arguments.interface)]
+        elif self.arguments.configuration:
+            # Use the saved configurations for networks
+            networks_list = self.dbhosts.list_networks()
+            networks = [networks_list[name]
+                        for name in (sorted(networks_list)
+                                     if self.arguments.all_networks
+                                     else self.arguments.network)]
+        else:
+            # Use the command line arguments for networks
+            networks = [Network(name='-',
+                                ip1=targets[0],
+                                ip2=targets[-1],
+                                targets=targets)
+                        for targets in self.arguments.targets]
+        for network in networks:
+            for (first, last) in self.arguments.excluded.intervals:
+                # Exclude the addresses from the network
+                network.range().exclude(first, last)
+            if self.arguments.shard:
+                # Scan only a part of the network
+                network.targets = network.range().shard(
+                    *self.arguments.shard)
+        return networks
+
+    def get_tier_targets(self, network):
+        """
+        Get the target space to check in the tiers mode, returns None to
+        check all the addresses of the network
+        """
+        if not self.tier_selector:
+            return None
+        seen = (self.dbhosts.get_seen_state()
+                if self.arguments.storage == STORAGE_CHANGES
+                else self.dbhosts.get_seen_detections(str(network)))
+        return self.tier_selector.select(network, seen)
+
+    def get_network_interface(self, network):
+        """Get the interface used to reach the network"""
+        if self.arguments.interface or not len(network.range()):
+            return self.arguments.interface
+        try:
+            return get_route_interface(network.range()[0])
+        except IOError:
+            return None
+
+    def get_network_title(self, network):
+        """Get the network title for the output"""
+        if network.name == '-':
+            return str(network)
+        return '{name} ({network})'.format(name=network.name,
+                                           network=network)
+
+    def get_compare(self, network):
+        """Get the hosts data to compare for the network"""
+        if not self.arguments.scan and self.arguments.timestamp is None:
+            return None
+        compare_scan = self.get_compare_scan(network)
+        if compare_scan is None:
+            self.settings.log_normal(
+                'No scan found to compare for {network}'.format(
+                    network=network))
+            return {}
+        self.settings.log_verbose(
+            'Comparing {network} with scan {scan}'.format(network=network,
+                                                          scan=compare_scan))
+        return (self.dbhosts.get_state(compare_scan)
+                if self.arguments.storage == STORAGE_CHANGES
+                else self.dbhosts.get_detections(compare_scan))
+
+    def get_compare_scan(self, network):
+        """Get the ID of the scan to compare"""
+        if self.arguments.scan == SCAN_PREVIOUS:
+            return self.dbhosts.get_previous_scan(str(network))
+        elif self.arguments.scan:
+            return self.dbhosts.get_scan(int(self.arguments.scan))
+        else:
+            return self.dbhosts.get_scan_before(str(network),
+                                                self.arguments.timestamp)
+
+    def compare_host(self, ip, host, compare):
+        """
+        Compare the host results with the previous detection and return the
+        status symbol and message, or None to skip the host
+        """
+        detail_msg = ''
+        host_mac = host.mac
+        if host_mac is None:
+            host_mac = '-'
+        host_hostname = host.hostname
+        host_ping = host.alive
+        if compare is None:
+            # No compare
+            host_symbol = '>'
+        elif ip not in compare and (host_mac != '-'
+                                    or host_hostname
+                                    or host_ping):
+            # New host but no information, skipped
+            return (None, None)
+        elif ip not in compare:
+            # New host
+            host_symbol = '+'
+            detail_msg = 'New host added'
+        elif host_mac == '-' and compare[ip][MAC_ADDRESS]:
+            host_symbol = '-'
+            detail_msg = ('MAC address lost: {mac}').format(
+                              mac=compare[ip][MAC_ADDRESS])
+        elif compare[ip][MAC_ADDRESS] != host.mac:
+            host_symbol = 'M'
+            detail_msg = ('MAC address changed: old {mac}').format(
+                              mac=compare[ip][MAC_ADDRESS])
+        elif compare[ip][HOSTNAME] != host.hostname:
+            host_symbol = 'h'
+            detail_msg = ('Hostname changed: old {old}').format(
+                              old=compare[ip][HOSTNAME])
+        else:
+            host_symbol = ' '
+        return (host_symbol, detail_msg)
 
     def check_command_line(self):
         """Check command line arguments"""
+        # The all networks option uses the saved configurations
+        if self.arguments.all_networks:
+            self.arguments.configuration = True
         # Check verbose level
         self.arguments.verbose_level = min(max(self.arguments.verbose_level,
                                                VERBOSE_LEVEL_QUIET),
@@ -205,6 +613,8 @@ class Application(object):
         if not os.path.exists(FILE_HOSTS):
             self.dbhosts = DBHosts(self.settings)
             self.dbhosts.create_schema()
+        else:
+            self.dbhosts.update_schema()
         # Check command line arguments
         if self.arguments.list_configurations:
             # List networks list
@@ -212,42 +622,494 @@ class Application(object):
             for network in self.dbhosts.list_networks():
                 printf('  {network}'.format(network=network))
             self.command_line.parser.exit(1)
-        elif self.arguments.collect and not self.arguments.watch:
+        elif self.arguments.compact:
+            # Convert the detections to hosts changes
+            printf('Compacting the detections history')
+            self.dbhosts.compact()
+            self.command_line.parser.exit(0)
+        elif self.arguments.collect and not (self.arguments.watch or
+                                             self.arguments.daemon):
             # Check collect option
             self.command_line.parser.error(
-                'The collect (--collect) option requires watch (--watch) mode')
-        elif not self.arguments.network:
+                'The collect (--collect) option requires watch (--watch) '
+                'or daemon (--daemon) mode')
+        elif self.arguments.daemon and self.arguments.watch:
+            # Check daemon options
+            self.command_line.parser.error(
+                'The daemon (--daemon) and watch (--watch) modes cannot be '
+                'used together')
+        elif self.arguments.jitter < 0:
+            self.command_line.parser.error(
+                'The jitter (--jitter) cannot be negative')
+        elif self.arguments.flush_interval < 0:
+            self.command_line.parser.error(
+                'The flush interval (--flush-interval) cannot be negative')
+        elif self.arguments.tiers and not (self.arguments.watch or
+                                           self.arguments.daemon):
+            # Check tiers options
+            self.command_line.parser.error(
+                'The tiers (--tiers) option requires watch (--watch) '
+                'or daemon (--daemon) mode')
+        elif self.arguments.tiers and self.arguments.ipv6:
+            self.command_line.parser.error(
+                'The tiers (--tiers) option cannot be used with the IPv6 '
+                'discovery (--ipv6)')
+        elif self.arguments.warm_days < 0:
+            self.command_line.parser.error(
+                'The warm days (--warm-days) cannot be negative')
+        elif self.arguments.engine == ENGINE_ASYNCIO and asyncio is None:
+            # Check asyncio engine availability
+            self.command_line.parser.error(
+                'The asyncio engine (--engine) requires Python 3.4 or later')
+        elif self.arguments.pipeline and (
+                self.arguments.engine != ENGINE_THREADS or
+                self.arguments.neighbours):
+            # Check pipeline option
+            self.command_line.parser.error(
+                'The pipeline (--pipeline) option requires the threads '
+                'engine (--engine) without neighbours (--neighbours)')
+        elif self.arguments.max_workers and not self.arguments.adaptive:
+            # Check concurrency options
+            self.command_line.parser.error(
+                'The max workers (--max-workers) option requires the '
+                'adaptive (--adaptive) mode')
+        elif self.arguments.workers < 1:
+            self.command_line.parser.error(
+                'The workers (--workers) must be at least 1')
+        elif self.arguments.rate is not None and self.arguments.rate <= 0:
+            self.command_line.parser.error(
+                'The rate (--rate) must be greater than 0')
+        elif self.arguments.scan and self.arguments.timestamp is not None:
+            # Check compare options
+            self.command_line.parser.error(
+                'The scan (--scan) and timestamp (--timestamp) options '
+                'cannot be used together')
+        elif (self.arguments.scan and
+                self.arguments.scan != SCAN_PREVIOUS and
+                not self.arguments.scan.isdigit()):
+            # Check scan ID
+            self.command_line.parser.error(
+                'The scan (--scan) must be a scan ID or {previous}'.format(
+                    previous=SCAN_PREVIOUS))
+        elif self.arguments.ipv6 and not self.arguments.interface:
+            # Check IPv6 discovery options
+            self.command_line.parser.error(
+                'The IPv6 discovery (--ipv6) requires the interface '
+                '(--interface)')
+        elif self.arguments.ipv6 and (self.arguments.network or
+                                      self.arguments.configuration or
+                                      self.arguments.exclude or
+                                      self.arguments.shard or
+                                      self.arguments.neighbours or
+                                      self.arguments.pipeline):
+            self.command_line.parser.error(
+                'The IPv6 discovery (--ipv6) option cannot be used with '
+                'a network, neighbours (--neighbours) or pipeline '
+                '(--pipeline)')
+        elif self.arguments.all_networks and self.arguments.network:
+            # Check networks
+            self.command_line.parser.error(
+                'The all networks (--all) option cannot be used with '
+                'network names')
+        elif (self.arguments.scan and self.arguments.scan.isdigit() and
+                (len(self.arguments.network) > 1 or
+                 self.arguments.all_networks)):
+            self.command_line.parser.error(
+                'The scan ID (--scan) can be used only with a network')
+        elif (self.arguments.interface_workers is not None and
+                self.arguments.interface_workers < 1):
+            self.command_line.parser.error(
+                'The interface workers (--interface-workers) must be at '
+                'least 1')
+        elif self.arguments.local_names and (self.arguments.pipeline or
+                                             self.arguments.ipv6):
+            self.command_line.parser.error(
+                'The local names (--local-names) option cannot be used '
+                'with the pipeline (--pipeline) or the IPv6 discovery '
+                '(--ipv6)')
+        elif self.arguments.passive and (self.arguments.watch or
+                                         self.arguments.daemon or
+                                         self.arguments.ipv6 or
+                                         self.arguments.tiers):
+            # Check passive options
+            self.command_line.parser.error(
+                'The passive (--passive) mode cannot be used with watch '
+                '(--watch), daemon (--daemon), tiers (--tiers) or IPv6 '
+                'discovery (--ipv6)')
+        elif self.arguments.passive_file and not self.arguments.passive:
+            self.command_line.parser.error(
+                'The passive file (--passive-file) option requires the '
+                'passive (--passive) mode')
+        elif self.arguments.tcp_timeout <= 0:
+            self.command_line.parser.error(
+                'The TCP timeout (--tcp-timeout) must be greater than 0')
+        elif self.arguments.tcp_sockets < 1:
+            self.command_line.parser.error(
+                'The TCP sockets (--tcp-sockets) must be at least 1')
+        elif (not self.arguments.network and not self.arguments.ipv6 and
+                not self.arguments.all_networks):
             # Missing both networks list and network name
             self.command_line.parser.error('Network must be provided')
+        # Check network targets
+        try:
+            self.arguments.excluded = TargetSpace.parse(
+                ','.join(self.arguments.exclude or ()))
+            if not self.arguments.configuration and not self.arguments.ipv6:
+                self.arguments.targets = [
+                    TargetSpace.parse(network)
+                    for network in self.arguments.network]
+        except ValueError as error:
+            self.command_line.parser.error(
+                'Invalid network: {error}'.format(error=error))
+        if self.arguments.configuration and not self.arguments.ipv6:
+            networks_list = self.dbhosts.list_networks()
+            for name in self.arguments.network:
+                if name not in networks_list:
+                    self.command_line.parser.error(
+                        'Unknown network configuration: {name}'.format(
+                            name=name))
+            if not networks_list:
+                self.command_line.parser.error(
+                    'No saved network configurations')
+        elif not self.arguments.ipv6:
+            for (network, targets) in zip(self.arguments.network,
+                                          self.arguments.targets):
+                if not targets:
+                    self.command_line.parser.error(
+                        'Network has no addresses: {network}'.format(
+                            network=network))
+        # Check shard
+        if self.arguments.shard:
+            try:
+                (index, count) = [int(value) for value
+                                  in self.arguments.shard.split('/')]
+                if not 0 <= index < count:
+                    raise ValueError
+            except ValueError:
+                self.command_line.parser.error(
+                    'The shard (--shard) must be in the form INDEX/COUNT '
+                    'with INDEX from 0 to COUNT - 1')
+            self.arguments.shard = (index, count)
+        # Check daemon intervals
+        try:
+            self.arguments.intervals = parse_intervals(
+                self.arguments.interval or '')
+        except ValueError as error:
+            self.command_line.parser.error(
+                'Invalid interval (--interval): {error}'.format(error=error))
+        # Check tiers
+        if self.arguments.tiers:
+            try:
+                self.arguments.tiers = parse_tiers(self.arguments.tiers)
+            except ValueError as error:
+                self.command_line.parser.error(
+                    'Invalid tiers (--tiers): {error}'.format(error=error))
+        # Check metrics address
+        if self.arguments.metrics_listen:
+            (address, _, port) = self.arguments.metrics_listen.rpartition(':')
+            if not port.isdigit() or not 0 < int(port) < 65536:
+                self.command_line.parser.error(
+                    'The metrics listen (--metrics-listen) must be in the '
+                    'form [ADDRESS:]PORT')
+            self.arguments.metrics_listen = (address or '127.0.0.1',
+                                             int(port))
+        # Check max workers for each tool
+        try:
+            self.arguments.max_workers = parse_limits(
+                self.arguments.max_workers or '')
+        except ValueError as error:
+            self.command_line.parser.error(
+                'Invalid max workers (--max-workers): {error}'.format(
+                    error=error))
+        # Check pipeline stages
+        if self.arguments.pipeline:
+            try:
+                self.arguments.stages = parse_stages(self.arguments.pipeline)
+            except ValueError as error:
+                self.command_line.parser.error(
+                    'Invalid pipeline (--pipeline): {error}'.format(
+                        error=error))
+        # Check TCP ports
+        if self.arguments.tcp_ports:
+            try:
+                self.arguments.tcp_ports = parse_ports(
+                    self.arguments.tcp_ports)
+            except ValueError as error:
+                self.command_line.parser.error(
+                    'Invalid TCP ports (--tcp-ports): {error}'.format(
+                        error=error))
+        else:
+            self.arguments.tcp_ports = ()
+            if self.arguments.pipeline and any(
+                    TOOL_TCP in stage for stage in self.arguments.stages):
+                self.command_line.parser.error(
+                    'The tcp tool in the pipeline (--pipeline) requires the '
+                    'TCP ports (--tcp-ports)')
 
     def do_scan(self, network):
-        for tool in TOOLS_LIST:
+        """Scan the network and return the results for each host"""
+        return OrderedDict((address, HostResults.from_tools(data))
+                           for (address, data) in self.scan_hosts(network))
+
+    def scan_hosts(self, network):
+        """Scan the network and yield (address, data) for each host"""
+        for (_, hosts) in self.scan_networks([network]):
+            for host in hosts:
+                yield host
+
+    def scan_networks(self, networks, targets=None):
+        """
+        Scan the networks sharing the tools and yield (network, hosts) for
+        each network, where hosts yields (address, data) for each host,
+        targets optionally limits the addresses checked for each network
+        """
+        ranges = OrderedDict()
+        for network in networks:
+            if targets and targets.get(network) is not None:
+                ranges[network] = targets[network]
+            elif not self.arguments.ipv6:
+                ranges[network] = network.range()
+        for tool in self.tools_list:
+            if isinstance(self.tools[tool], SocketSweep):
+                # Keep the round trip times of each network between scans
+                self.tools[tool].estimators = [
+                    (ranges[network], self.estimators.setdefault(
+                        (str(network), tool),
+                        RttEstimator(max_rto=self.arguments.timeout or
+                                     MAX_RTO)))
+                    for network in ranges]
+        started = time.time()
+        with profiler.tracer.span('start_scan', 'database'):
+            scan_ids = dict((network, self.dbhosts.start_scan(
+                                network=str(network),
+                                options=json.dumps(self.get_scan_options(),
+                                                   sort_keys=True)))
+                            for network in networks)
+        if self.arguments.ipv6:
+            # The hosts are discovered with multicast requests
+            groups = [(networks[0], self.scan_link(networks[0].interface))]
+        elif len(networks) == 1:
+            if self.pipeline:
+                # Each host is yielded as soon as it completes the stages
+                hosts = self.pipeline.scan(ranges[networks[0]])
+            else:
+                # All the hosts are yielded when all the tools are completed
+                hosts = self.scan_tools(ranges[networks[0]])
+            groups = [(networks[0], hosts)]
+        else:
+            # The addresses of the networks are checked in turn
+            addresses = InterleavedTargets(list(ranges.values()))
+            groups = self.group_hosts(ranges,
+                                      self.pipeline.scan(addresses)
+                                      if self.pipeline
+                                      else self.scan_tools(addresses))
+        for (network, hosts) in groups:
+            yield (network, self.save_hosts(network, scan_ids[network],
+                                            hosts, started))
+        if self.arguments.retention is not None:
+            # Delete the old data
+            with profiler.tracer.span('retention', 'database'):
+                self.dbhosts.apply_retention(self.arguments.retention)
+        if self.arguments.adaptive or self.arguments.rate:
+            self.report_concurrency()
+        if self.arguments.metrics_file:
+            self.write_metrics()
+
+    def group_hosts(self, ranges, hosts):
+        """
+        Yield (network, hosts) for each network as soon as all the hosts of
+        its target space are completed
+        """
+        pending = OrderedDict((network, []) for network in ranges)
+        for network in ranges:
+            if not len(ranges[network]):
+                # Nothing to await for an empty network
+                yield (network, pending.pop(network))
+        for (address, data) in hosts:
+            for network in list(pending):
+                if address in ranges[network]:
+                    pending[network].append((address, data))
+                    if len(pending[network]) == len(ranges[network]):
+                        yield (network, pending.pop(network))
+
+    def save_hosts(self, network, scan_id, hosts, started):
+        """Save the detections for the hosts and yield (address, data)"""
+        hosts_count = 0
+        alive_count = 0
+        for (address, data) in hosts:
+            # Save detection
+            self.detections_writer.add_detection(
+                scan_id=scan_id,
+                ip=address,
+                mac=data[TOOL_ARPING].data,
+                hostname=data[TOOL_HOSTNAME].data,
+                alive=is_alive(data))
+            hosts_count += 1
+            if is_alive(data):
+                alive_count += 1
+            yield (address, data)
+        self.finish_scan(network, scan_id, hosts_count, alive_count, started)
+
+    def finish_scan(self, network, scan_id, hosts_count, alive_count,
+                    started):
+        """Save the end of the scan and update the scan metrics"""
+        # Await the detections to be saved
+        with profiler.tracer.span('end_scan', 'database', scan_id=scan_id):
+            self.detections_writer.flush()
+            self.dbhosts.end_scan(scan_id=scan_id,
+                                  hosts=hosts_count,
+                                  alive=alive_count)
+        # Update the scan metrics
+        ended = time.time()
+        labels = (str(network), )
+        SCANS.inc(labels)
+        SCAN_SECONDS.set(labels, ended - started)
+        SCAN_HOSTS.set(labels, hosts_count)
+        SCAN_ALIVE.set(labels, alive_count)
+        SCAN_RATE.set(labels, hosts_count / max(ended - started, 0.001))
+        SCAN_TIMESTAMP.set(labels, ended)
+
+    def report_concurrency(self):
+        """Show the workers and the packets rate reached by each tool"""
+        for tool in self.tools_list:
+            controller = self.tools[tool].controller
+            if controller.completed:
+                self.settings.log_normal(
+                    'Tool {tool} settled on {limit} workers at '
+                    '{rate:.1f} packets/s'.format(
+                        tool=tool,
+                        limit=controller.limit,
+                        rate=controller.get_rate()))
+
+    def write_metrics(self):
+        """Write the metrics file for the textfile collector"""
+        try:
+            REGISTRY.write_textfile(self.arguments.metrics_file)
+        except (IOError, OSError) as error:
+            self.settings.log_normal(
+                'Unable to write the metrics file {filename}: {error}'.format(
+                    filename=self.arguments.metrics_file,
+                    error=error))
+
+    def get_scan_options(self):
+        """Get the options used for the scan"""
+        return {
+            'engine': self.arguments.engine,
+            'interface': self.arguments.interface,
+            'checks': self.arguments.checks,
+            'timeout': self.arguments.timeout,
+            'workers': self.arguments.workers,
+            'adaptive': self.arguments.adaptive,
+            'rate': self.arguments.rate,
+            'neighbours': self.arguments.neighbours,
+            'pipeline': self.arguments.pipeline,
+            'storage': self.arguments.storage,
+            'ipv6': self.arguments.ipv6,
+            'tcp_ports': self.arguments.tcp_ports,
+            'local_names': self.arguments.local_names,
+            'passive': self.arguments.passive,
+        }
+
+    def scan_tools(self, addresses):
+        """Check all the addresses with each tool"""
+        # With the neighbours table the ARP requests are delayed after ping
+        delayed = (TOOL_ARPING, ) if self.arguments.neighbours else ()
+        for tool in self.tools_list:
             # Prepare the workers
             self.tools[tool].prepare()
         # Cycle over all the network addresses
-        for address in network.range():
+        for address in addresses:
             # Cycle over all the available tools
-            for tool in TOOLS_LIST:
-                # Check the host using the tool
-                self.tools[tool].execute(address)
+            for tool in self.tools_list:
+                if tool not in delayed:
+                    # Check the host using the tool
+                    self.tools[tool].execute(address)
         # Start the tools threads
-        for tool in TOOLS_LIST:
-            self.tools[tool].start()
-        # Awaits the tools to complete
-        for tool in TOOLS_LIST:
-            self.tools[tool].process()
-        # Sort data and print results
-        results = OrderedDict()
-        for address in network.range():
+        for tool in self.tools_list:
+            if tool not in delayed:
+                self.tools[tool].start()
+        if self.local_names:
+            # Query the local names while the tools are running
+            self.local_names.start(addresses)
+        if delayed:
+            # Awaits the ping tool to fill the neighbours table
+            self.tools[TOOL_PING].process()
+            neighbours = get_neighbours(self.arguments.interface)
+            self.settings.log_verbose(
+                'Found {count} hosts in the neighbours table'.format(
+                    count=len(neighbours)))
+            # Check only the hosts missing from the neighbours table
+            for address in addresses:
+                if address not in neighbours:
+                    self.tools[TOOL_ARPING].execute(address)
+            self.tools[TOOL_ARPING].start()
+            for tool in self.tools_list:
+                if tool != TOOL_PING:
+                    self.tools[tool].process()
+            for address in addresses:
+                if address in neighbours:
+                    self.tools[TOOL_ARPING].results[address] = ToolResults(
+                        neighbours[address], 'neighbours table', '', '')
+        else:
+            # Awaits the tools to complete
+            for tool in self.tools_list:
+                with profiler.tracer.span('process', 'phase', tool=tool):
+                    self.tools[tool].process()
+        if self.local_names:
+            # Use the local names for the hosts without a DNS name
+            hostnames = self.tools[TOOL_HOSTNAME].results
+            for (address, results) in self.local_names.process().items():
+                if hostnames[address].data in (None, address):
+                    hostnames[address] = results
+        # Get results for each address
+        for address in addresses:
             data = {}
-            for tool in TOOLS_LIST:
+            for tool in self.tools_list:
                 # Get results for the tool
                 data[tool] = self.tools[tool].results[address]
-            results[address] = data
-        # Save detections
-        for ip in results:
-            self.dbhosts.add_detection(ip=ip,
-                                       mac=results[ip][TOOL_ARPING].data,
-                                       hostname=results[ip][TOOL_HOSTNAME].data
-                                      )
-        return results
+            yield (address, data)
+
+    def scan_link(self, interface):
+        """Discover the IPv6 hosts on the interface link"""
+        replies = Discovery6(settings=self.settings,
+                             interface=interface,
+                             timeout=self.arguments.timeout,
+                             checks=self.arguments.checks).discover()
+        neighbours = get_neighbours(interface, socket.AF_INET6)
+        self.settings.log_verbose(
+            'Found {count} IPv6 hosts on {interface}'.format(
+                count=len(replies),
+                interface=interface))
+        addresses = sorted(replies,
+                           key=lambda address: socket.inet_pton(
+                               socket.AF_INET6, address))
+        tool = self.tools[TOOL_HOSTNAME]
+        tool.prepare()
+        for address in addresses:
+            tool.execute(address)
+        tool.start()
+        tool.process()
+        for address in addresses:
+            if replies[address] is None:
+                # Host found only from the multicast listener report
+                ping = ToolResults(True, 'MLD listener query', '', '')
+            else:
+                latency = replies[address] * 1000
+                ping = ToolResults(
+                    True,
+                    'ICMPv6 echo request to {destination}'.format(
+                        destination=MULTICAST_ALL_NODES),
+                    'Reply from {address}: time={latency:.3f} ms'.format(
+                        address=address,
+                        latency=latency).encode('utf-8'),
+                    '',
+                    latency)
+            data = {
+                TOOL_PING: ping,
+                TOOL_ARPING: ToolResults(neighbours.get(address),
+                                         'neighbours table', '', ''),
+                TOOL_HOSTNAME: tool.results[address],
+            }
+            if TOOL_TCP in self.tools:
+                data[TOOL_TCP] = empty_results(TOOL_TCP, address)
+            yield (address, data)
@@ -24,10 +24,23 @@ from .constants import (
     VERBOSE_LEVEL_QUIET,
     VERBOSE_LEVEL_NORMAL,
     TOOLS_LIST,
+    ENGINE_THREADS,
+    ENGINES_LIST,
+    OUTPUT_TABLE,
+    OUTPUT_FORMATS_LIST,
+    SCAN_PREVIOUS,
+    STORAGE_FULL,
+    STORAGES_LIST,
+    OVERRUN_SKIP,
+    OVERRUNS_LIST,
     APP_NAME,
     APP_VERSION,
     APP_DESCRIPTION,
 )
+from .profiler import PROFILE_CHROME, PROFILE_FORMATS_LIST
+from .tiers import DEFAULT_WARM_DAYS
+from .tools.tcp_connect import (DEFAULT_TIMEOUT as DEFAULT_TCP_TIMEOUT,
+                                DEFAULT_MAX_SOCKETS as DEFAULT_TCP_SOCKETS)
 
 
 class CommandLine(object):
@@ -39,7 +52,10 @@ class CommandLine(object):
                                  type=str,
                                  nargs='*',
                                  action='store',
-                                 help='network name or network range')
+                                 help='network names or network targets '
+                                      'as addresses, ranges and CIDRs '
+                                      'separated by commas, the items '
+                                      'starting with ! are excluded')
         # Optional arguments
         self.parser.add_argument('-V', '--version',
                                  dest='version',
@@ -52,6 +68,10 @@ class CommandLine(object):
                                  dest='configuration',
                                  action='store_true',
                                  help='use saved configuration for network name')
+        self.parser.add_argument('-a', '--all',
+                                 dest='all_networks',
+                                 action='store_true',
+                                 help='scan all the saved networks')
         # Define options for output level
         parser_group = self.parser.add_argument_group(
             'arguments for output level')
@@ -72,6 +92,25 @@ class CommandLine(object):
                                   dest='interface',
                                   action='store',
                                   help='interface name to use')
+        parser_group.add_argument('-x', '--exclude',
+                                  type=str,
+                                  dest='exclude',
+                                  action='append',
+                                  help='addresses, ranges or CIDRs to '
+                                       'exclude from the network')
+        parser_group.add_argument('--shard',
+                                  type=str,
+                                  default=None,
+                                  dest='shard',
+                                  action='store',
+                                  help='scan only a part of the network in '
+                                       'the form INDEX/COUNT (e.g. 0/4)')
+        parser_group.add_argument('-6', '--ipv6',
+                                  dest='ipv6',
+                                  action='store_true',
+                                  help='discover the IPv6 hosts on the '
+                                       'interface link with multicast '
+                                       'requests instead of a network')
         parser_group.add_argument('-n', '--count',
                                   type=int,
                                   default=1,
@@ -83,21 +122,134 @@ class CommandLine(object):
                                   default=None,
                                   dest='timeout',
                                   action='store',
-                                  help='max timeout in seconds for each request')
+                                  help='max timeout in seconds for each '
+                                       'request')
         parser_group.add_argument('-W', '--workers',
                                   type=int,
                                   default=10,
                                   dest='workers',
                                   action='store',
                                   help='number of parallel workers')
+        parser_group.add_argument('-A', '--adaptive',
+                                  dest='adaptive',
+                                  action='store_true',
+                                  help='adapt the parallel workers of each '
+                                       'tool to the failed requests and to '
+                                       'the requests times, starting from '
+                                       'the workers (--workers)')
+        parser_group.add_argument('--max-workers',
+                                  type=str,
+                                  default=None,
+                                  dest='max_workers',
+                                  action='store',
+                                  help='max parallel workers in adaptive '
+                                       'mode as a number or as tool=number '
+                                       'separated by , '
+                                       '(e.g. ping=512,arping=128)')
+        parser_group.add_argument('--rate',
+                                  type=float,
+                                  default=None,
+                                  dest='rate',
+                                  action='store',
+                                  help='max packets per second sent by all '
+                                       'the tools')
+        parser_group.add_argument('--interface-workers',
+                                  type=int,
+                                  default=None,
+                                  dest='interface_workers',
+                                  action='store',
+                                  help='max requests in flight from all the '
+                                       'tools for each interface')
+        parser_group.add_argument('-E', '--engine',
+                                  type=str,
+                                  default=ENGINE_THREADS,
+                                  choices=ENGINES_LIST,
+                                  dest='engine',
+                                  action='store',
+                                  help='scan engine to use')
+        parser_group.add_argument('-N', '--neighbours',
+                                  dest='neighbours',
+                                  action='store_true',
+                                  help='use the kernel neighbours table to '
+                                       'skip the ARP requests for the '
+                                       'resolved hosts')
+        parser_group.add_argument('--local-names',
+                                  dest='local_names',
+                                  action='store_true',
+                                  help='discover the names of the hosts '
+                                       'without DNS records from mDNS, '
+                                       'LLMNR and NetBIOS replies')
+        parser_group.add_argument('-P', '--pipeline',
+                                  type=str,
+                                  default=None,
+                                  dest='pipeline',
+                                  action='store',
+                                  help='check each host through stages of '
+                                       'tools separated by : where the tools '
+                                       'of a stage are executed in parallel '
+                                       'and the next stages are executed '
+                                       'only for the hosts found alive '
+                                       '(e.g. arping,ping:hostname)')
+        # Define options for TCP checks
+        parser_group = self.parser.add_argument_group(
+            'arguments for TCP checks')
+        parser_group.add_argument('--tcp-ports',
+                                  type=str,
+                                  default=None,
+                                  dest='tcp_ports',
+                                  action='store',
+                                  help='check the hosts with TCP connections '
+                                       'to the ports separated by , where '
+                                       'both an accepted and a refused '
+                                       'connection mean the host is alive '
+                                       '(e.g. 22,80,443,8000-8010)')
+        parser_group.add_argument('--tcp-timeout',
+                                  type=float,
+                                  default=DEFAULT_TCP_TIMEOUT,
+                                  dest='tcp_timeout',
+                                  action='store',
+                                  help='max seconds to wait for each TCP '
+                                       'connection')
+        parser_group.add_argument('--tcp-sockets',
+                                  type=int,
+                                  default=DEFAULT_TCP_SOCKETS,
+                                  dest='tcp_sockets',
+                                  action='store',
+                                  help='max TCP connections in progress')
+        # Define options for output format
+        parser_group = self.parser.add_argument_group(
+            'arguments for output format')
+        parser_group.add_argument('-f', '--format',
+                                  type=str,
+                                  default=OUTPUT_TABLE,
+                                  choices=OUTPUT_FORMATS_LIST,
+                                  dest='output_format',
+                                  action='store',
+                                  help='output format for the results')
+        parser_group.add_argument('--flush-interval',
+                                  type=float,
+                                  default=1.0,
+                                  dest='flush_interval',
+                                  action='store',
+                                  help='max seconds between each output '
+                                       'flush')
         # Define options for compare mode
         parser_group = self.parser.add_argument_group(
             'arguments for compare mode')
+        parser_group.add_argument('-S', '--scan',
+                                  type=str,
+                                  dest='scan',
+                                  action='store',
+                                  help='scan ID to compare or {previous} '
+                                       'for the previous scan of the '
+                                       'network'.format(
+                                           previous=SCAN_PREVIOUS))
         parser_group.add_argument('-T', '--timestamp',
                                   type=int,
                                   dest='timestamp',
                                   action='store',
-                                  help='timestamp to compare')
+                                  help='compare the last scan of the network '
+                                       'before the timestamp')
         parser_group.add_argument('-O', '--changed',
                                   dest='changed',
                                   action='store_true',
@@ -116,6 +268,89 @@ class CommandLine(object):
                                   dest='collect',
                                   action='store_true',
                                   help='collect data during watch mode')
+        parser_group.add_argument('-D', '--daemon',
+                                  dest='daemon',
+                                  action='store_true',
+                                  help='scan each network on a fixed '
+                                       'cadence until SIGTERM is received')
+        parser_group.add_argument('--interval',
+                                  type=str,
+                                  default=None,
+                                  dest='interval',
+                                  action='store',
+                                  help='seconds between the scans in daemon '
+                                       'mode for all the networks or as '
+                                       'name=seconds separated by , '
+                                       '(e.g. 600,lan=60,dmz=120)')
+        parser_group.add_argument('--jitter',
+                                  type=float,
+                                  default=0,
+                                  dest='jitter',
+                                  action='store',
+                                  help='max random seconds added to each '
+                                       'scan start in daemon mode')
+        parser_group.add_argument('--overrun',
+                                  type=str,
+                                  default=OVERRUN_SKIP,
+                                  choices=OVERRUNS_LIST,
+                                  dest='overrun',
+                                  action='store',
+                                  help='when a scan lasts more than its '
+                                       'interval skip the missed scans or '
+                                       'start the next scan immediately')
+        parser_group.add_argument('--tiers',
+                                  type=str,
+                                  default=None,
+                                  dest='tiers',
+                                  action='store',
+                                  help='check the hosts alive in every '
+                                       'iteration, the recently seen hosts '
+                                       'every WARM iterations and all the '
+                                       'addresses every FULL iterations '
+                                       '(e.g. 4/16)')
+        parser_group.add_argument('--warm-days',
+                                  type=float,
+                                  default=DEFAULT_WARM_DAYS,
+                                  dest='warm_days',
+                                  action='store',
+                                  help='days since the last reply for the '
+                                       'recently seen hosts in tiers mode')
+        # Define options for passive mode
+        parser_group = self.parser.add_argument_group(
+            'arguments for passive mode')
+        parser_group.add_argument('--passive',
+                                  dest='passive',
+                                  action='store_true',
+                                  help='find the hosts from the ARP and '
+                                       'DHCP traffic as soon as they appear, '
+                                       'without sending any request, until '
+                                       'SIGTERM is received')
+        parser_group.add_argument('--passive-file',
+                                  type=str,
+                                  default=None,
+                                  dest='passive_file',
+                                  action='store',
+                                  help='read the traffic from a pcap capture '
+                                       'file in passive mode')
+        # Define options for metrics
+        parser_group = self.parser.add_argument_group(
+            'arguments for metrics')
+        parser_group.add_argument('--metrics-listen',
+                                  type=str,
+                                  default=None,
+                                  dest='metrics_listen',
+                                  action='store',
+                                  help='expose the metrics in the Prometheus '
+                                       'format on [ADDRESS:]PORT/metrics '
+                                       '(default address 127.0.0.1)')
+        parser_group.add_argument('--metrics-file',
+                                  type=str,
+                                  default=None,
+                                  dest='metrics_file',
+                                  action='store',
+                                  help='write the metrics in the Prometheus '
+                                       'format to the file after each scan, '
+                                       'for the textfile collector')
         # Define advanced options
         parser_group = self.parser.add_argument_group(
             'advanced options')
@@ -123,6 +358,49 @@ class CommandLine(object):
                                   dest='list_configurations',
                                   action='store_true',
                                   help='list saved network configurations')
+        parser_group.add_argument('--storage',
+                                  type=str,
+                                  default=STORAGE_FULL,
+                                  choices=STORAGES_LIST,
+                                  dest='storage',
+                                  action='store',
+                                  help='save all the detections or only '
+                                       'the hosts changes')
+        parser_group.add_argument('--retention',
+                                  type=int,
+                                  default=None,
+                                  dest='retention',
+                                  action='store',
+                                  help='days to keep the scans and the '
+                                       'hosts changes')
+        parser_group.add_argument('--compact',
+                                  dest='compact',
+                                  action='store_true',
+                                  help='convert the saved detections to '
+                                       'hosts changes')
+        parser_group.add_argument('--profile',
+                                  type=str,
+                                  default=None,
+                                  dest='profile',
+                                  action='store',
+                                  help='write the timed spans of the scan '
+                                       'phases, the tools and the hosts to '
+                                       'the file')
+        parser_group.add_argument('--profile-format',
+                                  type=str,
+                                  default=PROFILE_CHROME,
+                                  choices=PROFILE_FORMATS_LIST,
+                                  dest='profile_format',
+                                  action='store',
+                                  help='write the spans as a Chrome trace or '
+                                       'as folded stacks for flamegraphs')
+        parser_group.add_argument('--cprofile',
+                                  type=str,
+                                  default=None,
+                                  dest='cprofile',
+                                  action='store',
+                                  help='write the cProfile statistics of the '
+                                       'main thread to the file')
         parser_group.add_argument('--create-schema',
                                   dest='create_schema',
                                   action='store_true',
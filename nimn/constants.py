@@ -42,7 +42,29 @@ VERBOSE_LEVEL_DEBUG = 4
 TOOL_PING = 'ping'
 TOOL_ARPING = 'arping'
 TOOL_HOSTNAME = 'hostname'
-TOOLS_LIST = (TOOL_PING, TOOL_ARPING, TOOL_HOSTNAME)
+TOOL_TCP = 'tcp'
+TOOLS_LIST = (TOOL_PING, TOOL_ARPING, TOOL_HOSTNAME, TOOL_TCP)
+# Scan engines
+ENGINE_THREADS = 'threads'
+ENGINE_ASYNCIO = 'asyncio'
+ENGINE_SOCKETS = 'sockets'
+ENGINE_BATCH = 'batch'
+ENGINES_LIST = (ENGINE_THREADS, ENGINE_ASYNCIO, ENGINE_SOCKETS, ENGINE_BATCH)
+# Output formats
+OUTPUT_TABLE = 'table'
+OUTPUT_CSV = 'csv'
+OUTPUT_NDJSON = 'ndjson'
+OUTPUT_FORMATS_LIST = (OUTPUT_TABLE, OUTPUT_CSV, OUTPUT_NDJSON)
+# Scan to compare
+SCAN_PREVIOUS = 'previous'
+# Storage modes
+STORAGE_FULL = 'full'
+STORAGE_CHANGES = 'changes'
+STORAGES_LIST = (STORAGE_FULL, STORAGE_CHANGES)
+# Policies for the scans lasting more than their interval
+OVERRUN_SKIP = 'skip'
+OVERRUN_QUEUE = 'queue'
+OVERRUNS_LIST = (OVERRUN_SKIP, OVERRUN_QUEUE)
 
 # Paths constants
 # If there's a file data/nimn.png then the shared data are searched
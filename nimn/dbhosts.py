@@ -19,18 +19,54 @@
 ##
 
 from .constants import FILE_HOSTS
+from . import profiler
+from .metrics import DB_WRITE_SECONDS
 from .network import Network
 
+import itertools
 import sqlite3
+import sys
+import threading
 import time
 
+if sys.version_info.major == 3:
+    import queue
+else:
+    import Queue as queue
+
 MAC_ADDRESS = 'MAC'
 HOSTNAME = 'HOSTNAME'
+# Seconds to wait for a database locked by another connection
+BUSY_TIMEOUT = 30
+# Max detections to write in a single transaction
+BATCH_SIZE = 1000
+# Seconds between the checks of the writer while awaiting the queue
+JOIN_TIMEOUT = 1
+# Current database schema version
+SCHEMA_VERSION = 3
+# Network name for the scans imported from the old detections
+NETWORK_UNKNOWN = '-'
+# Max seconds between the old detections imported in the same scan
+MIGRATE_SCAN_GAP = 60
+# Events for the hosts changes
+EVENT_FIRST_SEEN = 'first_seen'
+EVENT_SEEN_AGAIN = 'seen_again'
+EVENT_MAC_CHANGED = 'mac_changed'
+EVENT_HOSTNAME_CHANGED = 'hostname_changed'
+EVENT_WENT_SILENT = 'went_silent'
+
+
+def connect():
+    """Open a connection to the hosts database"""
+    connection = sqlite3.connect(FILE_HOSTS, timeout=BUSY_TIMEOUT)
+    # In WAL mode the NORMAL synchronous level is safe from corruption
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
 
 
 class DBHosts(object):
     def __init__(self, settings):
-        self.connection = sqlite3.connect(FILE_HOSTS)
+        self.connection = connect()
         self.connection.row_factory = sqlite3.Row
         self.cursor = self.connection.cursor()
         self.settings = settings
@@ -62,8 +98,138 @@ class DBHosts(object):
                            )
         self.settings.log_verbose_max('Saving schema')
         self.connection.commit()
+        self.update_schema()
         self.settings.log_verbose_max('Database schema created')
 
+    def update_schema(self):
+        """Migrate an existing database schema to the current version"""
+        # Allow readers and other processes during the writes
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA user_version')
+        version = self.cursor.fetchone()[0]
+        migrations = (self.migrate_schema_1,
+                      self.migrate_schema_2,
+                      self.migrate_schema_3)
+        # Manage the transactions explicitly as sqlite3 would otherwise
+        # commit before the schema changes of each migration
+        isolation_level = self.connection.isolation_level
+        self.connection.isolation_level = None
+        try:
+            for version in range(version + 1, SCHEMA_VERSION + 1):
+                self.settings.log_verbose(
+                    'Updating database schema to version {version}'.format(
+                        version=version))
+                self.cursor.execute('BEGIN')
+                try:
+                    migrations[version - 1]()
+                    # PRAGMA doesn't allow parameters
+                    self.cursor.execute(
+                        'PRAGMA user_version={version:d}'.format(
+                            version=version))
+                except Exception:
+                    self.cursor.execute('ROLLBACK')
+                    raise
+                self.cursor.execute('COMMIT')
+        finally:
+            self.connection.isolation_level = isolation_level
+
+    def migrate_schema_1(self):
+        """Add the hostnames cache table"""
+        self.cursor.execute('CREATE TABLE IF NOT EXISTS "hostnames" ('
+                            '  "ip" TEXT NOT NULL,'
+                            '  "hostname" TEXT NULL,'
+                            '  "expiration" INTEGER NOT NULL,'
+                            '  PRIMARY KEY (ip)'
+                            ')'
+                           )
+
+    def migrate_schema_2(self):
+        """Add the scans table and reference the scans from detections"""
+        self.settings.log_verbose_max('Creating table scans')
+        self.cursor.execute('CREATE TABLE "scans" ('
+                            '  "id" INTEGER PRIMARY KEY AUTOINCREMENT,'
+                            '  "started" INTEGER NOT NULL,'
+                            '  "ended" INTEGER NULL,'
+                            '  "network" TEXT NOT NULL,'
+                            '  "options" TEXT NULL,'
+                            '  "hosts" INTEGER NOT NULL DEFAULT 0,'
+                            '  "alive" INTEGER NOT NULL DEFAULT 0'
+                            ')'
+                           )
+        self.cursor.execute('CREATE INDEX "scans_network_started" '
+                            'ON scans (network, started)')
+        self.cursor.execute('CREATE INDEX "scans_started" '
+                            'ON scans (started)')
+        # The previous detections with near timestamps become a scan
+        self.settings.log_verbose_max('Creating scans for detections')
+        scans = []
+        self.cursor.execute('SELECT timestamp, ip '
+                            'FROM detections '
+                            'ORDER BY timestamp')
+        for (timestamp, rows) in itertools.groupby(
+                self.cursor.fetchall(), lambda row: row['timestamp']):
+            ips = set(row['ip'] for row in rows)
+            if (not scans or timestamp - scans[-1][1] > MIGRATE_SCAN_GAP or
+                    not ips.isdisjoint(scans[-1][2])):
+                # A host detected again starts a new scan
+                scans.append([timestamp, timestamp, set()])
+            scans[-1][1] = timestamp
+            scans[-1][2].update(ips)
+        self.settings.log_verbose_max('Updating table detections')
+        self.cursor.execute('ALTER TABLE detections '
+                            'RENAME TO detections_old')
+        self.cursor.execute('CREATE TABLE "detections" ('
+                            '  "scan_id" INTEGER NOT NULL,'
+                            '  "timestamp" INTEGER NOT NULL,'
+                            '  "ip" TEXT NOT NULL,'
+                            '  "mac" TEXT NULL,'
+                            '  "hostname" TEXT NOT NULL,'
+                            '  PRIMARY KEY (scan_id, ip)'
+                            ')'
+                           )
+        for (started, ended, ips) in scans:
+            self.cursor.execute('INSERT INTO scans '
+                                '(started, ended, network, hosts) '
+                                'VALUES(?, ?, ?, ?)',
+                                (started, ended, NETWORK_UNKNOWN, len(ips)))
+            self.cursor.execute('INSERT INTO detections '
+                                '(scan_id, timestamp, ip, mac, hostname) '
+                                'SELECT ?, timestamp, ip, mac, hostname '
+                                'FROM detections_old '
+                                'WHERE timestamp BETWEEN ? AND ?',
+                                (self.cursor.lastrowid, started, ended))
+        self.cursor.execute('DROP TABLE detections_old')
+
+    def migrate_schema_3(self):
+        """Add the hosts current state and the hosts changes tables"""
+        self.settings.log_verbose_max('Creating table hosts')
+        self.cursor.execute('CREATE TABLE "hosts" ('
+                            '  "ip" TEXT NOT NULL,'
+                            '  "mac" TEXT NULL,'
+                            '  "hostname" TEXT NOT NULL,'
+                            '  "alive" INTEGER NOT NULL,'
+                            '  "first_seen" INTEGER NOT NULL,'
+                            '  "last_seen" INTEGER NOT NULL,'
+                            '  "scan_id" INTEGER NOT NULL,'
+                            '  PRIMARY KEY (ip)'
+                            ')'
+                           )
+        self.settings.log_verbose_max('Creating table events')
+        self.cursor.execute('CREATE TABLE "events" ('
+                            '  "id" INTEGER PRIMARY KEY AUTOINCREMENT,'
+                            '  "scan_id" INTEGER NOT NULL,'
+                            '  "timestamp" INTEGER NOT NULL,'
+                            '  "ip" TEXT NOT NULL,'
+                            '  "event" TEXT NOT NULL,'
+                            '  "mac" TEXT NULL,'
+                            '  "hostname" TEXT NOT NULL'
+                            ')'
+                           )
+        self.cursor.execute('CREATE INDEX "events_ip" '
+                            'ON events (ip, id)')
+        self.cursor.execute('CREATE INDEX "events_timestamp" '
+                            'ON events (timestamp)')
+
     def list_networks(self):
         results = {}
         self.cursor.execute('SELECT * FROM networks')
@@ -74,25 +240,382 @@ class DBHosts(object):
                                           )
         return results
 
-    def add_detection(self, ip, mac, hostname):
+    def start_scan(self, network, options):
+        """Add a new scan for the network and return its ID"""
+        self.cursor.execute('INSERT INTO scans '
+                            '(started, network, options) '
+                            'VALUES(?, ?, ?)',
+                            (int(time.time()), network, options)
+                           )
+        self.connection.commit()
+        return self.cursor.lastrowid
+
+    def end_scan(self, scan_id, hosts, alive):
+        """Save the ending time and the hosts count for the scan"""
+        self.cursor.execute('UPDATE scans '
+                            'SET ended=?, hosts=?, alive=? '
+                            'WHERE id=?',
+                            (int(time.time()), hosts, alive, scan_id)
+                           )
+        self.connection.commit()
+
+    def get_scan(self, scan_id):
+        """Get the scan ID if the scan exists"""
+        self.cursor.execute('SELECT id FROM scans WHERE id=?',
+                            (scan_id, ))
+        row = self.cursor.fetchone()
+        return row['id'] if row else None
+
+    def get_previous_scan(self, network):
+        """Get the ID of the last completed scan for the network"""
+        self.cursor.execute('SELECT id FROM scans '
+                            'WHERE network=? AND ended IS NOT NULL '
+                            'ORDER BY started DESC, id DESC '
+                            'LIMIT 1',
+                            (network, ))
+        row = self.cursor.fetchone()
+        return row['id'] if row else None
+
+    def get_scan_before(self, network, timestamp):
+        """
+        Get the ID of the last scan for the network started at or before the
+        timestamp, including the scans imported without network
+        """
+        self.cursor.execute('SELECT id FROM scans '
+                            'WHERE network IN (?, ?) AND started<=? '
+                            'ORDER BY started DESC, id DESC '
+                            'LIMIT 1',
+                            (network, NETWORK_UNKNOWN, timestamp))
+        row = self.cursor.fetchone()
+        return row['id'] if row else None
+
+    def add_detection(self, scan_id, ip, mac, hostname):
         """Add a new detection record for the ip address"""
         timestamp = time.time()
         self.cursor.execute('INSERT INTO detections '
-                            '(timestamp, ip, mac, hostname) '
-                            'VALUES(?, ?, ?, ?)',
-                            (int(timestamp), ip, mac, hostname)
+                            '(scan_id, timestamp, ip, mac, hostname) '
+                            'VALUES(?, ?, ?, ?, ?)',
+                            (scan_id, int(timestamp), ip, mac, hostname)
                            )
         self.connection.commit()
 
-    def get_detections(self, timestamp):
-        """Get detections for the specified timestamp"""
+    def get_detections(self, scan_id):
+        """Get detections for the specified scan"""
         results = {}
         self.cursor.execute('SELECT * FROM detections '
-                            'WHERE timestamp=?',
-                            (timestamp, ))
+                            'WHERE scan_id=?',
+                            (scan_id, ))
         for row in self.cursor.fetchall():
             response = {}
             response[MAC_ADDRESS] = row['mac']
             response[HOSTNAME] = row['hostname']
             results[row['ip']] = response
         return results
+
+    def get_state(self, scan_id):
+        """Get the hosts state after the specified scan from the events"""
+        results = {}
+        # The bare columns are taken from the row with the max id
+        self.cursor.execute('SELECT ip, event, mac, hostname, MAX(id) '
+                            'FROM events '
+                            'WHERE scan_id<=? '
+                            'GROUP BY ip',
+                            (scan_id, ))
+        for row in self.cursor.fetchall():
+            response = {}
+            if row['event'] == EVENT_WENT_SILENT:
+                # The silent hosts are saved like in the detections
+                response[MAC_ADDRESS] = None
+                response[HOSTNAME] = row['ip']
+            else:
+                response[MAC_ADDRESS] = row['mac']
+                response[HOSTNAME] = row['hostname']
+            results[row['ip']] = response
+        return results
+
+    def get_seen_detections(self, network):
+        """
+        Get (alive, last seen timestamp) for each host detected in the
+        network scans, the detections without MAC address and hostname
+        count as not alive like in compact
+        """
+        results = {}
+        # The bare columns are taken from the row with the max scan_id
+        self.cursor.execute('SELECT ip, mac, hostname, MAX(scan_id) '
+                            'FROM detections '
+                            'WHERE scan_id IN ('
+                            '  SELECT id FROM scans WHERE network=?) '
+                            'GROUP BY ip',
+                            (network, ))
+        for row in self.cursor.fetchall():
+            results[row['ip']] = (row['mac'] is not None or
+                                  row['hostname'] != row['ip'], 0)
+        self.cursor.execute('SELECT ip, MAX(timestamp) AS last_seen '
+                            'FROM detections '
+                            'WHERE scan_id IN ('
+                            '  SELECT id FROM scans WHERE network=?) '
+                            '  AND (mac IS NOT NULL OR hostname!=ip) '
+                            'GROUP BY ip',
+                            (network, ))
+        for row in self.cursor.fetchall():
+            results[row['ip']] = (results[row['ip']][0], row['last_seen'])
+        return results
+
+    def get_seen_state(self):
+        """Get (alive, last seen timestamp) for each host from its state"""
+        results = {}
+        self.cursor.execute('SELECT ip, alive, last_seen FROM hosts')
+        for row in self.cursor.fetchall():
+            results[row['ip']] = (bool(row['alive']), row['last_seen'])
+        return results
+
+    def compact(self):
+        """Convert the detections history to hosts state and changes"""
+        history = HostsHistory()
+        history.load(self.connection)
+        self.cursor.execute('SELECT scan_id, timestamp, ip, mac, hostname '
+                            'FROM detections '
+                            'ORDER BY scan_id, ip')
+        count = 0
+        while True:
+            rows = self.cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            # The detections don't save the ping status
+            history.update(history.save(
+                self.connection,
+                [tuple(row) + (row['mac'] is not None or
+                               row['hostname'] != row['ip'], )
+                 for row in rows]))
+            count += len(rows)
+        self.cursor.execute('DELETE FROM detections')
+        self.connection.commit()
+        self.settings.log_verbose(
+            'Compacted {count} detections'.format(count=count))
+        # Release the unused space
+        self.cursor.execute('VACUUM')
+
+    def apply_retention(self, days):
+        """Delete the scans, detections and events older than days"""
+        timestamp = int(time.time() - days * 86400)
+        self.cursor.execute('DELETE FROM detections '
+                            'WHERE scan_id IN ('
+                            '  SELECT id FROM scans WHERE started<?)',
+                            (timestamp, ))
+        self.cursor.execute('DELETE FROM scans WHERE started<?',
+                            (timestamp, ))
+        # Keep the last event and the last event with the host seen for
+        # each host to preserve its state
+        self.cursor.execute('DELETE FROM events '
+                            'WHERE timestamp<? AND id NOT IN ('
+                            '  SELECT MAX(id) FROM events GROUP BY ip) '
+                            '  AND id NOT IN ('
+                            '  SELECT MAX(id) FROM events WHERE event!=? '
+                            '  GROUP BY ip)',
+                            (timestamp, EVENT_WENT_SILENT))
+        self.connection.commit()
+
+    def get_hostnames(self, timestamp):
+        """
+        Get the cached hostnames not yet expired at the timestamp,
+        negative answers have None as hostname
+        """
+        results = {}
+        self.cursor.execute('SELECT ip, hostname FROM hostnames '
+                            'WHERE expiration>?',
+                            (int(timestamp), ))
+        for row in self.cursor.fetchall():
+            results[row['ip']] = row['hostname']
+        return results
+
+    def set_hostnames(self, hostnames):
+        """Save the (ip, hostname, expiration) records in the cache"""
+        self.cursor.executemany('INSERT OR REPLACE INTO hostnames '
+                                '(ip, hostname, expiration) '
+                                'VALUES(?, ?, ?)',
+                                hostnames
+                               )
+        self.connection.commit()
+
+
+class DetectionsWriter(object):
+    """Save the detections in batches from a background thread"""
+    def __init__(self, settings, batch_size=BATCH_SIZE):
+        self.settings = settings
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.consumer)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add_detection(self, scan_id, ip, mac, hostname, alive):
+        """Add a new detection record for the ip address to the queue"""
+        self.queue.put((scan_id, int(time.time()), ip, mac, hostname, alive))
+
+    def flush(self):
+        """Await all the queued detections to be saved"""
+        self.queue.put(None)
+        # Stop waiting if the writer has died
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and self.thread.is_alive():
+                self.queue.all_tasks_done.wait(JOIN_TIMEOUT)
+        self.check_error()
+
+    def close(self):
+        """Save the queued detections and stop the writer"""
+        if self.thread.is_alive():
+            self.queue.put(False)
+            self.thread.join()
+        self.check_error()
+
+    def check_error(self):
+        """Raise the error which has stopped the writer"""
+        if self.error:
+            (error, self.error) = (self.error, None)
+            raise error
+
+    def consumer(self):
+        """Save the detections keeping the error which stops the writer"""
+        try:
+            self.save_batches()
+        except Exception as error:
+            self.error = error
+
+    def save_batches(self):
+        """Extract the detections from the queue and save them in batches"""
+        connection = connect()
+        try:
+            self.load(connection)
+            batch = []
+            while True:
+                data = self.queue.get()
+                if data:
+                    batch.append(data)
+                if batch and (not data or len(batch) >= self.batch_size):
+                    # Save the batch in a single transaction
+                    started = time.time()
+                    try:
+                        self.save(connection, batch)
+                        connection.commit()
+                        self.committed()
+                        ended = time.time()
+                        DB_WRITE_SECONDS.observe((), ended - started)
+                        profiler.tracer.add('db_write', 'database', started,
+                                            ended, count=len(batch))
+                    except sqlite3.Error as error:
+                        connection.rollback()
+                        self.settings.log_normal(
+                            'Unable to save {count} detections: '
+                            '{error}'.format(count=len(batch), error=error))
+                    batch = []
+                self.queue.task_done()
+                if data is False:
+                    # Stop the writer
+                    break
+        finally:
+            connection.close()
+
+    def load(self, connection):
+        """Load the data needed before saving the detections"""
+        pass
+
+    def committed(self):
+        """Update the loaded data after a batch is saved"""
+        pass
+
+    def save(self, connection, batch):
+        """Save a batch of detections"""
+        # The passive mode replaces the detection of a host changed during
+        # the scan
+        connection.executemany('INSERT OR REPLACE INTO detections '
+                               '(scan_id, timestamp, ip, mac, hostname) '
+                               'VALUES(?, ?, ?, ?, ?)',
+                               [data[:5] for data in batch])
+
+
+class HostsHistory(object):
+    """Save only the current state and the changes for each host"""
+    def __init__(self):
+        self.hosts = {}
+
+    def load(self, connection):
+        """Load the current state for each host"""
+        self.hosts = {}
+        for row in connection.execute('SELECT ip, mac, hostname, alive, '
+                                      '  first_seen, last_seen '
+                                      'FROM hosts'):
+            self.hosts[row[0]] = (row[1], row[2], bool(row[3]), row[4],
+                                  row[5])
+
+    def save(self, connection, batch):
+        """
+        Save the events and the state for the changed or alive hosts and
+        return the new states, to update after the transaction is committed
+        """
+        events = []
+        hosts = []
+        states = {}
+        for (scan_id, timestamp, ip, mac, hostname, alive) in batch:
+            previous = states.get(ip, self.hosts.get(ip))
+            if previous is None:
+                # Skip the hosts never seen alive
+                if not alive:
+                    continue
+                event = EVENT_FIRST_SEEN
+                previous = (mac, hostname, False, timestamp, timestamp)
+            elif not alive:
+                # Skip the hosts already silent
+                if not previous[2]:
+                    continue
+                event = EVENT_WENT_SILENT
+            elif not previous[2]:
+                event = EVENT_SEEN_AGAIN
+            elif mac != previous[0]:
+                event = EVENT_MAC_CHANGED
+            elif hostname != previous[1]:
+                event = EVENT_HOSTNAME_CHANGED
+            else:
+                event = None
+            if event:
+                events.append((scan_id, timestamp, ip, event, mac, hostname))
+            if alive:
+                state = (mac, hostname, True, previous[3], timestamp)
+            else:
+                # Keep the last known data for the silent hosts
+                state = (previous[0], previous[1], False, previous[3],
+                         previous[4])
+            states[ip] = state
+            hosts.append((ip, ) + state + (scan_id, ))
+        connection.executemany('INSERT INTO events '
+                               '(scan_id, timestamp, ip, event, mac, '
+                               ' hostname) '
+                               'VALUES(?, ?, ?, ?, ?, ?)',
+                               events)
+        connection.executemany('INSERT OR REPLACE INTO hosts '
+                               '(ip, mac, hostname, alive, first_seen, '
+                               ' last_seen, scan_id) '
+                               'VALUES(?, ?, ?, ?, ?, ?, ?)',
+                               hosts)
+        return states
+
+    def update(self, states):
+        """Update the current state of the saved hosts"""
+        self.hosts.update(states)
+
+
+class ChangesWriter(DetectionsWriter):
+    """Save only the hosts changes in batches from a background thread"""
+    def load(self, connection):
+        """Load the current state for each host"""
+        self.history = HostsHistory()
+        self.history.load(connection)
+        self.states = {}
+
+    def committed(self):
+        """Update the hosts state after the changes are saved"""
+        self.history.update(self.states)
+
+    def save(self, connection, batch):
+        """Save the changes for a batch of detections"""
+        self.states = self.history.save(connection, batch)
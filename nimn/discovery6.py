@@ -0,0 +1,207 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import os
+import select
+import socket
+import struct
+import time
+
+from .neighbours import get_interface_index
+
+# All the nodes on the link
+MULTICAST_ALL_NODES = 'ff02::1'
+# All the MLDv2 capable routers, receiving the MLDv2 reports
+MULTICAST_MLDV2_ROUTERS = 'ff02::16'
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+MLD_LISTENER_QUERY = 130
+MLD_LISTENER_REPORT = 131
+MLDV2_LISTENER_REPORT = 143
+IPPROTO_ICMPV6 = getattr(socket, 'IPPROTO_ICMPV6', 58)
+IPV6_MULTICAST_IF = getattr(socket, 'IPV6_MULTICAST_IF', 17)
+IPV6_MULTICAST_HOPS = getattr(socket, 'IPV6_MULTICAST_HOPS', 18)
+IPV6_JOIN_GROUP = getattr(socket, 'IPV6_JOIN_GROUP', 20)
+IPV6_HOPOPTS = getattr(socket, 'IPV6_HOPOPTS', 54)
+# Hop-by-hop options header with the router alert option for MLD
+HOPOPTS_ROUTER_ALERT = b'\x00\x00\x05\x02\x00\x00\x01\x00'
+# Default seconds to wait for the replies after the requests
+DEFAULT_TIMEOUT = 1
+
+
+def echo_request(identifier, sequence):
+    """Build an ICMPv6 echo request, the checksum is set by the kernel"""
+    return struct.pack('!BBHHH', ICMPV6_ECHO_REQUEST, 0, 0,
+                       identifier, sequence) + b'nimn'.ljust(56, b'\x00')
+
+
+def listener_query(max_response_delay):
+    """Build a MLDv2 general query, the checksum is set by the kernel"""
+    return struct.pack('!BBHHH16sBBH', MLD_LISTENER_QUERY, 0, 0,
+                       max_response_delay, 0, b'\x00' * 16, 2, 0, 0)
+
+
+class Discovery6(object):
+    """
+    Discover the IPv6 hosts on the link of an interface with an echo
+    request to all the nodes and a multicast listener query, instead of
+    sending a request for each address
+    """
+    def __init__(self, settings, interface, timeout=None, checks=1):
+        self.settings = settings
+        self.interface = interface
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.checks = checks
+
+    def discover(self):
+        """
+        Return a dictionary with the round trip time in seconds for each
+        responding address, the time is None for the addresses found only
+        from the multicast listener reports
+        """
+        try:
+            self.ifindex = get_interface_index(self.interface)
+        except IOError:
+            self.settings.log_verbose(
+                'Interface {interface} not found'.format(
+                    interface=self.interface))
+            return {}
+        self.socket = self.open_socket()
+        if not self.socket:
+            self.settings.log_verbose('ICMPv6 socket not available')
+            return {}
+        replies = {}
+        try:
+            for check in range(self.checks):
+                self.send_requests()
+                deadline = time.time() + self.timeout
+                while time.time() < deadline:
+                    (readable, _, _) = select.select(
+                        [self.socket], [], [],
+                        max(deadline - time.time(), 0))
+                    if readable:
+                        self.receive_reply(replies)
+        finally:
+            self.socket.close()
+        return replies
+
+    def open_socket(self):
+        """
+        Open a raw ICMPv6 socket for the echo requests and the listener
+        queries or an unprivileged datagram socket for the echo requests
+        only, returns None if no socket could be opened
+        """
+        for socket_type in (socket.SOCK_RAW, socket.SOCK_DGRAM):
+            try:
+                icmp_socket = socket.socket(socket.AF_INET6,
+                                            socket_type,
+                                            IPPROTO_ICMPV6)
+            except socket.error as error:
+                self.settings.log_verbose_max(
+                    'Unable to open ICMPv6 socket: {error}'.format(
+                        error=error))
+                continue
+            try:
+                icmp_socket.setsockopt(socket.IPPROTO_IPV6,
+                                       IPV6_MULTICAST_IF,
+                                       self.ifindex)
+                icmp_socket.setsockopt(socket.IPPROTO_IPV6,
+                                       IPV6_MULTICAST_HOPS,
+                                       1)
+            except socket.error as error:
+                self.settings.log_verbose_max(
+                    'Unable to configure ICMPv6 socket: {error}'.format(
+                        error=error))
+                icmp_socket.close()
+                continue
+            self.is_raw = socket_type == socket.SOCK_RAW
+            if self.is_raw:
+                try:
+                    # Receive the MLDv2 reports
+                    icmp_socket.setsockopt(
+                        socket.IPPROTO_IPV6,
+                        IPV6_JOIN_GROUP,
+                        socket.inet_pton(socket.AF_INET6,
+                                         MULTICAST_MLDV2_ROUTERS) +
+                        struct.pack('@I', self.ifindex))
+                except socket.error as error:
+                    self.settings.log_verbose_max(
+                        'Unable to join the MLDv2 group: {error}'.format(
+                            error=error))
+            icmp_socket.setblocking(False)
+            self.identifier = os.getpid() & 0xffff
+            self.sequence = 0
+            self.sent = {}
+            return icmp_socket
+        return None
+
+    def send_requests(self):
+        """Send the echo request and the listener query to all the nodes"""
+        destination = (MULTICAST_ALL_NODES, 0, 0, self.ifindex)
+        self.sequence = (self.sequence + 1) & 0xffff
+        self.sent[self.sequence] = time.time()
+        try:
+            self.socket.sendto(echo_request(self.identifier, self.sequence),
+                               destination)
+        except socket.error as error:
+            self.settings.log_verbose(
+                'Unable to send the echo request: {error}'.format(
+                    error=error))
+        if not self.is_raw:
+            # Datagram sockets can send only echo requests
+            return
+        query = listener_query(min(int(self.timeout * 1000), 0xffff))
+        try:
+            if hasattr(self.socket, 'sendmsg'):
+                # The listeners ignore the queries without router alert
+                self.socket.sendmsg([query],
+                                    [(socket.IPPROTO_IPV6,
+                                      IPV6_HOPOPTS,
+                                      HOPOPTS_ROUTER_ALERT)],
+                                    0,
+                                    destination)
+            else:
+                self.socket.sendto(query, destination)
+        except socket.error as error:
+            self.settings.log_verbose(
+                'Unable to send the listener query: {error}'.format(
+                    error=error))
+
+    def receive_reply(self, replies):
+        """Receive a reply and save the address of the responder"""
+        try:
+            (packet, source) = self.socket.recvfrom(1024)
+        except socket.error:
+            return
+        received = time.time()
+        # Remove the scope from the link local addresses
+        address = source[0].split('%', 1)[0]
+        if len(packet) < 8 or address == '::':
+            return
+        (icmp_type, _, _, identifier, sequence) = struct.unpack(
+            '!BBHHH', packet[:8])
+        if icmp_type == ICMPV6_ECHO_REPLY:
+            if self.is_raw and identifier != self.identifier:
+                # Reply for another process
+                return
+            if sequence in self.sent and replies.get(address) is None:
+                replies[address] = received - self.sent[sequence]
+        elif icmp_type in (MLD_LISTENER_REPORT, MLDV2_LISTENER_REPORT):
+            replies.setdefault(address, None)
@@ -0,0 +1,285 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import bisect
+import os
+import sys
+import threading
+
+if sys.version_info.major == 3:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+# Upper bounds in seconds for the histograms buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Outcomes of the probes
+OUTCOME_REPLY = 'reply'
+OUTCOME_NO_REPLY = 'no_reply'
+OUTCOME_ERROR = 'error'
+
+
+def format_value(value):
+    """Format a sample value for the Prometheus text format"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def format_labels(names, values):
+    """Format the labels for the Prometheus text format"""
+    if not names:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                                     .replace('"', '\\"')
+                                     .replace('\n', '\\n'))
+        for (name, value) in zip(names, values))
+
+
+class Metric(object):
+    """Metric with a value for each combination of labels"""
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def expose(self):
+        """Get the lines of the metric in the Prometheus text format"""
+        lines = ['# HELP {name} {description}'.format(
+                     name=self.name, description=self.description),
+                 '# TYPE {name} {kind}'.format(name=self.name,
+                                               kind=self.kind)]
+        with self.lock:
+            values = sorted(self.values.items())
+        for (labels, value) in values:
+            lines.extend(self.expose_value(labels, value))
+        return lines
+
+    def expose_value(self, labels, value):
+        """Get the samples lines for the value of the labels"""
+        if callable(value):
+            value = value()
+        return ['{name}{labels} {value}'.format(
+                    name=self.name,
+                    labels=format_labels(self.labels, labels),
+                    value=format_value(value))]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        """Increase the counter for the labels"""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, labels=(), value=0):
+        """Set the gauge value for the labels"""
+        with self.lock:
+            self.values[labels] = value
+
+    def set_function(self, labels, function):
+        """Get the gauge value for the labels from a function when exposed"""
+        with self.lock:
+            self.values[labels] = function
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels=(), value=0.0):
+        """Count a value for the labels in its bucket"""
+        with self.lock:
+            if labels not in self.values:
+                # Counts for each bucket and +Inf, then the sum
+                self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts = self.values[labels]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def expose_value(self, labels, value):
+        """Get the cumulative buckets, the sum and the count lines"""
+        lines = []
+        total = 0
+        for (bound, count) in zip(self.buckets + (float('inf'), ),
+                                  value[:-1]):
+            total += count
+            lines.append('{name}_bucket{labels} {count}'.format(
+                name=self.name,
+                labels=format_labels(self.labels + ('le', ),
+                                     labels + (format_value(bound), )),
+                count=total))
+        lines.append('{name}_sum{labels} {value}'.format(
+            name=self.name,
+            labels=format_labels(self.labels, labels),
+            value=format_value(value[-1])))
+        lines.append('{name}_count{labels} {count}'.format(
+            name=self.name,
+            labels=format_labels(self.labels, labels),
+            count=total))
+        return lines
+
+
+class MetricsRegistry(object):
+    """Metrics exposed in the Prometheus text format"""
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        """Get all the metrics in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, filename):
+        """Replace the file for the textfile collector with the metrics"""
+        temporary = '{filename}.{pid}.tmp'.format(filename=filename,
+                                                  pid=os.getpid())
+        with open(temporary, 'w') as file_metrics:
+            file_metrics.write(self.expose())
+        os.rename(temporary, filename)
+
+    def serve(self, address, port):
+        """Expose the metrics on /metrics from a background thread"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                data = registry.expose().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # No access log on stderr
+                pass
+
+        server = HTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+# Metrics of the scans and of the tools
+REGISTRY = MetricsRegistry()
+PROBES = REGISTRY.counter(
+    'nimn_probes_total',
+    'Probes completed by tool and outcome',
+    ('tool', 'outcome'))
+PROBE_SECONDS = REGISTRY.histogram(
+    'nimn_probe_duration_seconds',
+    'Seconds to complete each probe',
+    ('tool', ))
+QUEUE_DEPTH = REGISTRY.gauge(
+    'nimn_queue_depth',
+    'Probes waiting to be started',
+    ('tool', ))
+ACTIVE_WORKERS = REGISTRY.gauge(
+    'nimn_active_workers',
+    'Probes in flight',
+    ('tool', ))
+WORKERS_LIMIT = REGISTRY.gauge(
+    'nimn_workers_limit',
+    'Max probes in flight',
+    ('tool', ))
+SPAWN_SECONDS = REGISTRY.histogram(
+    'nimn_subprocess_spawn_seconds',
+    'Seconds to start each external command',
+    ('tool', ))
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'nimn_db_write_seconds',
+    'Seconds to save each batch of detections')
+SCANS = REGISTRY.counter(
+    'nimn_scans_total',
+    'Scans completed by network',
+    ('network', ))
+SCAN_SECONDS = REGISTRY.gauge(
+    'nimn_scan_duration_seconds',
+    'Seconds of the last scan of the network',
+    ('network', ))
+SCAN_HOSTS = REGISTRY.gauge(
+    'nimn_scan_hosts',
+    'Hosts checked in the last scan of the network',
+    ('network', ))
+SCAN_ALIVE = REGISTRY.gauge(
+    'nimn_scan_alive_hosts',
+    'Hosts alive in the last scan of the network',
+    ('network', ))
+SCAN_RATE = REGISTRY.gauge(
+    'nimn_scan_hosts_per_second',
+    'Hosts per second checked in the last scan of the network',
+    ('network', ))
+SCAN_TIMESTAMP = REGISTRY.gauge(
+    'nimn_scan_last_timestamp_seconds',
+    'Ending time of the last scan of the network',
+    ('network', ))
+
+
+def get_outcome(address, results):
+    """Get the outcome of a probe from the tool results"""
+    if results is None:
+        return OUTCOME_ERROR
+    elif results.data and results.data != address:
+        return OUTCOME_REPLY
+    return OUTCOME_NO_REPLY
+
+
+def record_probe(tool, address, results, duration=None):
+    """Count a completed probe of the tool and its duration"""
+    PROBES.inc((tool, get_outcome(address, results)))
+    if duration is not None:
+        PROBE_SECONDS.observe((tool, ), duration)
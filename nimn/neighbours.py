@@ -0,0 +1,188 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import os
+import socket
+import struct
+
+FILE_ARP = '/proc/net/arp'
+DIR_INTERFACES = '/sys/class/net'
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+NDA_DST = 1
+NDA_LLADDR = 2
+ATF_COM = 0x02
+NUD_REACHABLE = 0x02
+NUD_STALE = 0x04
+NUD_DELAY = 0x08
+NUD_PROBE = 0x10
+NUD_PERMANENT = 0x80
+# Neighbour states with a known link layer address, DELAY and PROBE are
+# STALE entries under verification
+NUD_RESOLVED = (NUD_REACHABLE | NUD_STALE | NUD_DELAY | NUD_PROBE |
+                NUD_PERMANENT)
+NLMSG_HEADER = struct.Struct('=IHHII')
+NDMSG_HEADER = struct.Struct('=BBHiHBB')
+RTATTR_HEADER = struct.Struct('=HH')
+
+
+def format_mac(data):
+    """Format a packed MAC address"""
+    return ':'.join('%02X' % byte for byte in struct.unpack('6B', data))
+
+
+def get_interface_index(interface):
+    """Get the interface index from its name"""
+    with open(os.path.join(DIR_INTERFACES, interface, 'ifindex'),
+              'r') as file_index:
+        return int(file_index.read())
+
+
+def parse_proc_arp(lines, interface=None):
+    """
+    Parse the lines from /proc/net/arp and return a dictionary with the
+    MAC address for each resolved IP address
+    """
+    results = {}
+    for line in lines:
+        fields = line.split()
+        # Skip the header and the incomplete entries
+        if len(fields) < 6 or fields[0] == 'IP':
+            continue
+        if not int(fields[2], 16) & ATF_COM:
+            continue
+        if interface and fields[5] != interface:
+            continue
+        results[fields[0]] = fields[3].upper()
+    return results
+
+
+def read_proc_arp(interface=None, filename=FILE_ARP):
+    """Read the resolved neighbours from /proc/net/arp"""
+    with open(filename, 'r') as file_arp:
+        return parse_proc_arp(file_arp, interface)
+
+
+def parse_neighbours(data, ifindex=None, family=socket.AF_INET):
+    """
+    Parse the RTM_NEWNEIGH messages of a rtnetlink dump and return a
+    dictionary with the MAC address for each resolved IP address
+    """
+    results = {}
+    offset = 0
+    while offset + NLMSG_HEADER.size <= len(data):
+        (length, message_type, _, _, _) = NLMSG_HEADER.unpack_from(data,
+                                                                   offset)
+        if length < NLMSG_HEADER.size or message_type == NLMSG_DONE:
+            break
+        if message_type == NLMSG_ERROR:
+            raise IOError('Error in the neighbours dump')
+        if message_type == RTM_NEWNEIGH:
+            start = offset + NLMSG_HEADER.size
+            (message_family, _, _, index, state, _, _) = \
+                NDMSG_HEADER.unpack_from(data, start)
+            address = None
+            mac_address = None
+            # Cycle over all the attributes
+            attribute = start + NDMSG_HEADER.size
+            while attribute + RTATTR_HEADER.size <= offset + length:
+                (attribute_length, attribute_type) = \
+                    RTATTR_HEADER.unpack_from(data, attribute)
+                if attribute_length < RTATTR_HEADER.size:
+                    break
+                value = data[attribute + RTATTR_HEADER.size:
+                             attribute + attribute_length]
+                if attribute_type == NDA_DST and len(value) in (4, 16):
+                    address = socket.inet_ntop(message_family, value)
+                elif attribute_type == NDA_LLADDR and len(value) == 6:
+                    mac_address = format_mac(value)
+                # Attributes are aligned to 4 bytes
+                attribute += (attribute_length + 3) & ~3
+            if (message_family == family and state & NUD_RESOLVED and
+                    address and mac_address and
+                    (ifindex is None or index == ifindex)):
+                results[address] = mac_address
+        # Messages are aligned to 4 bytes
+        offset += (length + 3) & ~3
+    return results
+
+
+def dump_neighbours(family=socket.AF_INET):
+    """Get the neighbours dump for the address family from rtnetlink"""
+    netlink = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+        netlink.bind((0, 0))
+        request = NDMSG_HEADER.pack(family, 0, 0, 0, 0, 0, 0)
+        netlink.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request),
+                                       RTM_GETNEIGH,
+                                       NLM_F_REQUEST | NLM_F_DUMP,
+                                       1,
+                                       0) + request)
+        # Read all the responses until the end of the dump
+        chunks = []
+        while True:
+            data = netlink.recv(65536)
+            chunks.append(data)
+            if not data or NLMSG_DONE in get_message_types(data):
+                break
+        return b''.join(chunks)
+    finally:
+        netlink.close()
+
+
+def get_message_types(data):
+    """Get the netlink message types in the data"""
+    results = []
+    offset = 0
+    while offset + NLMSG_HEADER.size <= len(data):
+        (length, message_type, _, _, _) = NLMSG_HEADER.unpack_from(data,
+                                                                   offset)
+        results.append(message_type)
+        if length < NLMSG_HEADER.size:
+            break
+        offset += (length + 3) & ~3
+    return results
+
+
+def get_neighbours(interface=None, family=socket.AF_INET):
+    """
+    Get the resolved neighbours from rtnetlink or from /proc/net/arp,
+    returns an empty dictionary if the neighbours table is not available
+    """
+    try:
+        return parse_neighbours(
+            dump_neighbours(family),
+            get_interface_index(interface) if interface else None,
+            family)
+    except (AttributeError, socket.error, IOError):
+        # rtnetlink is not available
+        pass
+    if family != socket.AF_INET:
+        # /proc/net/arp has only the IPv4 neighbours
+        return {}
+    try:
+        return read_proc_arp(interface)
+    except IOError:
+        return {}
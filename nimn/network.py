@@ -18,31 +18,220 @@
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
 ##
 
+import bisect
+import socket
+import struct
 import sys
 import ipaddress
 
 if sys.version_info.major == 3:
     unicode = str
+    xrange = range
+
+
+def address_to_int(address):
+    """Convert a dotted IPv4 address to integer"""
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def int_to_address(value):
+    """Convert an integer to dotted IPv4 address"""
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+class TargetSpace(object):
+    """
+    Set of IPv4 addresses saved as sorted intervals of integers, the
+    addresses are converted to strings only during the iteration
+    """
+    def __init__(self, intervals=()):
+        self.intervals = []
+        for (first, last) in intervals:
+            self.add(first, last)
+
+    def __len__(self):
+        return self.offsets[-1] if self.intervals else 0
+
+    def __iter__(self):
+        for (first, last) in self.intervals:
+            for value in xrange(first, last + 1):
+                yield int_to_address(value)
+
+    def __contains__(self, address):
+        value = (address_to_int(address)
+                 if isinstance(address, (str, unicode)) else address)
+        index = bisect.bisect_right(self.firsts, value) - 1
+        return index >= 0 and value <= self.intervals[index][1]
+
+    def __getitem__(self, position):
+        """Get the address at the position"""
+        return int_to_address(self.position_to_int(position))
+
+    def __str__(self):
+        return ','.join('%s-%s' % (int_to_address(first),
+                                   int_to_address(last))
+                        for (first, last) in self.intervals)
+
+    def add(self, first, last):
+        """Add the addresses from first to last integers"""
+        self.normalize(self.intervals + [(first, last)])
+
+    def exclude(self, first, last):
+        """Remove the addresses from first to last integers"""
+        intervals = []
+        for (start, end) in self.intervals:
+            if end < first or start > last:
+                intervals.append((start, end))
+                continue
+            if start < first:
+                intervals.append((start, first - 1))
+            if end > last:
+                intervals.append((last + 1, end))
+        self.normalize(intervals)
+
+    def normalize(self, intervals):
+        """Sort and merge the intervals and update the offsets"""
+        self.intervals = []
+        for (first, last) in sorted(intervals):
+            if self.intervals and first <= self.intervals[-1][1] + 1:
+                self.intervals[-1] = (self.intervals[-1][0],
+                                      max(last, self.intervals[-1][1]))
+            elif first <= last:
+                self.intervals.append((first, last))
+        self.firsts = [first for (first, last) in self.intervals]
+        # Number of addresses up to the end of each interval
+        self.offsets = []
+        count = 0
+        for (first, last) in self.intervals:
+            count += last - first + 1
+            self.offsets.append(count)
+
+    def position_to_int(self, position):
+        """Get the integer address at the position"""
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('Position out of the target space')
+        index = bisect.bisect_right(self.offsets, position)
+        previous = self.offsets[index - 1] if index else 0
+        return self.intervals[index][0] + position - previous
+
+    def shard(self, index, count):
+        """Get the index part of count contiguous parts"""
+        start = len(self) * index // count
+        end = len(self) * (index + 1) // count
+        if start >= end:
+            return TargetSpace()
+        first = self.position_to_int(start)
+        last = self.position_to_int(end - 1)
+        return TargetSpace((max(interval_first, first),
+                            min(interval_last, last))
+                           for (interval_first, interval_last)
+                           in self.intervals
+                           if interval_last >= first and
+                           interval_first <= last)
+
+    @staticmethod
+    def parse(spec):
+        """
+        Parse a targets specification with addresses, ranges and CIDRs
+        separated by commas, the items starting with ! are excluded
+        (e.g. 192.168.1.0/24,192.168.2.10-192.168.2.50,!192.168.1.1)
+        """
+        targets = TargetSpace()
+        exclusions = []
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            elif item.startswith('!'):
+                exclusions.append(parse_interval(item[1:]))
+            else:
+                targets.add(*parse_interval(item))
+        for (first, last) in exclusions:
+            targets.exclude(first, last)
+        return targets
+
+
+class InterleavedTargets(object):
+    """
+    Addresses of several target spaces taken in turn, the addresses already
+    in a previous target space are skipped
+    """
+    def __init__(self, spaces):
+        self.spaces = spaces
+        self.union = TargetSpace(interval
+                                 for space in spaces
+                                 for interval in space.intervals)
+
+    def __len__(self):
+        return len(self.union)
+
+    def __iter__(self):
+        active = [(index, iter(space))
+                  for (index, space) in enumerate(self.spaces)]
+        while active:
+            remaining = []
+            for (index, iterator) in active:
+                address = next(iterator, None)
+                if address is None:
+                    continue
+                remaining.append((index, iterator))
+                if not any(address in self.spaces[previous]
+                           for previous in range(index)):
+                    yield address
+            active = remaining
+
+    def __contains__(self, address):
+        return address in self.union
+
+
+def parse_interval(item):
+    """Get the first and the last integers for an address, range or CIDR"""
+    if '-' in item:
+        (ip1, ip2) = network_range(item)
+    elif '/' in item:
+        (ip1, ip2) = network_cidr(item)
+    else:
+        ip1 = ip2 = item
+    return (int(ipaddress.IPv4Address(unicode(ip1.strip()))),
+            int(ipaddress.IPv4Address(unicode(ip2.strip()))))
 
 
 class Network(object):
-    def __init__(self, name, ip1, ip2):
+    def __init__(self, name, ip1, ip2, targets=None):
         self.name = name
         self.ip1 = ip1
         self.ip2 = ip2
+        self.targets = targets
 
     def __repr__(self):
         return '<nimn.Network: %s>' % (self.name, )
 
+    def __str__(self):
+        if self.targets is not None:
+            return str(self.targets)
+        return '%s-%s' % (self.ip1, self.ip2)
+
     def range(self):
-        """Get the list of all the IPs in the network"""
-        ip1 = ipaddress.IPv4Address(unicode(self.ip1))
-        ip2 = ipaddress.IPv4Address(unicode(self.ip2))
-        results = []
-        while ip1 <= ip2:
-            results.append(str(ip1))
-            ip1 += 1
-        return results
+        """Get the target space of all the IPs in the network"""
+        if self.targets is None:
+            self.targets = TargetSpace(
+                ((int(ipaddress.IPv4Address(unicode(self.ip1))),
+                  int(ipaddress.IPv4Address(unicode(self.ip2)))), ))
+        return self.targets
+
+
+class LinkNetwork(object):
+    def __init__(self, name, interface):
+        self.name = name
+        self.interface = interface
+
+    def __repr__(self):
+        return '<nimn.LinkNetwork: %s>' % (self.name, )
+
+    def __str__(self):
+        return 'ff02::1%%%s' % (self.interface, )
 
 
 def network_range(ip_range):
@@ -59,5 +248,11 @@ def network_cidr(cidr):
     Return the first host and the last host of a network CIDR in the form of
     x.x.x.x/n (e.g. 192.168.1.8/24)
     """
-    hosts = list(ipaddress.ip_network(unicode(cidr)).hosts())
-    return (hosts[0], hosts[-1])
+    network = ipaddress.ip_network(unicode(cidr), strict=False)
+    first = network.network_address
+    last = network.broadcast_address
+    # Skip network and broadcast addresses except for /31 and /32
+    if network.num_addresses > 2:
+        first += 1
+        last -= 1
+    return (str(first), str(last))
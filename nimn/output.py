@@ -0,0 +1,154 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import csv
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Default seconds between each flush of the buffered output
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Max buffered lines before a flush
+MAX_BUFFERED_LINES = 1024
+
+
+class OutputWriter(object):
+    """
+    Buffered writer for the hosts results, the buffer is flushed from a
+    background thread at least every flush interval
+    """
+    def __init__(self, file=sys.stdout,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.file = file
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        if flush_interval > 0:
+            self.thread = threading.Thread(target=self.flusher)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def write(self, text):
+        """Add the text to the buffer"""
+        with self.lock:
+            self.buffer.append(text)
+
+    def flush(self):
+        """Write the buffered text to the file"""
+        with self.lock:
+            if self.buffer:
+                self.file.write(''.join(self.buffer))
+                self.buffer = []
+            self.file.flush()
+            self.last_flush = time.time()
+
+    def flusher(self):
+        """Flush the buffer when no host was written for a while"""
+        while not self.stopped.wait(self.flush_interval):
+            if (self.buffer and
+                    time.time() - self.last_flush >= self.flush_interval):
+                self.flush()
+
+    def close(self):
+        """Stop the background flushes and flush the buffer"""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        self.flush()
+
+    def begin(self, title=None):
+        """Start the output for a new scan"""
+        pass
+
+    def write_host(self, record):
+        """Write a host record and flush the buffer when needed"""
+        self.write_record(record)
+        if (len(self.buffer) >= MAX_BUFFERED_LINES or
+                time.time() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def write_record(self, record):
+        """Add the host record values separated by tabs to the buffer"""
+        self.write('\t'.join(str(value) for value in record.values()) +
+                   '\n')
+
+    def end(self):
+        """Complete the output for the scan"""
+        self.flush()
+
+
+class TableWriter(OutputWriter):
+    def begin(self, title=None):
+        """Write the table header"""
+        if title:
+            self.write('Network {title}\n'.format(title=title))
+        self.write('S IP Address          MAC address         Hostname'
+                   '                      Message\n')
+        self.write('-' * 120 + '\n')
+
+    def write_record(self, record):
+        """Add the host row to the buffer"""
+        self.write('{symbol} {ip:20}{mac:20}{hostname:30}{message}\n'.format(
+            symbol=record['status'],
+            ip=record['ip'],
+            mac=record['mac'] or '-',
+            hostname=record['hostname'],
+            message=record['message']))
+
+
+class CSVWriter(OutputWriter):
+    FIELDS = ('timestamp', 'network', 'status', 'ip', 'mac', 'hostname',
+              'alive', 'latency', 'message')
+
+    def __init__(self, file=sys.stdout,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        OutputWriter.__init__(self, file, flush_interval)
+        self.csv_writer = csv.writer(self, lineterminator='\n')
+        # Write the header only once
+        self.csv_writer.writerow(self.FIELDS)
+
+    def write_record(self, record):
+        """Add the host row to the buffer"""
+        self.csv_writer.writerow([record[field] for field in self.FIELDS])
+
+
+class NDJSONWriter(OutputWriter):
+    def write_record(self, record):
+        """Add the host JSON object to the buffer"""
+        self.write(json.dumps(record) + '\n')
+
+
+def host_record(timestamp, network, status, ip, mac, hostname, alive,
+                latency, message):
+    """Build the host record for the output writers"""
+    return OrderedDict((('timestamp', timestamp),
+                        ('network', network),
+                        ('status', status),
+                        ('ip', ip),
+                        ('mac', mac),
+                        ('hostname', hostname),
+                        ('alive', alive),
+                        ('latency', latency),
+                        ('message', message)))
@@ -0,0 +1,198 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import select
+import socket
+import struct
+
+from .tools.arping_socket import AF_PACKET, attach_filter, format_mac
+
+ETH_P_ALL = 0x0003
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+IPPROTO_UDP = 17
+DHCP_SERVER_PORT = 67
+DHCP_CLIENT_PORT = 68
+BOOTREQUEST = 1
+DHCP_MAGIC_COOKIE = 0x63825363
+DHCP_OPTION_PAD = 0
+DHCP_OPTION_HOSTNAME = 12
+DHCP_OPTION_REQUESTED_ADDRESS = 50
+DHCP_OPTION_MESSAGE_TYPE = 53
+DHCP_OPTION_END = 255
+DHCPACK = 5
+# Kernel BPF filter to accept only the ARP packets and the DHCP messages
+ARP_DHCP_FILTER = (
+    (0x28, 0, 0, 12),           # ldh [12] (ethernet type)
+    (0x15, 9, 0, ETH_P_ARP),    # jeq #ETH_P_ARP, accept, next
+    (0x15, 0, 9, ETH_P_IP),     # jeq #ETH_P_IP, next, drop
+    (0x30, 0, 0, 23),           # ldb [23] (IP protocol)
+    (0x15, 0, 7, IPPROTO_UDP),  # jeq #IPPROTO_UDP, next, drop
+    (0x28, 0, 0, 20),           # ldh [20] (IP fragment offset)
+    (0x45, 5, 0, 0x1fff),       # jset #0x1fff, drop, next
+    (0xb1, 0, 0, 14),           # ldxb 4*([14]&0xf) (IP header length)
+    (0x48, 0, 0, 16),           # ldh [x+16] (UDP destination port)
+    (0x15, 1, 0, DHCP_SERVER_PORT),     # jeq #67, accept, next
+    (0x15, 0, 1, DHCP_CLIENT_PORT),     # jeq #68, accept, drop
+    (0x06, 0, 0, 0xffff),       # ret #0xffff (accept)
+    (0x06, 0, 0, 0),            # ret #0 (drop)
+)
+SOURCE_ARP = 'ARP'
+SOURCE_DHCP = 'DHCP'
+PCAP_MAGICS = (0xa1b2c3d4, 0xa1b23c4d)
+LINKTYPE_ETHERNET = 1
+# Seconds between the checks for the stop request
+STOP_INTERVAL = 0.5
+
+
+def parse_dhcp_options(data, offset):
+    """Get a dictionary with the value of each DHCP option"""
+    options = {}
+    while offset < len(data):
+        code = struct.unpack_from('!B', data, offset)[0]
+        if code == DHCP_OPTION_END:
+            break
+        elif code == DHCP_OPTION_PAD:
+            offset += 1
+            continue
+        length = struct.unpack_from('!B', data, offset + 1)[0]
+        options[code] = data[offset + 2:offset + 2 + length]
+        offset += 2 + length
+    return options
+
+
+def parse_frame(frame):
+    """
+    Get the (address, MAC address, hostname, source) announced by the host
+    sending an ARP packet or by a DHCP message, returns None for the other
+    frames. The address is None for the DHCP requests without an address
+    """
+    ethernet_type = struct.unpack_from('!H', frame, 12)[0]
+    if ethernet_type == ETH_P_ARP:
+        (sender_mac, sender_address) = struct.unpack_from('!6s4s', frame, 22)
+        if sender_address == b'\x00' * 4:
+            # ARP probe from a host checking its new address
+            return None
+        return (socket.inet_ntoa(sender_address), format_mac(sender_mac),
+                None, SOURCE_ARP)
+    elif ethernet_type != ETH_P_IP:
+        return None
+    # Skip the IP header and the UDP header
+    offset = 14 + (struct.unpack_from('!B', frame, 14)[0] & 0x0f) * 4 + 8
+    (operation, client_address, your_address, client_mac) = \
+        struct.unpack_from('!B11x4s4s8x6s', frame, offset)
+    magic_cookie = struct.unpack_from('!I', frame, offset + 236)[0]
+    if magic_cookie != DHCP_MAGIC_COOKIE:
+        return None
+    options = parse_dhcp_options(frame, offset + 240)
+    hostname = options.get(DHCP_OPTION_HOSTNAME, b'').rstrip(b'\x00')
+    if operation == BOOTREQUEST:
+        # The address of the client or the address requested by the client
+        address = (client_address if client_address != b'\x00' * 4
+                   else options.get(DHCP_OPTION_REQUESTED_ADDRESS))
+    elif options.get(DHCP_OPTION_MESSAGE_TYPE) == struct.pack('!B', DHCPACK):
+        # The address assigned by the server
+        address = your_address
+    else:
+        return None
+    return (socket.inet_ntoa(address) if address and len(address) == 4
+            else None,
+            format_mac(client_mac),
+            hostname.decode('utf-8', 'replace') or None,
+            SOURCE_DHCP)
+
+
+def read_pcap(filename):
+    """Read the ethernet frames from a pcap capture file"""
+    with open(filename, 'rb') as file_pcap:
+        header = file_pcap.read(24)
+        if len(header) < 24:
+            raise ValueError('Not a pcap file')
+        for byte_order in ('<', '>'):
+            if struct.unpack(byte_order + 'I', header[:4])[0] in PCAP_MAGICS:
+                break
+        else:
+            raise ValueError('Not a pcap file')
+        if struct.unpack(byte_order + 'I', header[20:24])[0] != \
+                LINKTYPE_ETHERNET:
+            raise ValueError('Not an ethernet capture')
+        while True:
+            record = file_pcap.read(16)
+            if len(record) < 16:
+                break
+            length = struct.unpack(byte_order + '8xII', record)[0]
+            yield file_pcap.read(length)
+
+
+class PassiveListener(object):
+    """
+    Find the hosts from the ARP and DHCP traffic on the interface, or from
+    a pcap capture file, without sending any request
+    """
+    def __init__(self, settings, interface=None, filename=None):
+        self.settings = settings
+        self.interface = interface
+        self.filename = filename
+        self.stopped = False
+        # Hostnames from the DHCP messages for each MAC address
+        self.hostnames = {}
+
+    def stop(self):
+        """Stop listening after the current frame"""
+        self.stopped = True
+
+    def listen(self):
+        """Yield (address, MAC address, hostname, source) for each host"""
+        frames = (read_pcap(self.filename) if self.filename
+                  else self.receive_frames())
+        for frame in frames:
+            if self.stopped:
+                break
+            try:
+                host = parse_frame(frame)
+            except struct.error:
+                # Truncated frame
+                continue
+            if host is None:
+                continue
+            (address, mac_address, hostname, source) = host
+            if hostname:
+                self.hostnames[mac_address] = hostname
+            if address:
+                yield (address, mac_address,
+                       self.hostnames.get(mac_address), source)
+
+    def receive_frames(self):
+        """Yield the ARP and DHCP frames received from the interface"""
+        if AF_PACKET is None:
+            raise socket.error('Packet sockets are not available')
+        packet_socket = socket.socket(AF_PACKET, socket.SOCK_RAW,
+                                      socket.htons(ETH_P_ALL))
+        try:
+            attach_filter(packet_socket, ARP_DHCP_FILTER)
+            if self.interface:
+                packet_socket.bind((self.interface, 0))
+            while not self.stopped:
+                (readable, _, _) = select.select([packet_socket], [], [],
+                                                 STOP_INTERVAL)
+                if readable:
+                    yield packet_socket.recv(65535)
+        finally:
+            packet_socket.close()
@@ -0,0 +1,149 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import sys
+import threading
+
+if sys.version_info.major == 3:
+    import queue
+else:
+    import Queue as queue
+
+from . import profiler
+from .constants import (TOOLS_LIST,
+                        TOOL_PING,
+                        TOOL_HOSTNAME,
+                        TOOL_TCP)
+from .tools.tool_results import ToolResults, is_alive
+
+
+def parse_stages(pipeline):
+    """
+    Parse a pipeline specification in the form of stages separated by :
+    with tools separated by , (e.g. arping,ping:hostname)
+    """
+    stages = []
+    for stage in pipeline.split(':'):
+        tools = tuple(tool.strip() for tool in stage.split(',')
+                      if tool.strip())
+        for tool in tools:
+            if tool not in TOOLS_LIST:
+                raise ValueError('Unknown tool: {tool}'.format(tool=tool))
+        if tools:
+            stages.append(tools)
+    if not stages:
+        raise ValueError('No stages in pipeline')
+    return tuple(stages)
+
+
+def empty_results(tool, address, command='skipped', error=''):
+    """Get the results for a tool not executed for the address"""
+    if tool in (TOOL_PING, TOOL_TCP):
+        data = False
+    elif tool == TOOL_HOSTNAME:
+        data = address
+    else:
+        data = None
+    return ToolResults(data, command, '', error)
+
+
+class Pipeline(object):
+    def __init__(self, tools, stages, settings):
+        self.tools = tools
+        self.stages = stages
+        # Each request is limited by the concurrency controller of its tool
+        self.max_workers = max(tool.controller.maximum
+                               for tool in tools.values())
+
+    def scan(self, addresses):
+        """
+        Check each address through the stages, the next stages are executed
+        only for the hosts found alive. Yields (address, data) as soon as
+        each host has completed its stages
+        """
+        for tool in self.tools.values():
+            tool.controller.reset()
+        queue_results = queue.Queue()
+        # The addresses are extracted lazily by the workers
+        incoming = iter(addresses)
+        lock = threading.Lock()
+        count = len(addresses)
+        # Setup running worker threads
+        workers = []
+        for _ in range(min(self.max_workers, count)):
+            worker_thread = threading.Thread(target=self.consumer,
+                                             args=(incoming,
+                                                   lock,
+                                                   queue_results))
+            worker_thread.daemon = True
+            worker_thread.start()
+            workers.append(worker_thread)
+        for _ in range(count):
+            yield queue_results.get()
+        for worker in workers:
+            worker.join()
+
+    def consumer(self, incoming, lock, queue_results):
+        """Extract addresses from the iterator and process them"""
+        while True:
+            with lock:
+                address = next(incoming, None)
+            if address is None:
+                # No more data to process
+                break
+            queue_results.put((address, self.process_host(address)))
+
+    def process_host(self, address):
+        """Execute the pipeline for the host in a single span"""
+        with profiler.tracer.span('host', 'pipeline', address=address):
+            return self.process_stages(address)
+
+    def process_stages(self, address):
+        """Execute the tools for each stage of the pipeline"""
+        data = {}
+        for index, stage in enumerate(self.stages):
+            if index and not is_alive(data):
+                # Skip the next stages for the hosts not alive
+                break
+            # Execute the other tools of the stage in parallel threads
+            threads = []
+            for tool in stage[1:]:
+                tool_thread = threading.Thread(target=self.call_tool,
+                                               args=(tool, address, data))
+                tool_thread.daemon = True
+                tool_thread.start()
+                threads.append(tool_thread)
+            self.call_tool(stage[0], address, data)
+            # Await all the tools before checking the host
+            for tool_thread in threads:
+                tool_thread.join()
+        for tool in self.tools:
+            if tool not in data:
+                data[tool] = empty_results(tool, address)
+        return data
+
+    def call_tool(self, tool, address, data):
+        """Execute the tool for the host and save its results in data"""
+        try:
+            data[tool] = self.tools[tool].call(address)
+        except Exception as error:
+            data[tool] = empty_results(tool, address,
+                                       command=None,
+                                       error=str(error))
@@ -0,0 +1,180 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import collections
+import json
+import os
+import re
+import threading
+import time
+
+PROFILE_CHROME = 'chrome'
+PROFILE_FOLDED = 'folded'
+PROFILE_FORMATS_LIST = (PROFILE_CHROME, PROFILE_FOLDED)
+
+# Completed span with times in seconds
+Span = collections.namedtuple('Span', ('name', 'category', 'thread',
+                                       'started', 'ended', 'args'))
+
+
+class NullSpan(object):
+    """Span context doing nothing when the tracing is disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullTracer(object):
+    """Tracer doing nothing, used when the profiling is disabled"""
+    enabled = False
+    null_span = NullSpan()
+
+    def span(self, name, category, **args):
+        return self.null_span
+
+    def add(self, name, category, started, ended, **args):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SpanContext(object):
+    """Record a span for the code executed in the context"""
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add(self.name, self.category, self.started, time.time(),
+                        **self.args)
+        return False
+
+
+class Tracer(object):
+    """Record timed spans for the scan phases, the tools and the hosts"""
+    enabled = True
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def span(self, name, category, **args):
+        """Get a context recording a span for the executed code"""
+        return SpanContext(self, name, category, args)
+
+    def add(self, name, category, started, ended, **args):
+        """Record a completed span"""
+        span = Span(name, category, threading.current_thread().name,
+                    started, ended, args)
+        with self.lock:
+            self.spans.append(span)
+
+    def clear(self):
+        """Drop the recorded spans and restart the trace time"""
+        with self.lock:
+            self.spans = []
+            self.started = time.time()
+
+    def write(self, filename, format=PROFILE_CHROME):
+        """Write the spans as a Chrome trace or as folded stacks"""
+        with self.lock:
+            spans = list(self.spans)
+        with open(filename, 'w') as file_trace:
+            if format == PROFILE_FOLDED:
+                for (stack, duration) in sorted(get_folded(spans).items()):
+                    file_trace.write('{stack} {duration}\n'.format(
+                        stack=stack, duration=duration))
+            else:
+                json.dump(get_chrome_trace(spans, self.started), file_trace)
+
+
+def get_chrome_trace(spans, started):
+    """Get the spans as Chrome trace events with times in microseconds"""
+    threads = {}
+    events = []
+    for span in spans:
+        thread_id = threads.setdefault(span.thread, len(threads) + 1)
+        events.append({'name': span.name,
+                       'cat': span.category,
+                       'ph': 'X',
+                       'ts': int((span.started - started) * 1000000),
+                       'dur': int((span.ended - span.started) * 1000000),
+                       'pid': os.getpid(),
+                       'tid': thread_id,
+                       'args': dict((key, str(value))
+                                    for (key, value) in span.args.items())})
+    for (thread, thread_id) in threads.items():
+        events.append({'name': 'thread_name',
+                       'ph': 'M',
+                       'pid': os.getpid(),
+                       'tid': thread_id,
+                       'args': {'name': thread}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def get_folded(spans):
+    """
+    Get the self time in microseconds for each stack of nested spans in
+    the same thread, as name;name;name for flamegraph.pl, the stacks of
+    the numbered worker threads are merged
+    """
+    results = collections.defaultdict(int)
+    threads = collections.defaultdict(list)
+    for span in spans:
+        threads[span.thread].append(span)
+    for (thread, thread_spans) in threads.items():
+        # The outer spans come first for the same starting time
+        thread_spans.sort(key=lambda span: (span.started, -span.ended))
+        stack = []
+        for span in thread_spans:
+            while stack and span.started >= stack[-1][0].ended:
+                stack.pop()
+            duration = int((span.ended - span.started) * 1000000)
+            if stack:
+                # Remove the nested time from the parent self time
+                results[stack[-1][1]] -= duration
+            path = '{parent};{name}'.format(
+                parent=stack[-1][1] if stack else re.sub(r'-\d+', '',
+                                                         thread),
+                name=span.name)
+            results[path] += duration
+            stack.append((span, path))
+    return dict((stack, duration) for (stack, duration) in results.items()
+                if duration > 0)
+
+
+# Tracer used by the tools and the application
+tracer = NullTracer()
+
+
+def set_tracer(new_tracer):
+    """Replace the tracer used by the tools and the application"""
+    global tracer
+    tracer = new_tracer
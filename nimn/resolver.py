@@ -0,0 +1,276 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import binascii
+import collections
+import errno
+import random
+import select
+import socket
+import struct
+import time
+
+FILE_RESOLV_CONF = '/etc/resolv.conf'
+DNS_PORT = 53
+DNS_FLAG_RD = 0x0100
+DNS_FLAG_QR = 0x8000
+DNS_TYPE_PTR = 12
+DNS_TYPE_SOA = 6
+DNS_CLASS_IN = 1
+DNS_RCODE_NOERROR = 0
+DNS_RCODE_NXDOMAIN = 3
+DNS_HEADER = struct.Struct('!HHHHHH')
+DNS_RECORD = struct.Struct('!HHIH')
+# Default seconds to wait for each query
+DEFAULT_TIMEOUT = 2
+# Default number of rounds over all the nameservers
+DEFAULT_ATTEMPTS = 2
+# TTL for negative answers without a SOA record and max negative TTL
+NEGATIVE_TTL = 300
+NEGATIVE_TTL_MAX = 3600
+# Errors for a socket that cannot send or receive more data for now
+SOCKET_BUSY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+
+
+def read_nameservers(filename=FILE_RESOLV_CONF):
+    """Get the IPv4 nameservers list from resolv.conf"""
+    results = []
+    try:
+        with open(filename, 'r') as file_resolv:
+            for line in file_resolv:
+                fields = line.split()
+                if (len(fields) >= 2 and fields[0] == 'nameserver' and
+                        ':' not in fields[1]):
+                    results.append(fields[1])
+    except IOError:
+        pass
+    return results
+
+
+def reverse_name(address):
+    """Get the reverse lookup name for an IPv4 or IPv6 address"""
+    if ':' in address:
+        digits = binascii.hexlify(socket.inet_pton(socket.AF_INET6,
+                                                   address)).decode('ascii')
+        return '.'.join(reversed(digits)) + '.ip6.arpa'
+    return '.'.join(reversed(address.split('.'))) + '.in-addr.arpa'
+
+
+def build_query(query_id, name):
+    """Build a recursive DNS query for the PTR record of the name"""
+    return build_questions(query_id, DNS_FLAG_RD, [name])
+
+
+def build_questions(query_id, flags, names):
+    """Build a DNS query for the PTR records of all the names"""
+    data = DNS_HEADER.pack(query_id, flags, len(names), 0, 0, 0)
+    for name in names:
+        for label in name.split('.'):
+            data += struct.pack('!B', len(label)) + label.encode('ascii')
+        data += struct.pack('!BHH', 0, DNS_TYPE_PTR, DNS_CLASS_IN)
+    return data
+
+
+def read_name(data, offset):
+    """Read a possibly compressed name and return it with the next offset"""
+    labels = []
+    next_offset = None
+    # Limit the pointers to avoid loops
+    for jump in range(64):
+        length = struct.unpack_from('!B', data, offset)[0]
+        if length & 0xc0 == 0xc0:
+            # Pointer to another name
+            if next_offset is None:
+                next_offset = offset + 2
+            offset = struct.unpack_from('!H', data, offset)[0] & 0x3fff
+        elif length == 0:
+            break
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode(
+                'utf-8', 'replace'))
+            offset += 1 + length
+    else:
+        raise ValueError('Too many pointers in name')
+    return ('.'.join(labels), offset + 1 if next_offset is None
+            else next_offset)
+
+
+def parse_response(data):
+    """
+    Parse a DNS response and return the query ID, the response code,
+    the question name, the PTR hostname and its TTL.
+    For negative answers the TTL is taken from the SOA record
+    """
+    (query_id, flags, questions, answers, authorities, _) = \
+        DNS_HEADER.unpack_from(data)
+    if not flags & DNS_FLAG_QR:
+        raise ValueError('Not a DNS response')
+    offset = DNS_HEADER.size
+    question = None
+    for index in range(questions):
+        (question, offset) = read_name(data, offset)
+        offset += 4
+    hostname = None
+    ttl = None
+    for index in range(answers + authorities):
+        offset = read_name(data, offset)[1]
+        (record_type, _, record_ttl, length) = DNS_RECORD.unpack_from(data,
+                                                                      offset)
+        offset += DNS_RECORD.size
+        if index < answers:
+            if record_type == DNS_TYPE_PTR and hostname is None:
+                hostname = read_name(data, offset)[0]
+                ttl = record_ttl
+        elif record_type == DNS_TYPE_SOA and hostname is None:
+            # Skip primary nameserver and mailbox to get the minimum TTL
+            soa_offset = read_name(data, read_name(data, offset)[1])[1]
+            minimum = struct.unpack_from('!5I', data, soa_offset)[4]
+            ttl = min(record_ttl, minimum)
+        offset += length
+    return (query_id, flags & 0x0f, question, hostname, ttl)
+
+
+def parse_answers(data):
+    """
+    Parse a DNS response and return the query ID and the list of the
+    (name, hostname) for each PTR answer
+    """
+    (query_id, flags, questions, answers, _, _) = \
+        DNS_HEADER.unpack_from(data)
+    if not flags & DNS_FLAG_QR:
+        raise ValueError('Not a DNS response')
+    offset = DNS_HEADER.size
+    for index in range(questions):
+        offset = read_name(data, offset)[1] + 4
+    results = []
+    for index in range(answers):
+        (name, offset) = read_name(data, offset)
+        (record_type, _, _, length) = DNS_RECORD.unpack_from(data, offset)
+        offset += DNS_RECORD.size
+        if record_type == DNS_TYPE_PTR:
+            results.append((name, read_name(data, offset)[0]))
+        offset += length
+    return (query_id, results)
+
+
+class Resolver(object):
+    def __init__(self, nameservers, timeout=DEFAULT_TIMEOUT,
+                 max_pending=256, attempts=DEFAULT_ATTEMPTS, port=DNS_PORT):
+        if not nameservers:
+            raise ValueError('No nameservers to query')
+        self.nameservers = nameservers
+        self.timeout = timeout
+        self.max_pending = min(max(max_pending, 1), 4096)
+        self.attempts = attempts * len(nameservers)
+        self.port = port
+
+    def resolve(self, addresses):
+        """
+        Send the PTR queries for all the addresses and return a dictionary
+        with the (hostname, ttl) for each answered address, with None as
+        hostname for the negative answers.
+        The addresses without an answer are missing from the results
+        """
+        results = {}
+        queue = collections.deque((address, 0) for address in addresses)
+        pending = {}
+        expirations = collections.deque()
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.setblocking(False)
+        try:
+            while queue or pending:
+                # Send new queries up to the max pending queries
+                while queue and len(pending) < self.max_pending:
+                    (address, attempt) = queue[0]
+                    query_id = random.getrandbits(16)
+                    while query_id in pending:
+                        query_id = random.getrandbits(16)
+                    nameserver = self.nameservers[attempt %
+                                                  len(self.nameservers)]
+                    try:
+                        udp_socket.sendto(
+                            build_query(query_id, reverse_name(address)),
+                            (nameserver, self.port))
+                    except socket.error as error:
+                        if error.errno in SOCKET_BUSY_ERRORS:
+                            # Wait for the socket to send the queued data
+                            break
+                        # Unreachable nameserver, try the next one
+                        queue.popleft()
+                        if attempt + 1 < self.attempts:
+                            queue.append((address, attempt + 1))
+                        continue
+                    queue.popleft()
+                    deadline = time.time() + self.timeout
+                    pending[query_id] = (address, attempt, nameserver)
+                    expirations.append((deadline, query_id, attempt))
+                # Await the responses until the first query expires
+                wait = (max(expirations[0][0] - time.time(), 0)
+                        if expirations else 0.01)
+                (readable, _, _) = select.select([udp_socket], [], [], wait)
+                if readable:
+                    self.receive_responses(udp_socket, pending, queue,
+                                           results)
+                # Retry the expired queries
+                now = time.time()
+                while expirations and expirations[0][0] <= now:
+                    (_, query_id, attempt) = expirations.popleft()
+                    if (query_id in pending and
+                            pending[query_id][1] == attempt):
+                        address = pending.pop(query_id)[0]
+                        if attempt + 1 < self.attempts:
+                            queue.append((address, attempt + 1))
+        finally:
+            udp_socket.close()
+        return results
+
+    def receive_responses(self, udp_socket, pending, queue, results):
+        """Receive all the available responses"""
+        while True:
+            try:
+                (data, (source, _)) = udp_socket.recvfrom(4096)
+            except socket.error as error:
+                if error.errno in SOCKET_BUSY_ERRORS:
+                    # No more responses available
+                    return
+                raise
+            try:
+                (query_id, rcode, question, hostname, ttl) = \
+                    parse_response(data)
+            except (struct.error, ValueError):
+                # Invalid response
+                continue
+            if query_id not in pending:
+                continue
+            (address, attempt, nameserver) = pending[query_id]
+            if (source != nameserver or question is None or
+                    question.lower() != reverse_name(address)):
+                # Spoofed or mismatched response
+                continue
+            del pending[query_id]
+            if rcode == DNS_RCODE_NOERROR and hostname:
+                results[address] = (hostname, ttl)
+            elif rcode in (DNS_RCODE_NOERROR, DNS_RCODE_NXDOMAIN):
+                # Negative answer
+                results[address] = (None, min(
+                    NEGATIVE_TTL if ttl is None else ttl, NEGATIVE_TTL_MAX))
+            elif attempt + 1 < self.attempts:
+                # Server failure, try the next nameserver
+                queue.append((address, attempt + 1))
@@ -0,0 +1,129 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import heapq
+import random
+import threading
+import time
+
+from .constants import OVERRUN_SKIP
+
+# Default seconds between the scans of each network
+DEFAULT_INTERVAL = 300
+
+
+def parse_intervals(intervals):
+    """
+    Parse the intervals specification as seconds for all the networks or as
+    name=seconds separated by , (e.g. 600,lan=60,dmz=120), the default
+    interval is saved with the None key
+    """
+    results = {None: DEFAULT_INTERVAL}
+    for item in intervals.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        elif '=' in item:
+            (name, value) = [part.strip() for part in item.split('=', 1)]
+        else:
+            (name, value) = (None, item)
+        try:
+            results[name] = float(value)
+        except ValueError:
+            raise ValueError('Invalid interval: {value}'.format(value=value))
+        if results[name] <= 0:
+            raise ValueError('Invalid interval: {value}'.format(value=value))
+    return results
+
+
+class Scheduler(object):
+    """
+    Start the scans of the networks on a fixed cadence, each scan is due
+    after the interval from the previous due time plus a random jitter,
+    regardless of the scan duration
+    """
+    def __init__(self, settings, overrun=OVERRUN_SKIP):
+        self.settings = settings
+        self.overrun = overrun
+        # Queue of (due time, index, base time, interval, jitter, network)
+        self.queue = []
+        self.running = []
+        self.stopped = threading.Event()
+
+    def add(self, network, interval, jitter=0, start=None):
+        """Add a network to scan from the start time"""
+        base = time.time() if start is None else start
+        heapq.heappush(self.queue, (base + random.uniform(0, jitter),
+                                    len(self.queue) + len(self.running),
+                                    base,
+                                    interval,
+                                    jitter,
+                                    network))
+
+    def stop(self):
+        """Stop the scheduler after the running scans"""
+        self.settings.log_normal('Stopping after the running scans')
+        self.stopped.set()
+
+    def get_due(self):
+        """
+        Await the next due scans and return their networks, returns None
+        when the scheduler is stopped
+        """
+        while not self.stopped.is_set():
+            delay = self.queue[0][0] - time.time()
+            if delay <= 0:
+                break
+            self.stopped.wait(delay)
+        if self.stopped.is_set():
+            return None
+        now = time.time()
+        self.running = []
+        while self.queue and self.queue[0][0] <= now:
+            self.running.append(heapq.heappop(self.queue))
+        return [entry[5] for entry in self.running]
+
+    def reschedule(self):
+        """Schedule the next scans for the completed networks"""
+        now = time.time()
+        for (_, index, base, interval, jitter, network) in self.running:
+            base += interval
+            if base < now:
+                # The scan has overrun its interval
+                if self.overrun == OVERRUN_SKIP:
+                    skipped = int((now - base) // interval) + 1
+                    base += skipped * interval
+                    self.settings.log_normal(
+                        'Scan for {network} overrun, skipped {skipped} '
+                        'scans'.format(network=network, skipped=skipped))
+                else:
+                    # Start only the last missed scan immediately
+                    base += int((now - base) // interval) * interval
+                    self.settings.log_normal(
+                        'Scan for {network} overrun, starting the next '
+                        'scan now'.format(network=network))
+            due = base + random.uniform(0, jitter)
+            self.settings.log_verbose(
+                'Next scan for {network} in {delay:.1f} seconds'.format(
+                    network=network,
+                    delay=due - now))
+            heapq.heappush(self.queue,
+                           (due, index, base, interval, jitter, network))
+        self.running = []
@@ -0,0 +1,90 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import time
+
+from .network import TargetSpace, address_to_int
+
+# Default days since the last reply for the warm hosts
+DEFAULT_WARM_DAYS = 7
+
+
+def parse_tiers(tiers):
+    """
+    Parse the tiers specification as WARM/FULL, where the warm hosts are
+    checked every WARM iterations and all the addresses every FULL
+    iterations (e.g. 4/16)
+    """
+    try:
+        (warm, full) = [int(value) for value in tiers.split('/')]
+        if not 1 <= warm <= full:
+            raise ValueError
+    except ValueError:
+        raise ValueError('{value} is not in the form WARM/FULL with '
+                         '1 <= WARM <= FULL'.format(value=tiers))
+    return (warm, full)
+
+
+class TierSelector(object):
+    """
+    Select the addresses to check in each iteration from the hosts history:
+    the hosts alive in their last check are checked in every iteration, the
+    hosts seen alive in the last days every few iterations and the dark
+    addresses only during the full sweeps
+    """
+    def __init__(self, settings, warm_every, full_every,
+                 warm_days=DEFAULT_WARM_DAYS):
+        self.settings = settings
+        self.warm_every = warm_every
+        self.full_every = full_every
+        self.warm_days = warm_days
+        # Iterations completed for each network
+        self.iterations = {}
+
+    def select(self, network, seen):
+        """
+        Get the target space to check for the network from the seen hosts
+        as {address: (alive, last seen timestamp)}, returns None for a full
+        sweep of the network
+        """
+        iteration = self.iterations.get(str(network), 0)
+        self.iterations[str(network)] = iteration + 1
+        if iteration % self.full_every == 0:
+            self.settings.log_verbose(
+                'Full sweep for {network}'.format(network=network))
+            return None
+        targets = network.range()
+        warm = iteration % self.warm_every == 0
+        oldest = time.time() - self.warm_days * 86400
+        values = []
+        for (address, (alive, last_seen)) in seen.items():
+            if address not in targets:
+                continue
+            elif alive or (warm and last_seen >= oldest):
+                values.append(address_to_int(address))
+        selected = TargetSpace()
+        selected.normalize([(value, value) for value in values])
+        self.settings.log_verbose(
+            'Checking {count} of {total} addresses for {network} '
+            '({tiers})'.format(count=len(selected),
+                               total=len(targets),
+                               network=network,
+                               tiers='hot and warm' if warm else 'hot'))
+        return selected
@@ -18,19 +18,25 @@
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
 ##
 
+import functools
 import subprocess
 import platform
 import re
+import time
 
+from .async_queue import AsyncQueue
 from .managed_queue import ManagedQueue
 from .tool_results import ToolResults
+from ..constants import TOOL_ARPING
+from .. import profiler
+from ..metrics import SPAWN_SECONDS
 
 
-class ARPing(ManagedQueue):
-    def __init__(self, settings):
-        ManagedQueue.__init__(self, self.do_process, settings)
+class ARPingCommand(object):
+    name = TOOL_ARPING
 
-    def do_process(self, address):
+    def get_command(self, address):
+        """Get the command line to check the address"""
         if platform.system().lower() == 'windows':
             command = ['arp-ping',
                        '-n',
@@ -49,11 +55,10 @@ class ARPing(ManagedQueue):
                 command.append(str(self.timeout))
         # Add destination address
         command.append(address)
-        process = subprocess.Popen(command,
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
-        # Get resulting MAC address
-        (stdout, stderr) = process.communicate()
+        return command
+
+    def get_results(self, address, command, returncode, stdout, stderr):
+        """Get the resulting MAC address from the command output"""
         match = re.compile('(?:[0-9a-fA-F]:?){12}')
         mac_address = None
         for line in stdout.decode('utf-8').split('\n'):
@@ -63,3 +68,31 @@ class ARPing(ManagedQueue):
                     mac_address = str(matches[0])
                     break
         return ToolResults(mac_address, command, stdout, stderr)
+
+
+class ARPing(ARPingCommand, ManagedQueue):
+    def __init__(self, settings):
+        ManagedQueue.__init__(self, self.do_process, settings)
+
+    def do_process(self, address):
+        command = self.get_command(address)
+        started = time.time()
+        process = subprocess.Popen(command,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        spawned = time.time()
+        SPAWN_SECONDS.observe((self.name, ), spawned - started)
+        profiler.tracer.add('spawn', 'subprocess', started, spawned,
+                            command=command[0])
+        (stdout, stderr) = process.communicate()
+        return self.get_results(address, command, process.poll(),
+                                stdout, stderr)
+
+
+class ARPingAsync(ARPingCommand, AsyncQueue):
+    def __init__(self, settings):
+        AsyncQueue.__init__(self, self.do_process, settings)
+
+    def do_process(self, address):
+        return self.run_command(self.get_command(address),
+                                functools.partial(self.get_results, address))
@@ -0,0 +1,83 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import re
+
+from .arping import ARPing
+from .arping_socket import get_route_interface
+from .batch_command import BatchCommand, which
+from .tool_results import ToolResults
+
+# Reply line printed by arp-scan --plain --quiet (e.g. 10.0.0.1 00:11:...)
+ARP_SCAN_REPLY = re.compile(
+    b'^([0-9.]+)\\s+((?:[0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})')
+
+
+class ARPingBatch(BatchCommand, ARPing):
+    def __init__(self, settings):
+        ARPing.__init__(self, settings)
+        self.settings = settings
+
+    def get_batch_command(self):
+        """
+        Get the arp-scan command line to check the addresses from the
+        standard input, returns None if arp-scan or the interface are not
+        available
+        """
+        if not which('arp-scan'):
+            return None
+        interface = self.interface
+        if not interface:
+            # Use the interface to reach the network
+            try:
+                interface = get_route_interface(self.addresses[0])
+            except (IOError, OSError) as error:
+                self.settings.log_verbose_max(
+                    'Unable to read the routes: {error}'.format(error=error))
+            if not interface:
+                return None
+        command = ['arp-scan', '--plain', '--quiet', '--file=-',
+                   '--interface={interface}'.format(interface=interface),
+                   '--retry={retry}'.format(retry=self.checks)]
+        # If provided, add timeout for each request
+        if self.timeout:
+            command.append('--timeout={timeout}'.format(
+                timeout=self.timeout * 1000))
+        # If provided, add the interval between the requests
+        if self.controller.rate_limiter:
+            command.append('--interval={interval}'.format(interval=max(
+                int(self.controller.rate_limiter.interval * 1000), 1)))
+        return command
+
+    def parse_batch_line(self, line):
+        """Get the address and the MAC address from a reply line"""
+        match = ARP_SCAN_REPLY.match(line)
+        if not match:
+            return None
+        return (match.group(1).decode('utf-8'),
+                match.group(2).decode('utf-8').upper())
+
+    def get_batch_results(self, address, reply):
+        """Get the results from the reply line"""
+        command = ' '.join(self.batch_command)
+        if reply is None:
+            return ToolResults(None, command, b'', b'')
+        (line, mac_address) = reply
+        return ToolResults(mac_address, command, line, b'')
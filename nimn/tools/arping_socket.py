@@ -0,0 +1,191 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import socket
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on Windows
+    fcntl = None
+
+from .arping import ARPing
+from .socket_sweep import SocketSweep
+from .tool_results import ToolResults
+
+AF_PACKET = getattr(socket, 'AF_PACKET', None)
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ARP_REQUEST = 1
+ARP_REPLY = 2
+SIOCGIFADDR = 0x8915
+SO_ATTACH_FILTER = 26
+FILE_ROUTES = '/proc/net/route'
+# Kernel BPF filter to accept only the ARP replies
+ARP_REPLY_FILTER = (
+    (0x28, 0, 0, 12),           # ldh [12] (ethernet type)
+    (0x15, 0, 3, ETH_P_ARP),    # jeq #ETH_P_ARP, next, drop
+    (0x28, 0, 0, 20),           # ldh [20] (ARP operation)
+    (0x15, 0, 1, ARP_REPLY),    # jeq #ARP_REPLY, next, drop
+    (0x06, 0, 0, 0xffff),       # ret #0xffff (accept)
+    (0x06, 0, 0, 0),            # ret #0 (drop)
+)
+
+
+def get_route_interface(address, filename=FILE_ROUTES):
+    """Get the interface name for the most specific route to the address"""
+    target = struct.unpack('!I', socket.inet_aton(address))[0]
+    result = None
+    result_mask = -1
+    with open(filename, 'r') as file_routes:
+        # Skip the header line
+        next(file_routes)
+        for line in file_routes:
+            fields = line.split()
+            # Destination and mask are saved in host byte order
+            destination = struct.unpack(
+                '!I', struct.pack('=I', int(fields[1], 16)))[0]
+            mask = struct.unpack(
+                '!I', struct.pack('=I', int(fields[7], 16)))[0]
+            if target & mask == destination and mask > result_mask:
+                result = fields[0]
+                result_mask = mask
+    return result
+
+
+def get_interface_address(interface):
+    """Get the packed IPv4 address for the interface"""
+    helper = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        data = fcntl.ioctl(helper.fileno(),
+                           SIOCGIFADDR,
+                           struct.pack('256s', interface[:15].encode('utf-8')))
+    finally:
+        helper.close()
+    return data[20:24]
+
+
+def attach_filter(packet_socket, instructions):
+    """Attach a kernel BPF filter to the socket"""
+    import ctypes
+    program = b''.join(struct.pack('=HBBI', *instruction)
+                       for instruction in instructions)
+    buffer = ctypes.create_string_buffer(program)
+    packet_socket.setsockopt(socket.SOL_SOCKET,
+                             SO_ATTACH_FILTER,
+                             struct.pack('HL',
+                                         len(instructions),
+                                         ctypes.addressof(buffer)))
+
+
+def format_mac(data):
+    """Format a packed MAC address"""
+    return ':'.join('%02X' % byte for byte in struct.unpack('6B', data))
+
+
+class ARPingSocket(SocketSweep, ARPing):
+    def __init__(self, settings):
+        ARPing.__init__(self, settings)
+        self.settings = settings
+
+    def open_socket(self):
+        """
+        Open a packet socket for the interface,
+        returns None if the socket could not be opened
+        """
+        if AF_PACKET is None or fcntl is None:
+            return None
+        # Find the interface from the route to the first address
+        self.socket_interface = (self.interface or
+                                 get_route_interface(self.addresses[0]))
+        if not self.socket_interface:
+            return None
+        try:
+            # Open the socket without protocol to not receive any packet
+            # until the filter is attached
+            packet_socket = socket.socket(AF_PACKET, socket.SOCK_RAW, 0)
+        except socket.error as error:
+            self.settings.log_verbose_max(
+                'Unable to open packet socket: {error}'.format(error=error))
+            return None
+        try:
+            attach_filter(packet_socket, ARP_REPLY_FILTER)
+            packet_socket.bind((self.socket_interface, ETH_P_ARP))
+            packet_socket.setblocking(False)
+            self.source_mac = packet_socket.getsockname()[4]
+            self.source_address = get_interface_address(self.socket_interface)
+        except (socket.error, IOError) as error:
+            self.settings.log_verbose_max(
+                'Unable to configure packet socket: {error}'.format(
+                    error=error))
+            packet_socket.close()
+            return None
+        self.sent = {}
+        return packet_socket
+
+    def send_request(self, address):
+        """Send a broadcast ARP who-has request for the address"""
+        frame = struct.pack('!6s6sH', b'\xff' * 6, self.source_mac, ETH_P_ARP)
+        frame += struct.pack('!HHBBH6s4s6s4s',
+                             1,
+                             ETH_P_IP,
+                             6,
+                             4,
+                             ARP_REQUEST,
+                             self.source_mac,
+                             self.source_address,
+                             b'\x00' * 6,
+                             socket.inet_aton(address))
+        # Pad the frame to the ethernet minimum size
+        self.socket.send(frame.ljust(60, b'\x00'))
+        self.sent[address] = time.time()
+
+    def receive_reply(self):
+        """
+        Receive an ARP reply and return the address with the MAC address and
+        the round trip time
+        """
+        frame = self.socket.recv(1024)
+        received = time.time()
+        if len(frame) < 42:
+            return None
+        (_, _, _, _, operation, sender_mac, sender_address, _, _) = \
+            struct.unpack('!HHBBH6s4s6s4s', frame[14:42])
+        address = socket.inet_ntoa(sender_address)
+        if operation != ARP_REPLY or address not in self.sent:
+            return None
+        return (address, (format_mac(sender_mac),
+                          received - self.sent[address]))
+
+    def get_sweep_results(self, address, reply):
+        """Get the results from the MAC address and round trip time"""
+        command = 'ARP who-has request on {interface}'.format(
+            interface=self.socket_interface)
+        if reply is None:
+            return ToolResults(None, command, b'', b'')
+        (mac_address, latency) = reply
+        latency *= 1000
+        output = 'Unicast reply from {address} [{mac}] {latency:.3f}ms'.format(
+            address=address,
+            mac=mac_address,
+            latency=latency).encode('utf-8')
+        return ToolResults(mac_address, command, output, b'', latency)
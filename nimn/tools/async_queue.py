@@ -0,0 +1,232 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import functools
+import subprocess
+import collections
+import itertools
+import time
+
+try:
+    import asyncio
+except ImportError:
+    # asyncio is available only since Python 3.4
+    asyncio = None
+
+from .concurrency import ConcurrencyController
+from ..pipeline import empty_results
+from .. import profiler
+from ..metrics import SPAWN_SECONDS, record_probe
+
+# Event loop shared by all the asynchronous tools
+shared_loop = None
+# Max data in the queue to check for a free interface
+LOOKAHEAD = 64
+# Seconds to wait before checking again the busy interfaces
+INTERFACE_BUSY_DELAY = 0.01
+
+
+def get_shared_loop():
+    """Get the event loop shared by all the asynchronous tools"""
+    global shared_loop
+    if shared_loop is None or shared_loop.is_closed():
+        shared_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(shared_loop)
+    return shared_loop
+
+
+class AsyncQueue(object):
+    # Tool name for the metrics
+    name = None
+
+    def __init__(self, cb_function, settings):
+        # Default tool values
+        self.interface = None
+        self.checks = 1
+        self.timeout = None
+        self.max_workers = settings.command_line.arguments.workers
+        # The raw output is kept only when shown
+        self.verbose_level = settings.command_line.arguments.verbose_level
+        self.controller = ConcurrencyController(initial=self.max_workers)
+        self.queue_incoming = collections.deque()
+        self.settings = settings
+        # Set callback function, it must return a Future for the results
+        self.cb_function = cb_function
+
+    def prepare(self):
+        # Queue for requests and responses
+        self.loop = get_shared_loop()
+        self.queue_incoming = collections.deque()
+        self.results = {}
+        self.controller.reset()
+        self.waiting = False
+        self.completed = asyncio.Future(loop=self.loop)
+
+    def execute(self, data):
+        """Add new data to the queue"""
+        self.queue_incoming.append(data)
+
+    def get_queue_depth(self):
+        """Get the number of data waiting in the queue"""
+        return len(self.queue_incoming)
+
+    def consumer(self):
+        """Start new requests until the workers limit is reached"""
+        while self.queue_incoming and self.controller.is_available():
+            # Get the next data
+            data = self.get_next()
+            if data is None:
+                # All the interfaces are busy, check again later
+                if not self.waiting:
+                    self.waiting = True
+                    self.loop.call_later(INTERFACE_BUSY_DELAY,
+                                         self.retry_consumer)
+                break
+            # Await the packets rate ceiling before sending the request
+            self.loop.call_later(self.controller.start(self.checks),
+                                 self.send, data)
+        if (not self.queue_incoming and not self.controller.running and
+                not self.completed.done()):
+            # No more data to process
+            self.completed.set_result(self.results)
+
+    def retry_consumer(self):
+        """Start the requests waiting for the interfaces"""
+        self.waiting = False
+        self.consumer()
+
+    def get_next(self):
+        """
+        Get the next data allowed by the interfaces limits, returns None if
+        all the interfaces of the first data in the queue are busy
+        """
+        limiter = self.controller.interface_limiter
+        if limiter is None:
+            return self.queue_incoming.popleft()
+        for (index, data) in enumerate(itertools.islice(self.queue_incoming,
+                                                        LOOKAHEAD)):
+            if limiter.is_available(data):
+                del self.queue_incoming[index]
+                limiter.start(data)
+                return data
+        return None
+
+    def send(self, data):
+        """Start the request for the data"""
+        started = time.time()
+        try:
+            future = self.cb_function(data)
+        except Exception as error:
+            # Collect the error like the failures of a running request
+            future = asyncio.Future(loop=self.loop)
+            future.set_exception(error)
+        future.add_done_callback(
+            functools.partial(self.collect, data, started))
+
+    def collect(self, data, started, future):
+        """Save the results for a completed request"""
+        self.controller.finish(started,
+                               future.exception() is None and
+                               bool(future.result().data),
+                               data)
+        ended = time.time()
+        record_probe(self.name,
+                     data,
+                     future.result() if future.exception() is None else None,
+                     ended - started)
+        profiler.tracer.add(self.name, 'tool', started, ended, address=data)
+        if future.exception() is None:
+            self.results[data] = future.result().trim(self.verbose_level)
+        else:
+            self.settings.log_normal(
+                'Error processing {data}: {error}'.format(
+                    data=data,
+                    error=future.exception()))
+            self.results[data] = empty_results(self.name, data,
+                                               command=None,
+                                               error=str(future.exception()))
+        self.consumer()
+
+    def start(self):
+        """Schedule the first requests in the event loop"""
+        self.loop.call_soon(self.consumer)
+
+    def process(self):
+        """Run the event loop until all the requests are completed"""
+        self.loop.run_until_complete(self.completed)
+        return self.results
+
+    def set_future(self, future, cb_function, *args):
+        """Set the result of cb_function(*args) or its exception"""
+        try:
+            result = cb_function(*args)
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def chain(self, future, cb_function):
+        """Return a new Future with the result of cb_function(result)"""
+        chained = asyncio.Future(loop=self.loop)
+
+        def completed(future):
+            if future.exception() is not None:
+                chained.set_exception(future.exception())
+            else:
+                self.set_future(chained, cb_function, future.result())
+
+        future.add_done_callback(completed)
+        return chained
+
+    def run_command(self, command, cb_results):
+        """
+        Execute a command without blocking and return a Future with the result
+        of cb_results(command, returncode, stdout, stderr)
+        """
+        future = asyncio.Future(loop=self.loop)
+
+        def process_completed(process, task):
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+                return
+            (stdout, stderr) = task.result()
+            self.set_future(future, cb_results, command,
+                            process.returncode, stdout, stderr)
+
+        def process_created(started, task):
+            ended = time.time()
+            SPAWN_SECONDS.observe((self.name, ), ended - started)
+            profiler.tracer.add('spawn', 'subprocess', started, ended,
+                                command=command[0])
+            if task.exception() is not None:
+                # The command could not be executed
+                self.set_future(future, cb_results, command, None, b'',
+                                str(task.exception()).encode('utf-8'))
+            else:
+                process = task.result()
+                self.loop.create_task(process.communicate()).add_done_callback(
+                    functools.partial(process_completed, process))
+
+        self.loop.create_task(asyncio.create_subprocess_exec(
+            *command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)).add_done_callback(
+                functools.partial(process_created, time.time()))
+        return future
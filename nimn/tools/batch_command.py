@@ -0,0 +1,167 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import subprocess
+import threading
+import time
+
+try:
+    from shutil import which
+except ImportError:
+    # shutil.which is not available on Python 2
+    from distutils.spawn import find_executable as which
+
+from .. import profiler
+from ..metrics import SPAWN_SECONDS, record_probe
+
+
+class BatchCommand(object):
+    """
+    Check all the addresses with a single process of a batch tool, which
+    reads the addresses from its standard input and prints a line for each
+    reply, falling back to the external command for each address when the
+    batch tool is not available.
+    The subclasses must implement get_batch_command, parse_batch_line
+    and get_batch_results.
+    """
+    # Exit codes of the batch tool for a completed check
+    batch_returncodes = (0, )
+    # Batch tool process of the running scan
+    batch_process = None
+
+    def prepare(self):
+        self.batch_process = None
+        self.addresses = []
+        self.replies = {}
+        self.results = {}
+
+    def execute(self, data):
+        """Add new data to the queue"""
+        self.addresses.append(data)
+
+    def get_queue_depth(self):
+        """Get the number of addresses still without a reply"""
+        if not self.batch_process:
+            return super(BatchCommand, self).get_queue_depth()
+        return len(self.addresses) - len(self.replies)
+
+    def start(self):
+        """Execute the batch tool or the running threads"""
+        if not self.addresses:
+            # No requests to send
+            return
+        command = self.get_batch_command()
+        if command:
+            started = time.time()
+            try:
+                self.batch_process = subprocess.Popen(command,
+                                                      stdin=subprocess.PIPE,
+                                                      stdout=subprocess.PIPE,
+                                                      stderr=subprocess.PIPE)
+            except OSError as error:
+                self.settings.log_verbose(
+                    'Unable to execute {command}: {error}'.format(
+                        command=command[0],
+                        error=error))
+            else:
+                spawned = time.time()
+                SPAWN_SECONDS.observe((self.name, ), spawned - started)
+                profiler.tracer.add('spawn', 'subprocess', started, spawned,
+                                    command=command[0])
+                self.batch_command = command
+                # Feed the addresses and collect the errors from other
+                # threads, a full pipe would stop the batch tool
+                self.batch_errors = []
+                self.batch_threads = [
+                    threading.Thread(target=self.feed_addresses),
+                    threading.Thread(target=self.collect_errors)]
+                for thread in self.batch_threads:
+                    thread.daemon = True
+                    thread.start()
+                return
+        self.settings.log_verbose(
+            'Batch tool not available for {tool}, using the external '
+            'command'.format(tool=self.__class__.__name__))
+        self.start_commands()
+
+    def start_commands(self):
+        """Execute the external command for each address"""
+        self.batch_process = None
+        super(BatchCommand, self).prepare()
+        for address in self.addresses:
+            super(BatchCommand, self).execute(address)
+        super(BatchCommand, self).start()
+
+    def feed_addresses(self):
+        """Write the addresses to the batch tool, one for each line"""
+        try:
+            self.batch_process.stdin.write(
+                ''.join('%s\n' % address
+                        for address in self.addresses).encode('utf-8'))
+            self.batch_process.stdin.close()
+        except (IOError, OSError) as error:
+            # The batch tool has exited without reading all the addresses
+            self.settings.log_verbose_max(
+                'Unable to send the addresses to {command}: {error}'.format(
+                    command=self.batch_command[0],
+                    error=error))
+
+    def collect_errors(self):
+        """Read the error messages of the batch tool"""
+        for line in iter(self.batch_process.stderr.readline, b''):
+            self.batch_errors.append(line)
+
+    def process(self):
+        """Read the replies from the batch tool output"""
+        if not self.addresses:
+            return self.results
+        elif not self.batch_process:
+            return super(BatchCommand, self).process()
+        with profiler.tracer.span('batch', 'tool', tool=self.name,
+                                  addresses=len(self.addresses)):
+            wanted = set(self.addresses)
+            for line in iter(self.batch_process.stdout.readline, b''):
+                reply = self.parse_batch_line(line)
+                if (reply is not None and reply[0] in wanted and
+                        reply[0] not in self.replies):
+                    self.replies[reply[0]] = (line, ) + reply[1:]
+            returncode = self.batch_process.wait()
+            for thread in self.batch_threads:
+                thread.join()
+        errors = b''.join(self.batch_errors)
+        if returncode not in self.batch_returncodes:
+            self.settings.log_verbose(
+                '{command} exited with code {code}: {errors}'.format(
+                    command=self.batch_command[0],
+                    code=returncode,
+                    errors=errors.decode('utf-8', 'replace').strip()))
+            if not self.replies:
+                # The batch tool could not check the addresses
+                self.start_commands()
+                return super(BatchCommand, self).process()
+        for address in self.addresses:
+            results = self.get_batch_results(address,
+                                             self.replies.get(address))
+            record_probe(self.name, address, results,
+                         results.latency / 1000.0
+                         if results.latency is not None else None)
+            self.results[address] = results.trim(self.verbose_level)
+        self.batch_process = None
+        return self.results
@@ -0,0 +1,256 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import collections
+import math
+import threading
+import time
+
+from ..constants import TOOLS_LIST
+
+# Max workers for each tool in adaptive mode
+DEFAULT_MAX_WORKERS = 256
+# Min completed requests in a window to compare the fraction of failures
+MIN_WINDOW = 32
+# Increase of the fraction of failed requests in a window to back off, at
+# least two standard errors of the fraction to ignore the random changes
+LOSS_TOLERANCE = 0.1
+# Increase of the mean time of the successful requests to back off, the
+# margin in seconds ignores the jitter of the fastest requests
+DELAY_TOLERANCE = 2.0
+DELAY_MARGIN = 0.05
+# Factor for the workers limit after a congestion
+DECREASE_FACTOR = 0.5
+# Weight of the previous windows in the failed requests baseline
+SMOOTHING = 0.8
+
+
+def parse_limits(limits):
+    """
+    Parse the max workers specification as a number for all the tools or
+    as tool=number separated by , (e.g. ping=512,arping=128)
+    """
+    results = dict((tool, DEFAULT_MAX_WORKERS) for tool in TOOLS_LIST)
+    for item in limits.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        elif '=' in item:
+            (tool, value) = [part.strip() for part in item.split('=', 1)]
+            if tool not in TOOLS_LIST:
+                raise ValueError('Unknown tool: {tool}'.format(tool=tool))
+            tools = (tool, )
+        else:
+            (tools, value) = (TOOLS_LIST, item)
+        if not value.isdigit() or not int(value):
+            raise ValueError('Invalid workers: {value}'.format(value=value))
+        for tool in tools:
+            results[tool] = int(value)
+    return results
+
+
+class RateLimiter(object):
+    """Packets per second ceiling shared by all the tools"""
+    def __init__(self, rate):
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, packets=1):
+        """Reserve the packets and return the seconds to wait to send them"""
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_time)
+            self.next_time = start + packets * self.interval
+            return start - now
+
+    def wait(self, packets=1):
+        """Await the time to send the packets"""
+        delay = self.reserve(packets)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class InterfaceLimiter(object):
+    """Max requests in flight from all the tools for each interface"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.interfaces = []
+        self.running = collections.defaultdict(int)
+        self.condition = threading.Condition()
+
+    def add(self, interface, targets):
+        """Add the targets reached from the interface"""
+        self.interfaces.append((interface, targets))
+
+    def get_interface(self, address):
+        """Get the interface for the address"""
+        for (interface, targets) in self.interfaces:
+            if address in targets:
+                return interface
+        return None
+
+    def is_available(self, address):
+        """Check if a new request can be started for the address"""
+        return self.running[self.get_interface(address)] < self.limit
+
+    def start(self, address):
+        """Count a new request in flight for the address"""
+        with self.condition:
+            self.running[self.get_interface(address)] += 1
+
+    def acquire(self, address):
+        """Await a free slot for the interface of the address"""
+        with self.condition:
+            while not self.is_available(address):
+                self.condition.wait()
+            self.start(address)
+
+    def finish(self, address):
+        """Count a completed request for the address"""
+        with self.condition:
+            self.running[self.get_interface(address)] -= 1
+            self.condition.notify_all()
+
+
+class ConcurrencyController(object):
+    """
+    Limit the requests in flight for a tool. In adaptive mode the limit is
+    doubled for each window of completed requests until the first
+    congestion and then increased by one (additive increase), while it's
+    halved when the failed requests or the requests times increase
+    (multiplicative decrease)
+    """
+    def __init__(self, initial, maximum=None, minimum=1, adaptive=False,
+                 rate_limiter=None, interface_limiter=None):
+        self.limit = initial
+        self.minimum = min(minimum, initial)
+        self.maximum = max(maximum or initial, initial)
+        self.adaptive = adaptive
+        self.rate_limiter = rate_limiter
+        self.interface_limiter = interface_limiter
+        self.slow_start = True
+        # Baselines from the previous windows
+        self.failures = None
+        self.min_duration = None
+        self.condition = threading.Condition()
+        self.running = 0
+        self.reset()
+
+    def reset(self):
+        """Reset the statistics for a new scan, keeping the limit"""
+        with self.condition:
+            self.completed = 0
+            self.packets = 0
+            self.started = None
+            self.finished = None
+            self.reset_window()
+
+    def reset_window(self):
+        self.window_completed = 0
+        self.window_failures = 0
+        self.window_duration = 0.0
+
+    def is_available(self):
+        """Check if a new request can be started"""
+        return self.running < self.limit
+
+    def start(self, packets=1):
+        """
+        Count a new request in flight, returns the seconds to wait before
+        sending its packets
+        """
+        with self.condition:
+            self.running += 1
+            self.packets += packets
+            if self.started is None:
+                self.started = time.time()
+        return self.rate_limiter.reserve(packets) if self.rate_limiter else 0
+
+    def acquire(self, packets=1, address=None):
+        """
+        Await a free slot for the tool and for the interface of the address
+        and the time to send the packets, returns the request start time
+        """
+        with self.condition:
+            while not self.is_available():
+                self.condition.wait()
+            delay = self.start(packets)
+        if self.interface_limiter and address is not None:
+            self.interface_limiter.acquire(address)
+        if delay > 0:
+            time.sleep(delay)
+        return time.time()
+
+    def finish(self, started, success, address=None):
+        """Count a completed request and update the limit"""
+        if self.interface_limiter and address is not None:
+            self.interface_limiter.finish(address)
+        with self.condition:
+            self.finished = time.time()
+            self.running -= 1
+            self.completed += 1
+            self.window_completed += 1
+            if success:
+                self.window_duration += self.finished - started
+            else:
+                self.window_failures += 1
+            if self.window_completed >= max(self.limit, MIN_WINDOW):
+                self.update()
+            self.condition.notify_all()
+
+    def update(self):
+        """Update the limit at the end of a window of requests"""
+        completed = self.window_completed
+        failures = float(self.window_failures) / completed
+        successes = completed - self.window_failures
+        duration = (self.window_duration / successes) if successes else None
+        self.reset_window()
+        if not self.adaptive:
+            return
+        if self.failures is not None and (
+                failures > self.failures + max(
+                    LOSS_TOLERANCE,
+                    2 * math.sqrt(self.failures * (1 - self.failures) /
+                                  completed)) or
+                (duration is not None and self.min_duration is not None and
+                 duration > (self.min_duration * DELAY_TOLERANCE +
+                             DELAY_MARGIN))):
+            # Congestion, multiplicative decrease
+            self.limit = max(self.minimum, int(self.limit * DECREASE_FACTOR))
+            self.slow_start = False
+        elif self.slow_start:
+            self.limit = min(self.maximum, self.limit * 2)
+        else:
+            # Additive increase
+            self.limit = min(self.maximum, self.limit + 1)
+        self.failures = (failures if self.failures is None else
+                         self.failures * SMOOTHING +
+                         failures * (1 - SMOOTHING))
+        if duration is not None:
+            self.min_duration = (duration if self.min_duration is None else
+                                 min(self.min_duration, duration))
+
+    def get_rate(self):
+        """Get the packets per second sent during the scan"""
+        if not self.completed or self.finished <= self.started:
+            return 0.0
+        return self.packets / (self.finished - self.started)
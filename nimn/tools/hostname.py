@@ -20,13 +20,30 @@
 
 import socket
 
+from .async_queue import AsyncQueue
 from .managed_queue import ManagedQueue
 from .tool_results import ToolResults
+from ..constants import TOOL_HOSTNAME
 
 
 class Hostname(ManagedQueue):
+    name = TOOL_HOSTNAME
+
     def __init__(self, settings):
         ManagedQueue.__init__(self, self.do_process, settings)
 
     def do_process(self, address):
         return ToolResults(socket.getfqdn(address), '', '', '')
+
+
+class HostnameAsync(AsyncQueue):
+    name = TOOL_HOSTNAME
+
+    def __init__(self, settings):
+        AsyncQueue.__init__(self, self.do_process, settings)
+
+    def do_process(self, address):
+        # Resolve the address in the loop executor without blocking the loop
+        return self.chain(
+            self.loop.run_in_executor(None, socket.getfqdn, address),
+            lambda hostname: ToolResults(hostname, '', '', ''))
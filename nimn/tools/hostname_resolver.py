@@ -0,0 +1,96 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import socket
+import time
+
+from ..resolver import Resolver, read_nameservers
+from .hostname import Hostname
+from .tool_results import ToolResults
+from .. import profiler
+from ..metrics import record_probe
+
+
+class HostnameResolver(Hostname):
+    def __init__(self, settings, dbhosts):
+        Hostname.__init__(self, settings)
+        self.settings = settings
+        self.dbhosts = dbhosts
+
+    def prepare(self):
+        self.resolver = None
+        self.addresses = []
+        self.results = {}
+
+    def execute(self, data):
+        """Add new data to the queue"""
+        self.addresses.append(data)
+
+    def start(self):
+        """Prepare the resolver or execute the running threads"""
+        nameservers = read_nameservers()
+        if nameservers:
+            self.resolver = Resolver(nameservers=nameservers,
+                                     timeout=self.timeout or 2,
+                                     max_pending=self.max_workers)
+        else:
+            self.settings.log_verbose('No nameservers found, using the '
+                                      'system resolver')
+            Hostname.prepare(self)
+            for address in self.addresses:
+                Hostname.execute(self, address)
+            Hostname.start(self)
+
+    def process(self):
+        """Resolve the addresses missing from the hostnames cache"""
+        if not self.resolver:
+            return Hostname.process(self)
+        now = time.time()
+        cached = self.dbhosts.get_hostnames(now)
+        missing = [address for address in self.addresses
+                   if address not in cached]
+        with profiler.tracer.span('resolve', 'tool', tool=self.name,
+                                  addresses=len(missing)):
+            try:
+                answers = self.resolver.resolve(missing)
+            except socket.error as error:
+                self.settings.log_normal('Unable to query the nameservers: '
+                                         '{error}'.format(error=error))
+                answers = {}
+        self.settings.log_verbose(
+            'Resolved {answers} hostnames, {cached} from cache'.format(
+                answers=len(answers),
+                cached=len(self.addresses) - len(missing)))
+        # Save answers and negative answers in the cache
+        self.dbhosts.set_hostnames(
+            (address, hostname, int(now + ttl))
+            for (address, (hostname, ttl)) in answers.items())
+        for address in self.addresses:
+            if address in cached:
+                command = 'hostnames cache'
+                hostname = cached[address]
+            else:
+                command = 'PTR query'
+                hostname = answers.get(address, (None, None))[0]
+            # Use the address for hosts without hostname like getfqdn
+            self.results[address] = ToolResults(hostname or address,
+                                                command, '', '')
+            record_probe(self.name, address, self.results[address])
+        return self.results
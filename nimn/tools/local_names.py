@@ -0,0 +1,265 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import collections
+import errno
+import random
+import select
+import socket
+import struct
+import threading
+import time
+
+from .arping_socket import get_interface_address
+from .tool_results import ToolResults
+from .. import profiler
+from ..resolver import (DNS_HEADER,
+                        DNS_RECORD,
+                        DNS_FLAG_QR,
+                        build_questions,
+                        parse_answers,
+                        read_name,
+                        reverse_name)
+
+MDNS_ADDRESS = '224.0.0.251'
+MDNS_PORT = 5353
+LLMNR_PORT = 5355
+NETBIOS_PORT = 137
+NETBIOS_TYPE_NBSTAT = 0x0021
+NETBIOS_CLASS_IN = 0x0001
+NETBIOS_FLAG_GROUP = 0x8000
+# Encoded wildcard name (*) for the NetBIOS node status requests
+NETBIOS_WILDCARD = b'CK' + b'A' * 30
+# Sources of the names, in order of preference
+SOURCE_MDNS = 'mDNS'
+SOURCE_LLMNR = 'LLMNR'
+SOURCE_NETBIOS = 'NetBIOS'
+SOURCES_LIST = (SOURCE_MDNS, SOURCE_LLMNR, SOURCE_NETBIOS)
+# Default seconds to wait for the replies after the last request
+DEFAULT_TIMEOUT = 1
+# Max reverse names in each mDNS query, to fit the packets in the MTU
+MDNS_QUESTIONS = 32
+# Max requests to send before checking for new replies
+SEND_BATCH = 64
+# Errors for a socket that cannot send or receive more data for now
+SOCKET_BUSY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+
+
+def build_node_status(query_id):
+    """Build a NetBIOS node status request"""
+    return (DNS_HEADER.pack(query_id, 0, 1, 0, 0, 0) +
+            struct.pack('!B', len(NETBIOS_WILDCARD)) + NETBIOS_WILDCARD +
+            struct.pack('!BHH', 0, NETBIOS_TYPE_NBSTAT, NETBIOS_CLASS_IN))
+
+
+def parse_node_status(data):
+    """Get the unique workstation name from a NetBIOS node status response"""
+    (_, flags, _, answers, _, _) = DNS_HEADER.unpack_from(data)
+    if not flags & DNS_FLAG_QR or not answers:
+        return None
+    offset = read_name(data, DNS_HEADER.size)[1]
+    record_type = DNS_RECORD.unpack_from(data, offset)[0]
+    if record_type != NETBIOS_TYPE_NBSTAT:
+        return None
+    offset += DNS_RECORD.size
+    count = struct.unpack_from('!B', data, offset)[0]
+    for index in range(count):
+        (name, suffix, name_flags) = struct.unpack_from(
+            '!15sBH', data, offset + 1 + index * 18)
+        if suffix == 0 and not name_flags & NETBIOS_FLAG_GROUP:
+            return name.rstrip(b' \x00').decode('ascii', 'replace') or None
+    return None
+
+
+class LocalNames(object):
+    """
+    Discover the names of the hosts without DNS records from the mDNS
+    reverse queries sent in multicast bursts and from the LLMNR reverse
+    queries and the NetBIOS node status requests sent to each address,
+    all the replies are received from a single socket
+    """
+    def __init__(self, settings):
+        self.settings = settings
+        self.interface = None
+        self.checks = 1
+        self.timeout = None
+        self.rate_limiter = None
+        self.addresses = []
+        self.names = {}
+        self.thread = None
+
+    def start(self, addresses):
+        """Send the queries from a background thread"""
+        self.addresses = list(addresses)
+        self.names = {}
+        self.thread = threading.Thread(target=self.discover_all)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def discover_all(self):
+        """Discover the names of all the addresses"""
+        with profiler.tracer.span('local_names', 'tool',
+                                  addresses=len(self.addresses)):
+            try:
+                self.names = self.discover(self.addresses)
+            except socket.error as error:
+                self.settings.log_normal(
+                    'Unable to discover the local names: {error}'.format(
+                        error=error))
+
+    def process(self):
+        """
+        Await the replies and return the results for each address with a
+        name, preferring the mDNS names, then LLMNR and NetBIOS
+        """
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        results = {}
+        for (address, names) in self.names.items():
+            for source in SOURCES_LIST:
+                if source in names:
+                    results[address] = ToolResults(
+                        names[source],
+                        '{source} query'.format(source=source),
+                        '', '')
+                    break
+        self.settings.log_verbose(
+            'Found {count} local names'.format(count=len(results)))
+        return results
+
+    def discover(self, addresses):
+        """
+        Send the queries for the addresses without replies, up to the number
+        of checks, and return the names from each source for each address
+        """
+        names = {}
+        wanted = set(addresses)
+        reverse_names = dict((reverse_name(address), address)
+                             for address in addresses)
+        udp_socket = self.open_socket()
+        try:
+            for attempt in range(max(self.checks, 1)):
+                missing = [address for address in addresses
+                           if address not in names]
+                if not missing:
+                    break
+                requests = collections.deque(self.get_requests(missing))
+                deadline = None
+                while requests or time.time() < deadline:
+                    (readable, writable, _) = select.select(
+                        [udp_socket],
+                        [udp_socket] if requests else [],
+                        [],
+                        0.01 if requests else max(deadline - time.time(), 0))
+                    if readable:
+                        self.receive_replies(udp_socket, wanted,
+                                             reverse_names, names)
+                    if writable:
+                        self.send_requests(udp_socket, requests)
+                        if not requests:
+                            deadline = time.time() + (self.timeout or
+                                                      DEFAULT_TIMEOUT)
+        finally:
+            udp_socket.close()
+        return names
+
+    def open_socket(self):
+        """Open the UDP socket for the queries and the replies"""
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+        if self.interface:
+            # Send the multicast queries from the interface
+            try:
+                udp_socket.setsockopt(socket.IPPROTO_IP,
+                                      socket.IP_MULTICAST_IF,
+                                      get_interface_address(self.interface))
+            except (IOError, OSError, AttributeError) as error:
+                self.settings.log_verbose(
+                    'Unable to send the multicast queries from {interface}: '
+                    '{error}'.format(interface=self.interface, error=error))
+        udp_socket.setblocking(False)
+        return udp_socket
+
+    def get_requests(self, addresses):
+        """Get the (packet, destination) for each request"""
+        query_id = random.getrandbits(16)
+        for index in range(0, len(addresses), MDNS_QUESTIONS):
+            # mDNS queries from a port other than 5353 get unicast replies
+            yield (build_questions(
+                       query_id, 0,
+                       [reverse_name(address) for address
+                        in addresses[index:index + MDNS_QUESTIONS]]),
+                   (MDNS_ADDRESS, MDNS_PORT))
+        for address in addresses:
+            # LLMNR reverse queries are sent only in unicast
+            yield (build_questions(query_id, 0, [reverse_name(address)]),
+                   (address, LLMNR_PORT))
+            yield (build_node_status(query_id), (address, NETBIOS_PORT))
+
+    def send_requests(self, udp_socket, requests):
+        """Send the next requests until the socket is busy"""
+        for index in range(min(SEND_BATCH, len(requests))):
+            if self.rate_limiter:
+                # Await the packets rate ceiling
+                self.rate_limiter.wait()
+            (packet, destination) = requests[0]
+            try:
+                udp_socket.sendto(packet, destination)
+            except socket.error as error:
+                if error.errno in SOCKET_BUSY_ERRORS:
+                    # Wait for the socket to send the queued data
+                    return
+                self.settings.log_verbose_max(
+                    'Unable to send request to {address}: {error}'.format(
+                        address=destination[0],
+                        error=error))
+            requests.popleft()
+
+    def receive_replies(self, udp_socket, wanted, reverse_names, names):
+        """Receive all the available replies and save the names"""
+        while True:
+            try:
+                (data, (source, port)) = udp_socket.recvfrom(4096)
+            except socket.error as error:
+                if error.errno not in SOCKET_BUSY_ERRORS:
+                    # ICMP errors from the unicast requests
+                    self.settings.log_verbose_max(
+                        'Unable to receive replies: {error}'.format(
+                            error=error))
+                # No more replies available
+                return
+            try:
+                if port == NETBIOS_PORT:
+                    name = parse_node_status(data)
+                    if name and source in wanted:
+                        names.setdefault(source, {})[SOURCE_NETBIOS] = name
+                elif port in (MDNS_PORT, LLMNR_PORT):
+                    for (question, name) in parse_answers(data)[1]:
+                        address = reverse_names.get(question.lower())
+                        if address is None or (port == LLMNR_PORT and
+                                               address != source):
+                            continue
+                        names.setdefault(address, {})[
+                            SOURCE_MDNS if port == MDNS_PORT
+                            else SOURCE_LLMNR] = name
+            except (struct.error, ValueError):
+                # Invalid reply
+                continue
@@ -20,20 +20,32 @@
 
 import sys
 import threading
+import time
 
 if sys.version_info.major == 3:
     import queue
 else:
     import Queue as queue
 
+from .concurrency import ConcurrencyController
+from .. import profiler
+from ..metrics import record_probe
+
 
 class ManagedQueue(object):
+    # Tool name for the metrics
+    name = None
+
     def __init__(self, cb_function, settings):
         # Default tool values
         self.interface = None
         self.checks = 1
         self.timeout = None
         self.max_workers = settings.command_line.arguments.workers
+        # The raw output is kept only when shown
+        self.verbose_level = settings.command_line.arguments.verbose_level
+        self.controller = ConcurrencyController(initial=self.max_workers)
+        self.queue_incoming = queue.Queue()
         # Set callback function
         self.cb_function = cb_function
 
@@ -42,23 +54,28 @@ class ManagedQueue(object):
         self.queue_incoming = queue.Queue()
         self.queue_results = queue.Queue()
         self.results = {}
-        # Setup running worker threads
+        self.controller.reset()
+        # The worker threads are started up to the concurrency limit and
+        # added while the limit grows in adaptive mode
         self.workers = []
-        for _ in range(self.max_workers):
-            worker_thread = threading.Thread(target=self.consumer)
-            self.workers.append(worker_thread)
+        self.workers_lock = threading.Lock()
 
     def execute(self, data):
         """Add new data to the queue"""
         self.queue_incoming.put(data)
 
+    def get_queue_depth(self):
+        """Get the number of data waiting in the queue"""
+        return self.queue_incoming.qsize()
+
     def consumer(self):
         """Extract data from the queue and process it"""
         try:
             while True:
                 # Get the next data
                 data = self.queue_incoming.get_nowait()
-                self.queue_results.put((data, self.cb_function(data)))
+                self.queue_results.put((data, self.call(data)))
+                self.add_workers()
         except queue.Empty:
             # No more data to process
             pass
@@ -67,16 +84,44 @@ class ManagedQueue(object):
             pass
             # self.queue_results.put(None)
 
+    def call(self, data):
+        """Process the data when allowed by the concurrency controller"""
+        started = self.controller.acquire(self.checks, data)
+        results = None
+        try:
+            results = self.cb_function(data).trim(self.verbose_level)
+            return results
+        finally:
+            self.controller.finish(started,
+                                   results is not None and bool(results.data),
+                                   data)
+            ended = time.time()
+            record_probe(self.name, data, results, ended - started)
+            profiler.tracer.add(self.name, 'tool', started, ended,
+                                address=data)
+
+    def add_workers(self):
+        """Start new threads up to the limit for the data in the queue"""
+        with self.workers_lock:
+            count = min(self.controller.limit - len(self.workers),
+                        self.queue_incoming.qsize())
+            for _ in range(count):
+                worker_thread = threading.Thread(target=self.consumer)
+                worker_thread.daemon = True
+                worker_thread.start()
+                self.workers.append(worker_thread)
+
     def start(self):
         """Execute the running threads"""
-        for worker in self.workers:
-            worker.daemon = True
-            worker.start()
+        self.add_workers()
 
     def process(self):
         """Awaits the running threads for completion"""
-        for worker in self.workers:
-            worker.join()
+        # The list grows until the last running threads have completed
+        index = 0
+        while index < len(self.workers):
+            self.workers[index].join()
+            index += 1
         # Get results from queue
         for data in self.queue_results.queue:
             self.results[data[0]] = data[1]
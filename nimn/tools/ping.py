@@ -18,18 +18,25 @@
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
 ##
 
+import functools
 import subprocess
 import platform
+import re
+import time
 
+from .async_queue import AsyncQueue
 from .managed_queue import ManagedQueue
 from .tool_results import ToolResults
+from ..constants import TOOL_PING
+from .. import profiler
+from ..metrics import SPAWN_SECONDS
 
 
-class Ping(ManagedQueue):
-    def __init__(self, settings):
-        ManagedQueue.__init__(self, self.do_process, settings)
+class PingCommand(object):
+    name = TOOL_PING
 
-    def do_process(self, address):
+    def get_command(self, address):
+        """Get the command line to check the address"""
         command = ['ping',
                    '-n' if platform.system().lower() == 'windows' else '-c',
                    str(self.checks)]
@@ -43,8 +50,39 @@ class Ping(ManagedQueue):
             command.append(str(self.timeout))
         # Add destination address
         command.append(address)
+        return command
+
+    def get_results(self, address, command, returncode, stdout, stderr):
+        """Get the results from the command output"""
+        # Get the round trip time from the first reply
+        match = re.search(b'time[=<]([0-9.]+) ?ms', stdout)
+        return ToolResults(returncode == 0, command, stdout, stderr,
+                           float(match.group(1)) if match else None)
+
+
+class Ping(PingCommand, ManagedQueue):
+    def __init__(self, settings):
+        ManagedQueue.__init__(self, self.do_process, settings)
+
+    def do_process(self, address):
+        command = self.get_command(address)
+        started = time.time()
         process = subprocess.Popen(command,
                                    stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE)
+        spawned = time.time()
+        SPAWN_SECONDS.observe((self.name, ), spawned - started)
+        profiler.tracer.add('spawn', 'subprocess', started, spawned,
+                            command=command[0])
         (stdout, stderr) = process.communicate()
-        return ToolResults(process.poll() == 0, command, stdout, stderr)
+        return self.get_results(address, command, process.poll(),
+                                stdout, stderr)
+
+
+class PingAsync(PingCommand, AsyncQueue):
+    def __init__(self, settings):
+        AsyncQueue.__init__(self, self.do_process, settings)
+
+    def do_process(self, address):
+        return self.run_command(self.get_command(address),
+                                functools.partial(self.get_results, address))
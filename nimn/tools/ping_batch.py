@@ -0,0 +1,77 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import re
+
+from .batch_command import BatchCommand, which
+from .ping import Ping
+from .tool_results import ToolResults
+
+# Reply line printed by fping -a -e (e.g. 10.0.0.1 is alive (0.10 ms))
+FPING_REPLY = re.compile(b'^(\\S+) is alive(?: \\(([0-9.]+) ms)?')
+
+
+class PingBatch(BatchCommand, Ping):
+    # fping exits with 1 when some addresses are unreachable
+    batch_returncodes = (0, 1)
+
+    def __init__(self, settings):
+        Ping.__init__(self, settings)
+        self.settings = settings
+
+    def get_batch_command(self):
+        """
+        Get the fping command line to check the addresses from the standard
+        input, returns None if fping is not available
+        """
+        if not which('fping'):
+            return None
+        command = ['fping', '-a', '-e',
+                   '-r', str(max(self.checks - 1, 0))]
+        # If provided, add interface name
+        if self.interface:
+            command.append('-I')
+            command.append(self.interface)
+        # If provided, add timeout for each request
+        if self.timeout:
+            command.append('-t')
+            command.append(str(self.timeout * 1000))
+        # If provided, add the interval between the requests
+        if self.controller.rate_limiter:
+            command.append('-i')
+            command.append(str(max(
+                int(self.controller.rate_limiter.interval * 1000), 1)))
+        return command
+
+    def parse_batch_line(self, line):
+        """Get the address and the round trip time from a reply line"""
+        match = FPING_REPLY.match(line)
+        if not match:
+            return None
+        return (match.group(1).decode('utf-8'),
+                float(match.group(2)) if match.group(2) else None)
+
+    def get_batch_results(self, address, reply):
+        """Get the results from the reply line"""
+        command = ' '.join(self.batch_command)
+        if reply is None:
+            return ToolResults(False, command, b'', b'')
+        (line, latency) = reply
+        return ToolResults(True, command, line, b'', latency)
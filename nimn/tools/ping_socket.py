@@ -0,0 +1,134 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import os
+import socket
+import struct
+import time
+
+from .ping import Ping
+from .socket_sweep import SocketSweep, SO_BINDTODEVICE
+from .tool_results import ToolResults
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+
+def checksum(data):
+    """Calculate the internet checksum for the data"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def echo_request(identifier, sequence):
+    """Build an ICMP echo request packet"""
+    payload = b'nimn'.ljust(56, b'\x00')
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0,
+                         identifier, sequence)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0,
+                       checksum(header + payload),
+                       identifier, sequence) + payload
+
+
+class PingSocket(SocketSweep, Ping):
+    def __init__(self, settings):
+        Ping.__init__(self, settings)
+        self.settings = settings
+
+    def open_socket(self):
+        """
+        Open an unprivileged datagram ICMP socket or a raw ICMP socket,
+        returns None if no socket could be opened
+        """
+        for socket_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                icmp_socket = socket.socket(socket.AF_INET,
+                                            socket_type,
+                                            socket.IPPROTO_ICMP)
+            except socket.error as error:
+                self.settings.log_verbose_max(
+                    'Unable to open ICMP socket: {error}'.format(error=error))
+                continue
+            try:
+                # If provided, bind the socket to the interface name
+                if self.interface:
+                    icmp_socket.setsockopt(socket.SOL_SOCKET,
+                                           SO_BINDTODEVICE,
+                                           self.interface.encode('utf-8'))
+                icmp_socket.setblocking(False)
+            except socket.error as error:
+                self.settings.log_verbose_max(
+                    'Unable to configure ICMP socket: {error}'.format(
+                        error=error))
+                icmp_socket.close()
+                continue
+            # Raw sockets receive the IP header and the replies for other
+            # processes, datagram sockets have the identifier set by the kernel
+            self.is_raw = socket_type == socket.SOCK_RAW
+            self.identifier = os.getpid() & 0xffff
+            self.sequence = 0
+            self.sent = {}
+            return icmp_socket
+        return None
+
+    def send_request(self, address):
+        """Send an echo request to the address"""
+        sequence = (self.sequence + 1) & 0xffff
+        self.socket.sendto(echo_request(self.identifier, sequence),
+                           (address, 0))
+        self.sequence = sequence
+        # The sequence numbers are reused in the sweeps of more than 65536
+        # requests, so each request is identified with its destination too
+        self.sent[(address, sequence)] = time.time()
+
+    def receive_reply(self):
+        """Receive an echo reply and return the address and round trip time"""
+        (packet, (address, _)) = self.socket.recvfrom(1024)
+        received = time.time()
+        # Skip the IP header for raw sockets
+        offset = (struct.unpack('!B', packet[:1])[0] & 0x0f) * 4 \
+            if self.is_raw else 0
+        if len(packet) < offset + 8:
+            return None
+        (icmp_type, _, _, identifier, sequence) = struct.unpack(
+            '!BBHHH', packet[offset:offset + 8])
+        if icmp_type != ICMP_ECHO_REPLY:
+            return None
+        if self.is_raw and identifier != self.identifier:
+            # Reply for another process
+            return None
+        if (address, sequence) not in self.sent:
+            return None
+        return (address, received - self.sent[(address, sequence)])
+
+    def get_sweep_results(self, address, reply):
+        """Get the results from the round trip time"""
+        command = 'ICMP echo request'
+        if reply is None:
+            return ToolResults(False, command, b'', b'')
+        latency = reply * 1000
+        output = 'Reply from {address}: time={latency:.3f} ms'.format(
+            address=address,
+            latency=latency).encode('utf-8')
+        return ToolResults(True, command, output, b'', latency)
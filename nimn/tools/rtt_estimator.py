@@ -0,0 +1,63 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+# Min and max retransmission timeouts in seconds
+MIN_RTO = 0.2
+MAX_RTO = 1.0
+# Gains for the smoothed round trip time and its variation (RFC 6298)
+ALPHA = 0.125
+BETA = 0.25
+# Weight of the variation in the retransmission timeout
+K = 4
+# Clock granularity in seconds
+GRANULARITY = 0.001
+
+
+class RttEstimator(object):
+    """
+    Smoothed round trip time and its variation to calculate the
+    retransmission timeout in the style of TCP (RFC 6298)
+    """
+    def __init__(self, max_rto=MAX_RTO, min_rto=MIN_RTO):
+        self.max_rto = max_rto
+        self.min_rto = min(min_rto, max_rto)
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+
+    def update(self, rtt):
+        """Add a round trip time sample in seconds"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = ((1 - BETA) * self.rttvar +
+                           BETA * abs(self.srtt - rtt))
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.samples += 1
+
+    def get_rto(self):
+        """Get the retransmission timeout in seconds"""
+        if self.srtt is None:
+            # No samples yet, wait the max timeout
+            return self.max_rto
+        return min(max(self.srtt + max(GRANULARITY, K * self.rttvar),
+                       self.min_rto),
+                   self.max_rto)
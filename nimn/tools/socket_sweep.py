@@ -0,0 +1,198 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import collections
+import errno
+import heapq
+import select
+import socket
+import time
+
+from .rtt_estimator import RttEstimator
+from .. import profiler
+from ..metrics import record_probe
+
+# Default seconds to wait for the replies after the last request
+DEFAULT_TIMEOUT = 1
+# Max requests to send before checking for new replies
+SEND_BATCH = 64
+# Errors for a socket that cannot send or receive more data for now
+SOCKET_BUSY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+SO_BINDTODEVICE = getattr(socket, 'SO_BINDTODEVICE', 25)
+
+
+class SocketSweep(object):
+    """
+    Send the requests for all the addresses from a single socket, falling
+    back to the external command when the socket cannot be opened.
+    The subclasses must implement open_socket, send_request, receive_reply
+    and get_sweep_results.
+    """
+    # List of (addresses, estimator) with the round trip times of each
+    # network, set before the scan
+    estimators = None
+    # Socket used by the running sweep
+    socket = None
+
+    def prepare(self):
+        self.socket = None
+        self.addresses = []
+        self.targets = collections.deque()
+        self.results = {}
+
+    def execute(self, data):
+        """Add new data to the queue"""
+        self.addresses.append(data)
+
+    def get_queue_depth(self):
+        """Get the number of requests waiting to be sent"""
+        if not self.socket:
+            return super(SocketSweep, self).get_queue_depth()
+        return len(self.targets)
+
+    def start(self):
+        """Open the socket or execute the running threads"""
+        if not self.addresses:
+            # No requests to send
+            return
+        self.socket = self.open_socket()
+        if not self.socket:
+            self.settings.log_verbose(
+                'Socket not available for {tool}, using the external '
+                'command'.format(tool=self.__class__.__name__))
+            super(SocketSweep, self).prepare()
+            for address in self.addresses:
+                super(SocketSweep, self).execute(address)
+            super(SocketSweep, self).start()
+
+    def process(self):
+        """Send the requests to all the addresses and await the replies"""
+        if not self.addresses:
+            return self.results
+        elif not self.socket:
+            return super(SocketSweep, self).process()
+        try:
+            with profiler.tracer.span('sweep', 'tool', tool=self.name,
+                                      addresses=len(self.addresses)):
+                replies = self.sweep()
+        finally:
+            self.socket.close()
+            self.socket = None
+        for address in self.addresses:
+            results = self.get_sweep_results(address, replies.get(address))
+            record_probe(self.name, address, results,
+                         results.latency / 1000.0
+                         if results.latency is not None else None)
+            self.results[address] = results.trim(self.verbose_level)
+        return self.results
+
+    def sweep(self):
+        """
+        Send the requests and return the first reply for each address,
+        each request expires after the retransmission timeout from the
+        round trip times and it's sent again only to the addresses without
+        replies, up to the number of checks
+        """
+        estimators = self.get_estimators()
+        replies = {}
+        self.sent_times = {}
+        attempts = collections.defaultdict(int)
+        targets = self.targets = collections.deque(self.addresses)
+        # Expiration time for each request in flight
+        expirations = []
+        while targets or expirations:
+            now = time.time()
+            while expirations and expirations[0][0] <= now:
+                (_, address) = heapq.heappop(expirations)
+                if address not in replies and attempts[address] < self.checks:
+                    # Send the request again
+                    targets.append(address)
+            if not targets and not expirations:
+                break
+            (readable, writable, _) = select.select(
+                [self.socket],
+                [self.socket] if targets else [],
+                [],
+                0.01 if targets else max(expirations[0][0] - now, 0))
+            if readable:
+                for address in self.receive_replies(replies):
+                    if attempts[address] == 1:
+                        # Only the replies to a single request give a
+                        # certain round trip time (Karn's algorithm)
+                        estimators[address].update(
+                            time.time() - self.sent_times[address])
+            if writable:
+                for index in range(min(SEND_BATCH, len(targets))):
+                    if self.controller.rate_limiter:
+                        # Await the packets rate ceiling
+                        self.controller.rate_limiter.wait()
+                    address = targets[0]
+                    try:
+                        self.send_request(address)
+                    except socket.error as error:
+                        if error.errno in SOCKET_BUSY_ERRORS:
+                            # Wait for the socket to send the queued data
+                            break
+                        self.settings.log_verbose(
+                            'Unable to send request to '
+                            '{address}: {error}'.format(address=address,
+                                                        error=error))
+                    targets.popleft()
+                    now = time.time()
+                    self.sent_times[address] = now
+                    attempts[address] += 1
+                    heapq.heappush(expirations,
+                                   (now + estimators[address].get_rto(),
+                                    address))
+        for estimator in set(estimators.values()):
+            if estimator.samples:
+                self.settings.log_verbose_max(
+                    '{tool} round trip time {srtt:.3f} ms, '
+                    'retransmission timeout {rto:.3f} ms'.format(
+                        tool=self.__class__.__name__,
+                        srtt=estimator.srtt * 1000,
+                        rto=estimator.get_rto() * 1000))
+        return replies
+
+    def get_estimators(self):
+        """Get the round trip times estimator for each address"""
+        default = RttEstimator(max_rto=self.timeout or DEFAULT_TIMEOUT)
+        estimators = {}
+        for address in self.addresses:
+            estimators[address] = next(
+                (estimator for (addresses, estimator) in self.estimators or ()
+                 if address in addresses), default)
+        return estimators
+
+    def receive_replies(self, replies):
+        """Receive all the available replies and return the new addresses"""
+        addresses = []
+        while True:
+            try:
+                reply = self.receive_reply()
+            except socket.error as error:
+                if error.errno in SOCKET_BUSY_ERRORS:
+                    # No more replies available
+                    return addresses
+                raise
+            if (reply is not None and reply[0] not in replies and
+                    reply[0] in self.sent_times):
+                replies[reply[0]] = reply[1]
+                addresses.append(reply[0])
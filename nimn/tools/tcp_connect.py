@@ -0,0 +1,268 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import collections
+import errno
+import heapq
+import select
+import socket
+import threading
+import time
+
+try:
+    import selectors
+except ImportError:
+    # selectors is not available on Python 2
+    selectors = None
+
+from .managed_queue import ManagedQueue
+from .tool_results import ToolResults
+from ..constants import TOOL_TCP
+from .. import profiler
+from ..metrics import record_probe
+
+# Default seconds to wait for each connection
+DEFAULT_TIMEOUT = 1.0
+# Default max connections in progress
+DEFAULT_MAX_SOCKETS = 256
+# Max connections in progress without selectors, below FD_SETSIZE
+MAX_SELECT_SOCKETS = 512
+# Errors for a connection still in progress
+CONNECT_PENDING_ERRORS = (errno.EINPROGRESS, errno.EWOULDBLOCK,
+                          errno.EALREADY)
+# Errors for a process without free file descriptors
+SOCKET_LIMIT_ERRORS = (errno.EMFILE, errno.ENFILE)
+
+
+def parse_ports(ports):
+    """
+    Parse the TCP ports as numbers or ranges separated by ,
+    (e.g. 22,80,8000-8010)
+    """
+    results = []
+    for item in ports.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        (first, _, last) = item.partition('-')
+        if not first.isdigit() or not (last or first).isdigit():
+            raise ValueError('Invalid port: {item}'.format(item=item))
+        for port in range(int(first), int(last or first) + 1):
+            if not 0 < port < 65536:
+                raise ValueError('Invalid port: {port}'.format(port=port))
+            if port not in results:
+                results.append(port)
+    if not results:
+        raise ValueError('No ports')
+    return tuple(results)
+
+
+class TcpConnect(ManagedQueue):
+    """
+    Check the hosts with non-blocking TCP connections to each port, a host
+    accepting (SYN-ACK) or refusing (RST) the connection is alive
+    """
+    name = TOOL_TCP
+
+    def __init__(self, settings):
+        ManagedQueue.__init__(self, self.do_process, settings)
+        self.settings = settings
+        # Ports to check, no checks without ports
+        self.ports = ()
+        self.port_timeout = DEFAULT_TIMEOUT
+        self.max_sockets = DEFAULT_MAX_SOCKETS
+        self.addresses = []
+        self.targets = collections.deque()
+
+    def do_process(self, address):
+        """Check a single address"""
+        return self.get_connect_results(address,
+                                        self.connect([address]).get(address))
+
+    def prepare(self):
+        self.addresses = []
+        self.targets = collections.deque()
+        self.replies = {}
+        self.results = {}
+        self.thread = None
+
+    def execute(self, data):
+        """Add new data to the queue"""
+        self.addresses.append(data)
+
+    def get_queue_depth(self):
+        """Get the number of connections waiting to be started"""
+        return len(self.targets)
+
+    def start(self):
+        """Start the connections from a background thread"""
+        if not self.addresses or not self.ports:
+            # No connections to start
+            return
+        self.thread = threading.Thread(target=self.connect_all)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def connect_all(self):
+        """Check all the addresses"""
+        with profiler.tracer.span('connect', 'tool', tool=self.name,
+                                  addresses=len(self.addresses),
+                                  ports=len(self.ports)):
+            self.replies = self.connect(self.addresses, self.targets)
+
+    def process(self):
+        """Await the connections for completion"""
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        for address in self.addresses:
+            results = self.get_connect_results(address,
+                                               self.replies.get(address))
+            if self.ports:
+                record_probe(self.name, address, results,
+                             results.latency / 1000.0
+                             if results.latency is not None else None)
+            self.results[address] = results.trim(self.verbose_level)
+        return self.results
+
+    def connect(self, addresses, targets=None):
+        """
+        Connect to the ports of the addresses and return the first reply
+        for each address as (port, connected, seconds), the next port is
+        checked only for the addresses without replies
+        """
+        replies = {}
+        if not self.ports:
+            return replies
+        if targets is None:
+            targets = collections.deque()
+        # Each target is the address and the index of its next port
+        targets.extend((address, 0) for address in addresses)
+        selector = selectors.DefaultSelector() if selectors else None
+        max_sockets = (self.max_sockets if selector
+                       else min(self.max_sockets, MAX_SELECT_SOCKETS))
+        # Connection in progress and its expiration time for each socket
+        connecting = {}
+        expirations = []
+        try:
+            while targets or connecting:
+                while targets and len(connecting) < max_sockets:
+                    (address, index) = targets[0]
+                    if self.controller.rate_limiter:
+                        # Await the packets rate ceiling
+                        self.controller.rate_limiter.wait()
+                    try:
+                        tcp_socket = self.start_connection(address,
+                                                           self.ports[index])
+                    except socket.error as error:
+                        if error.errno in SOCKET_LIMIT_ERRORS and connecting:
+                            # Await some connections to complete
+                            break
+                        raise
+                    targets.popleft()
+                    if tcp_socket is None:
+                        # The connection failed immediately
+                        self.next_port(targets, address, index)
+                        continue
+                    now = time.time()
+                    connecting[tcp_socket] = (address, index, now)
+                    heapq.heappush(expirations,
+                                   (now + self.port_timeout, id(tcp_socket),
+                                    tcp_socket))
+                    if selector:
+                        selector.register(tcp_socket, selectors.EVENT_WRITE)
+                if not connecting:
+                    continue
+                timeout = max(expirations[0][0] - time.time(), 0)
+                if selector:
+                    completed = [key.fileobj
+                                 for (key, _) in selector.select(timeout)]
+                else:
+                    (_, writable, failed) = select.select(
+                        [], list(connecting), list(connecting), timeout)
+                    completed = set(writable + failed)
+                now = time.time()
+                for tcp_socket in completed:
+                    (address, index, started) = connecting.pop(tcp_socket)
+                    error = tcp_socket.getsockopt(socket.SOL_SOCKET,
+                                                  socket.SO_ERROR)
+                    if error in (0, errno.ECONNREFUSED):
+                        # Both an accepted and a refused connection are
+                        # replies from the host
+                        replies[address] = (self.ports[index],
+                                            not error,
+                                            now - started)
+                    else:
+                        self.next_port(targets, address, index)
+                    self.close_connection(selector, tcp_socket)
+                while expirations and (expirations[0][0] <= now or
+                                       expirations[0][2] not in connecting):
+                    (_, _, tcp_socket) = heapq.heappop(expirations)
+                    if tcp_socket in connecting:
+                        # No reply before the timeout
+                        (address, index, _) = connecting.pop(tcp_socket)
+                        self.next_port(targets, address, index)
+                        self.close_connection(selector, tcp_socket)
+        finally:
+            for tcp_socket in connecting:
+                self.close_connection(selector, tcp_socket)
+            if selector:
+                selector.close()
+        return replies
+
+    def start_connection(self, address, port):
+        """
+        Start a non-blocking connection to the port, returns None if the
+        connection failed immediately
+        """
+        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp_socket.setblocking(False)
+        error = tcp_socket.connect_ex((address, port))
+        if error in CONNECT_PENDING_ERRORS or error == 0:
+            return tcp_socket
+        tcp_socket.close()
+        return None
+
+    def close_connection(self, selector, tcp_socket):
+        """Stop watching and close the socket"""
+        if selector:
+            selector.unregister(tcp_socket)
+        tcp_socket.close()
+
+    def next_port(self, targets, address, index):
+        """Add the next port of the address to check, if any"""
+        if index + 1 < len(self.ports):
+            targets.append((address, index + 1))
+
+    def get_connect_results(self, address, reply):
+        """Get the results from the first reply"""
+        command = 'TCP connect to ports {ports}'.format(
+            ports=','.join(str(port) for port in self.ports)) \
+            if self.ports else ''
+        if reply is None:
+            return ToolResults(False, command, b'', b'')
+        (port, connected, seconds) = reply
+        latency = seconds * 1000
+        output = '{status} from {address}:{port} time={latency:.3f} ms'.format(
+            status='Connected' if connected else 'Reset',
+            address=address,
+            port=port,
+            latency=latency).encode('utf-8')
+        return ToolResults(True, command, output, b'', latency)
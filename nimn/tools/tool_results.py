@@ -18,10 +18,67 @@
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
 ##
 
+from ..constants import (TOOL_PING,
+                         TOOL_ARPING,
+                         TOOL_HOSTNAME,
+                         TOOL_TCP,
+                         VERBOSE_LEVEL_HIGH,
+                         VERBOSE_LEVEL_MAX)
+
+
+def is_alive(data):
+    """Check if any tool has found the host alive"""
+    return bool((TOOL_PING in data and data[TOOL_PING].data) or
+                (TOOL_ARPING in data and data[TOOL_ARPING].data) or
+                (TOOL_TCP in data and data[TOOL_TCP].data))
+
+
 class ToolResults(object):
-    def __init__(self, data, command, output, error):
+    __slots__ = ('data', 'command', 'output', 'error', 'latency')
+
+    def __init__(self, data, command, output, error, latency=None):
         self.data = data
         self.command = command
         self.output = output
         self.error = error
+        # Round trip time in milliseconds
+        self.latency = latency
+
+    def trim(self, verbose_level):
+        """Drop the command and the raw output not shown at verbose level"""
+        if verbose_level < VERBOSE_LEVEL_HIGH:
+            self.command = None
+        if verbose_level < VERBOSE_LEVEL_MAX:
+            self.output = None
+        return self
+
+
+class HostResults(object):
+    """Parsed results of all the tools for a host, without raw output"""
+    __slots__ = ('alive', 'latency', 'mac', 'hostname')
+
+    def __init__(self, alive, latency, mac, hostname):
+        self.alive = alive
+        # Round trip time in milliseconds
+        self.latency = latency
+        self.mac = mac
+        self.hostname = hostname
+
+    @staticmethod
+    def from_tools(data):
+        """Get the host results from the results of each tool"""
+        # The hosts dropping ICMP can still reply to the TCP connections
+        ping = (data[TOOL_TCP]
+                if not data[TOOL_PING].data and TOOL_TCP in data
+                else data[TOOL_PING])
+        return HostResults(alive=is_alive(data),
+                           latency=ping.latency,
+                           mac=data[TOOL_ARPING].data,
+                           hostname=data[TOOL_HOSTNAME].data)
 
+    def merge(self, ip, other):
+        """Add the MAC address and the hostname found in other results"""
+        if other.mac is not None:
+            self.mac = other.mac
+        if other.hostname != ip:
+            self.hostname = other.hostname
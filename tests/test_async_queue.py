@@ -0,0 +1,60 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import argparse
+import errno
+import unittest
+
+from nimn.settings import Settings
+from nimn.tools.async_queue import AsyncQueue, asyncio
+
+ADDRESSES = ('192.0.2.1', '192.0.2.2', '192.0.2.3')
+
+
+def get_settings():
+    """Get the settings for a quiet command line"""
+    return Settings(argparse.Namespace(
+        arguments=argparse.Namespace(workers=2, verbose_level=0)))
+
+
+def spawn_failed(address):
+    """Fail like a command that cannot be spawned"""
+    raise OSError(errno.EMFILE, 'Too many open files')
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestAsyncQueue(unittest.TestCase):
+    def test_send_error(self):
+        tool = AsyncQueue(spawn_failed, get_settings())
+        tool.name = 'ping'
+        tool.prepare()
+        for address in ADDRESSES:
+            tool.execute(address)
+        tool.start()
+        results = tool.process()
+        self.assertEqual(sorted(results), list(ADDRESSES))
+        for address in ADDRESSES:
+            self.assertFalse(results[address].data)
+            self.assertIn('Too many open files', results[address].error)
+        self.assertEqual(tool.controller.running, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import argparse
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from nimn import dbhosts
+from nimn.app import Application
+from nimn.settings import Settings
+from nimn.tools.tool_results import HostResults
+
+
+def get_settings():
+    """Get the settings for a quiet command line"""
+    return Settings(argparse.Namespace(
+        arguments=argparse.Namespace(workers=4, verbose_level=0)))
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_hosts = dbhosts.FILE_HOSTS
+        dbhosts.FILE_HOSTS = os.path.join(self.directory, 'hosts.db')
+        self.dbhosts = dbhosts.DBHosts(get_settings())
+
+    def tearDown(self):
+        self.dbhosts.close()
+        dbhosts.FILE_HOSTS = self.file_hosts
+        shutil.rmtree(self.directory)
+
+    def test_scans_from_detections(self):
+        # Detections table before the scans
+        self.dbhosts.cursor.execute('CREATE TABLE "detections" ('
+                                    '  "timestamp" INTEGER NOT NULL,'
+                                    '  "ip" TEXT NOT NULL,'
+                                    '  "mac" TEXT NULL,'
+                                    '  "hostname" TEXT NOT NULL,'
+                                    '  PRIMARY KEY (timestamp, ip)'
+                                    ')')
+        self.dbhosts.cursor.executemany(
+            'INSERT INTO detections VALUES(?, ?, NULL, ?)',
+            ((timestamp, ip, ip) for (timestamp, ip) in (
+                # Long scan over several seconds
+                (1000, '192.0.2.1'),
+                (1001, '192.0.2.2'),
+                (1001, '192.0.2.3'),
+                (1050, '192.0.2.4'),
+                # Next scan without any gap, detecting a host again
+                (1051, '192.0.2.1'),
+                (1051, '192.0.2.2'),
+                # Scan after a gap
+                (2000, '192.0.2.1'))))
+        self.dbhosts.connection.commit()
+        self.dbhosts.update_schema()
+        self.dbhosts.cursor.execute('SELECT id, started, ended, hosts '
+                                    'FROM scans ORDER BY id')
+        scans = [tuple(row) for row in self.dbhosts.cursor.fetchall()]
+        self.assertEqual([scan[1:] for scan in scans],
+                         [(1000, 1050, 4), (1051, 1051, 2),
+                          (2000, 2000, 1)])
+        self.dbhosts.cursor.execute('SELECT scan_id, COUNT(*) '
+                                    'FROM detections GROUP BY scan_id '
+                                    'ORDER BY scan_id')
+        self.assertEqual([tuple(row) for row in
+                          self.dbhosts.cursor.fetchall()],
+                         [(scans[0][0], 4), (scans[1][0], 2),
+                          (scans[2][0], 1)])
+
+    def test_failed_migration(self):
+        self.dbhosts.cursor.execute('CREATE TABLE "detections" ('
+                                    '  "timestamp" INTEGER NOT NULL,'
+                                    '  "ip" TEXT NOT NULL,'
+                                    '  "mac" TEXT NULL,'
+                                    '  "hostname" TEXT NOT NULL,'
+                                    '  PRIMARY KEY (timestamp, ip)'
+                                    ')')
+        # Existing table failing the last migration after its first table
+        self.dbhosts.cursor.execute('CREATE TABLE "events" ("id" INTEGER)')
+        self.dbhosts.connection.commit()
+        self.assertRaises(sqlite3.OperationalError,
+                          self.dbhosts.update_schema)
+        self.dbhosts.cursor.execute('PRAGMA user_version')
+        self.assertEqual(self.dbhosts.cursor.fetchone()[0],
+                         dbhosts.SCHEMA_VERSION - 1)
+        self.dbhosts.cursor.execute('SELECT name FROM sqlite_master '
+                                    'WHERE type="table" AND name="hosts"')
+        self.assertIsNone(self.dbhosts.cursor.fetchone())
+
+
+class TestHostsState(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_hosts = dbhosts.FILE_HOSTS
+        dbhosts.FILE_HOSTS = os.path.join(self.directory, 'hosts.db')
+        self.dbhosts = dbhosts.DBHosts(get_settings())
+        self.dbhosts.create_schema()
+
+    def tearDown(self):
+        self.dbhosts.close()
+        dbhosts.FILE_HOSTS = self.file_hosts
+        shutil.rmtree(self.directory)
+
+    def test_went_silent(self):
+        self.dbhosts.cursor.executemany(
+            'INSERT INTO events '
+            '(scan_id, timestamp, ip, event, mac, hostname) '
+            'VALUES(?, ?, ?, ?, ?, ?)',
+            ((1, 1000, '192.0.2.1', dbhosts.EVENT_FIRST_SEEN,
+              '02:00:00:00:00:01', 'first'),
+             (2, 2000, '192.0.2.1', dbhosts.EVENT_HOSTNAME_CHANGED,
+              '02:00:00:00:00:01', 'second'),
+             (3, 3000, '192.0.2.1', dbhosts.EVENT_WENT_SILENT,
+              None, '192.0.2.1')))
+        self.dbhosts.connection.commit()
+        self.assertEqual(self.dbhosts.get_state(2)['192.0.2.1'],
+                         {dbhosts.MAC_ADDRESS: '02:00:00:00:00:01',
+                          dbhosts.HOSTNAME: 'second'})
+        # The silent host has no MAC address and hostname
+        self.assertEqual(self.dbhosts.get_state(3)['192.0.2.1'],
+                         {dbhosts.MAC_ADDRESS: None,
+                          dbhosts.HOSTNAME: '192.0.2.1'})
+
+    def test_retention(self):
+        self.dbhosts.cursor.executemany(
+            'INSERT INTO events '
+            '(scan_id, timestamp, ip, event, mac, hostname) '
+            'VALUES(?, ?, ?, ?, ?, ?)',
+            ((1, 1000, '192.0.2.1', dbhosts.EVENT_FIRST_SEEN,
+              '02:00:00:00:00:01', 'first'),
+             (2, 2000, '192.0.2.1', dbhosts.EVENT_HOSTNAME_CHANGED,
+              '02:00:00:00:00:01', 'second'),
+             (3, 3000, '192.0.2.1', dbhosts.EVENT_WENT_SILENT,
+              None, '192.0.2.1')))
+        self.dbhosts.connection.commit()
+        self.dbhosts.apply_retention(1)
+        self.dbhosts.cursor.execute('SELECT scan_id FROM events '
+                                    'ORDER BY id')
+        self.assertEqual([row['scan_id']
+                          for row in self.dbhosts.cursor.fetchall()],
+                         [2, 3])
+
+    def test_failed_changes(self):
+        writer = dbhosts.ChangesWriter(get_settings())
+        # The events cannot be saved without their table
+        self.dbhosts.cursor.execute('ALTER TABLE events RENAME TO missing')
+        self.dbhosts.connection.commit()
+        writer.add_detection(scan_id=1,
+                             ip='192.0.2.1',
+                             mac='02:00:00:00:00:01',
+                             hostname='first',
+                             alive=True)
+        writer.flush()
+        self.dbhosts.cursor.execute('ALTER TABLE missing RENAME TO events')
+        self.dbhosts.connection.commit()
+        # The host is still new after the failed batch
+        writer.add_detection(scan_id=2,
+                             ip='192.0.2.1',
+                             mac='02:00:00:00:00:01',
+                             hostname='first',
+                             alive=True)
+        writer.close()
+        self.dbhosts.cursor.execute('SELECT scan_id, event FROM events')
+        self.assertEqual([tuple(row)
+                          for row in self.dbhosts.cursor.fetchall()],
+                         [(2, dbhosts.EVENT_FIRST_SEEN)])
+
+    def scan_storage(self, writer, get_compare):
+        """
+        Save a scan with the host alive and two scans with the host silent,
+        returns the compare status of each scan with the previous scan
+        """
+        application = Application.__new__(Application)
+        results = []
+        previous = None
+        for (mac, alive) in (('02:00:00:00:00:01', True),
+                             (None, False),
+                             (None, False)):
+            scan_id = self.dbhosts.start_scan(network='192.0.2.0/30',
+                                              options=None)
+            compare = get_compare(previous) if previous else {}
+            host = HostResults(alive=alive,
+                               latency=None,
+                               mac=mac,
+                               hostname='192.0.2.1')
+            results.append(application.compare_host('192.0.2.1', host,
+                                                    compare))
+            writer.add_detection(scan_id=scan_id,
+                                 ip='192.0.2.1',
+                                 mac=mac,
+                                 hostname='192.0.2.1',
+                                 alive=alive)
+            writer.flush()
+            previous = scan_id
+        writer.close()
+        return results
+
+    def test_storages_compare(self):
+        settings = get_settings()
+        detections = self.scan_storage(dbhosts.DetectionsWriter(settings),
+                                       self.dbhosts.get_detections)
+        self.assertEqual([result[0] for result in detections],
+                         [None, '-', ' '])
+        self.dbhosts.cursor.execute('DELETE FROM scans')
+        self.dbhosts.connection.commit()
+        changes = self.scan_storage(dbhosts.ChangesWriter(settings),
+                                    self.dbhosts.get_state)
+        self.assertEqual(changes, detections)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import os.path
+import socket
+import struct
+import unittest
+
+from nimn import neighbours
+
+DIR_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+# Dump captured on a host with a reachable gateway, some failed entries,
+# two multicast NOARP entries and a loopback entry, ending with NLMSG_DONE
+FILE_NETLINK = os.path.join(DIR_FIXTURES, 'rtm_getneigh.bin')
+FILE_ARP = os.path.join(DIR_FIXTURES, 'proc_net_arp')
+
+
+class TestNetlinkNeighbours(unittest.TestCase):
+    def setUp(self):
+        with open(FILE_NETLINK, 'rb') as file_dump:
+            self.data = file_dump.read()
+
+    def test_resolved_only(self):
+        self.assertEqual(neighbours.parse_neighbours(self.data),
+                         {'192.0.2.1': '02:FC:00:00:00:05'})
+
+    def test_interface_index(self):
+        self.assertEqual(neighbours.parse_neighbours(self.data, ifindex=4),
+                         {'192.0.2.1': '02:FC:00:00:00:05'})
+        self.assertEqual(neighbours.parse_neighbours(self.data, ifindex=1),
+                         {})
+
+    def test_other_family(self):
+        self.assertEqual(neighbours.parse_neighbours(
+            self.data, family=socket.AF_INET6), {})
+
+    def test_message_types(self):
+        types = neighbours.get_message_types(self.data)
+        self.assertEqual(types[-1], neighbours.NLMSG_DONE)
+        self.assertEqual(set(types[:-1]), set([neighbours.RTM_NEWNEIGH]))
+
+    def test_truncated_dump(self):
+        # A dump cut in the middle of a message must not raise
+        self.assertEqual(neighbours.parse_neighbours(self.data[:-30]),
+                         {'192.0.2.1': '02:FC:00:00:00:05'})
+        self.assertEqual(neighbours.parse_neighbours(b''), {})
+
+    def test_error_message(self):
+        error = neighbours.NLMSG_HEADER.pack(
+            neighbours.NLMSG_HEADER.size + 4,
+            neighbours.NLMSG_ERROR, 0, 1, 0) + struct.pack('=i', -1)
+        self.assertRaises(IOError, neighbours.parse_neighbours, error)
+
+
+class TestProcNeighbours(unittest.TestCase):
+    def test_completed_only(self):
+        self.assertEqual(neighbours.read_proc_arp(filename=FILE_ARP),
+                         {'192.0.2.1': '02:FC:00:00:00:05',
+                          '198.51.100.7': '02:FC:00:00:00:07'})
+
+    def test_interface(self):
+        self.assertEqual(neighbours.read_proc_arp(interface='wlan0',
+                                                  filename=FILE_ARP),
+                         {'198.51.100.7': '02:FC:00:00:00:07'})
+        self.assertEqual(neighbours.read_proc_arp(interface='eth1',
+                                                  filename=FILE_ARP),
+                         {})
+
+    def test_malformed_lines(self):
+        self.assertEqual(neighbours.parse_proc_arp(['', 'garbage line']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
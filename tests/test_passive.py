@@ -0,0 +1,87 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import os
+import os.path
+import tempfile
+import unittest
+
+from nimn import passive
+
+DIR_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+# Capture with ARP announcements, an ARP probe, a DHCP exchange with the
+# client hostname (option 12) and a truncated frame
+FILE_PCAP = os.path.join(DIR_FIXTURES, 'arp_dhcp.pcap')
+# The same capture written with big endian headers
+FILE_PCAP_BIG_ENDIAN = os.path.join(DIR_FIXTURES, 'arp_dhcp_be.pcap')
+HOSTS = [('192.0.2.10', '02:00:00:00:00:0A', None, passive.SOURCE_ARP),
+         ('192.0.2.10', '02:00:00:00:00:0A', None, passive.SOURCE_ARP),
+         ('10.0.0.1', '02:00:00:00:00:0C', None, passive.SOURCE_ARP),
+         # DHCP request with the requested address
+         ('192.0.2.20', '02:00:00:00:00:14', 'laptop', passive.SOURCE_DHCP),
+         # DHCP acknowledge with the assigned address
+         ('192.0.2.20', '02:00:00:00:00:14', 'laptop', passive.SOURCE_DHCP),
+         # The hostname from DHCP is kept for the next ARP packets
+         ('192.0.2.20', '02:00:00:00:00:14', 'laptop', passive.SOURCE_ARP),
+         # Address moved to another MAC address
+         ('192.0.2.10', '02:00:00:00:00:1E', None, passive.SOURCE_ARP)]
+
+
+class TestPassiveListener(unittest.TestCase):
+    def test_capture(self):
+        listener = passive.PassiveListener(settings=None, filename=FILE_PCAP)
+        self.assertEqual(list(listener.listen()), HOSTS)
+        self.assertEqual(listener.hostnames, {'02:00:00:00:00:14': 'laptop'})
+
+    def test_big_endian_capture(self):
+        listener = passive.PassiveListener(settings=None,
+                                           filename=FILE_PCAP_BIG_ENDIAN)
+        self.assertEqual(list(listener.listen()), HOSTS)
+
+    def test_stop(self):
+        listener = passive.PassiveListener(settings=None, filename=FILE_PCAP)
+        hosts = listener.listen()
+        self.assertEqual(next(hosts), HOSTS[0])
+        listener.stop()
+        self.assertEqual(list(hosts), [])
+
+    def test_frames(self):
+        frames = list(passive.read_pcap(FILE_PCAP))
+        self.assertEqual(len(frames), 10)
+        # The ARP probe from an address being checked is skipped
+        self.assertIsNone(passive.parse_frame(frames[2]))
+        # The DHCP discover has no address yet but announces the hostname
+        self.assertEqual(passive.parse_frame(frames[4]),
+                         (None, '02:00:00:00:00:14', 'laptop',
+                          passive.SOURCE_DHCP))
+        self.assertIsNone(passive.parse_frame(frames[-1]))
+
+    def test_invalid_capture(self):
+        (handle, filename) = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, 'wb') as file_pcap:
+                file_pcap.write(b'\x00' * 24)
+            self.assertRaises(ValueError, list, passive.read_pcap(filename))
+        finally:
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import argparse
+import os
+import os.path
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+from nimn import dbhosts
+from nimn.resolver import NEGATIVE_TTL, Resolver
+from nimn.settings import Settings
+from nimn.tools.hostname_resolver import HostnameResolver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks'))
+from fake_resolver import FAKE_TTL, FakeResolver, is_lost    # noqa: E402
+
+# Answered and lost addresses for the default fake resolver loss
+ADDRESS_ANSWERED = '192.0.2.1'
+ADDRESS_LOST = '192.0.2.2'
+
+
+def get_settings():
+    """Get the settings for a quiet command line"""
+    return Settings(argparse.Namespace(
+        arguments=argparse.Namespace(workers=4, verbose_level=0)))
+
+
+class TestResolver(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeResolver(latency=0.001)
+        self.server.start()
+        # Nameserver receiving the queries without any response
+        self.silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.silent.bind(('127.0.0.2', self.server.port))
+
+    def tearDown(self):
+        self.silent.close()
+        self.server.stop()
+
+    def get_resolver(self, nameservers, attempts=1):
+        return Resolver(nameservers, timeout=0.2, attempts=attempts,
+                        port=self.server.port)
+
+    def test_addresses(self):
+        self.assertFalse(is_lost(ADDRESS_ANSWERED, self.server.loss))
+        self.assertTrue(is_lost(ADDRESS_LOST, self.server.loss))
+
+    def test_answers(self):
+        resolver = self.get_resolver(['127.0.0.1'])
+        self.assertEqual(
+            resolver.resolve([ADDRESS_ANSWERED, ADDRESS_LOST]),
+            {ADDRESS_ANSWERED: ('host-192-0-2-1.bench', FAKE_TTL),
+             ADDRESS_LOST: (None, NEGATIVE_TTL)})
+
+    def test_timeout(self):
+        resolver = self.get_resolver(['127.0.0.2'], attempts=2)
+        started = time.time()
+        self.assertEqual(resolver.resolve([ADDRESS_ANSWERED]), {})
+        # Both the attempts must expire
+        self.assertGreaterEqual(time.time() - started, 0.4)
+        self.assertEqual(self.server.queries, 0)
+
+    def test_retry_next_nameserver(self):
+        resolver = self.get_resolver(['127.0.0.2', '127.0.0.1'])
+        started = time.time()
+        self.assertEqual(resolver.resolve([ADDRESS_ANSWERED]),
+                         {ADDRESS_ANSWERED: ('host-192-0-2-1.bench',
+                                             FAKE_TTL)})
+        self.assertGreaterEqual(time.time() - started, 0.2)
+        self.assertEqual(self.server.queries, 1)
+
+    def test_unreachable_nameserver(self):
+        # Sending to the broadcast address fails without SO_BROADCAST
+        resolver = self.get_resolver(['255.255.255.255', '127.0.0.1'])
+        self.assertEqual(resolver.resolve([ADDRESS_ANSWERED]),
+                         {ADDRESS_ANSWERED: ('host-192-0-2-1.bench',
+                                             FAKE_TTL)})
+        resolver = self.get_resolver(['255.255.255.255'], attempts=2)
+        self.assertEqual(resolver.resolve([ADDRESS_ANSWERED]), {})
+
+    def test_no_nameservers(self):
+        self.assertRaises(ValueError, Resolver, [])
+
+
+class TestHostnamesCache(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeResolver(latency=0.001)
+        self.server.start()
+        self.directory = tempfile.mkdtemp()
+        self.file_hosts = dbhosts.FILE_HOSTS
+        dbhosts.FILE_HOSTS = os.path.join(self.directory, 'hosts.db')
+        self.settings = get_settings()
+        self.dbhosts = dbhosts.DBHosts(self.settings)
+        self.dbhosts.create_schema()
+
+    def tearDown(self):
+        self.dbhosts.close()
+        dbhosts.FILE_HOSTS = self.file_hosts
+        shutil.rmtree(self.directory)
+        self.server.stop()
+
+    def resolve(self, addresses):
+        """Resolve the addresses with the hostnames cache"""
+        tool = HostnameResolver(self.settings, self.dbhosts)
+        tool.prepare()
+        for address in addresses:
+            tool.execute(address)
+        tool.resolver = Resolver(['127.0.0.1'], timeout=0.2,
+                                 port=self.server.port)
+        return tool.process()
+
+    def get_expirations(self):
+        self.dbhosts.cursor.execute('SELECT ip, expiration FROM hostnames')
+        return dict((row['ip'], row['expiration'])
+                    for row in self.dbhosts.cursor.fetchall())
+
+    def test_cache(self):
+        now = int(time.time())
+        results = self.resolve([ADDRESS_ANSWERED, ADDRESS_LOST])
+        self.assertEqual(results[ADDRESS_ANSWERED].data,
+                         'host-192-0-2-1.bench')
+        self.assertEqual(results[ADDRESS_LOST].data, ADDRESS_LOST)
+        self.assertEqual(self.server.queries, 2)
+        # The answers TTL and the negative TTL set the expirations
+        expirations = self.get_expirations()
+        self.assertAlmostEqual(expirations[ADDRESS_ANSWERED],
+                               now + FAKE_TTL, delta=2)
+        self.assertAlmostEqual(expirations[ADDRESS_LOST],
+                               now + NEGATIVE_TTL, delta=2)
+        # Both the answers are taken from the cache
+        results = self.resolve([ADDRESS_ANSWERED, ADDRESS_LOST])
+        self.assertEqual(self.server.queries, 2)
+        self.assertEqual(results[ADDRESS_ANSWERED].command, 'hostnames cache')
+        self.assertEqual(results[ADDRESS_ANSWERED].data,
+                         'host-192-0-2-1.bench')
+        self.assertEqual(results[ADDRESS_LOST].command, 'hostnames cache')
+        self.assertEqual(results[ADDRESS_LOST].data, ADDRESS_LOST)
+
+    def test_expired(self):
+        self.dbhosts.set_hostnames([(ADDRESS_ANSWERED, 'expired.bench',
+                                     int(time.time()) - 1)])
+        results = self.resolve([ADDRESS_ANSWERED])
+        self.assertEqual(self.server.queries, 1)
+        self.assertEqual(results[ADDRESS_ANSWERED].command, 'PTR query')
+        self.assertEqual(results[ADDRESS_ANSWERED].data,
+                         'host-192-0-2-1.bench')
+
+
+if __name__ == '__main__':
+    unittest.main()
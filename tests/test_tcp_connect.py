@@ -0,0 +1,139 @@
+##
+#     Project: New in my net
+# Description: Find new devices in my network
+#      Author: Fabio Castelli (Muflone) <muflone@vbsimple.net>
+#   Copyright: 2018 Fabio Castelli
+#     License: GPL-2+
+#  This program is free software; you can redistribute it and/or modify it
+#  under the terms of the GNU General Public License as published by the Free
+#  Software Foundation; either version 2 of the License, or (at your option)
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+#  FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+#  more details.
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+##
+
+import argparse
+import socket
+import time
+import unittest
+
+from nimn.settings import Settings
+from nimn.tools.tcp_connect import TcpConnect, parse_ports
+
+ADDRESS = '127.0.0.1'
+# Seconds to wait for each connection
+TIMEOUT = 0.3
+
+
+def get_settings():
+    """Get the settings for a quiet command line"""
+    return Settings(argparse.Namespace(
+        arguments=argparse.Namespace(workers=4, verbose_level=0)))
+
+
+def get_listener(backlog=5):
+    """Get a listening socket on a free port"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind((ADDRESS, 0))
+    listener.listen(backlog)
+    return listener
+
+
+class TestTcpConnect(unittest.TestCase):
+    def setUp(self):
+        self.sockets = []
+        # Port accepting the connections
+        self.listener = get_listener()
+        self.port_open = self.listener.getsockname()[1]
+        self.sockets.append(self.listener)
+        # Port without listener refusing the connections
+        closed = get_listener()
+        self.port_closed = closed.getsockname()[1]
+        closed.close()
+        # Port with a full accept queue dropping the connections
+        full = get_listener(backlog=0)
+        self.port_full = full.getsockname()[1]
+        self.sockets.append(full)
+        for _ in range(3):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(False)
+            filler.connect_ex((ADDRESS, self.port_full))
+            self.sockets.append(filler)
+        time.sleep(0.1)
+        self.tool = TcpConnect(get_settings())
+        self.tool.port_timeout = TIMEOUT
+
+    def tearDown(self):
+        for item in self.sockets:
+            item.close()
+
+    def test_open(self):
+        self.tool.ports = (self.port_open, )
+        (port, connected, seconds) = self.tool.connect([ADDRESS])[ADDRESS]
+        self.assertEqual(port, self.port_open)
+        self.assertTrue(connected)
+        self.assertLess(seconds, TIMEOUT)
+        results = self.tool.do_process(ADDRESS)
+        self.assertTrue(results.data)
+        self.assertTrue(results.output.startswith(b'Connected from'))
+        self.assertIsNotNone(results.latency)
+
+    def test_refused(self):
+        self.tool.ports = (self.port_closed, )
+        (port, connected, seconds) = self.tool.connect([ADDRESS])[ADDRESS]
+        self.assertEqual(port, self.port_closed)
+        self.assertFalse(connected)
+        # A refused connection is a reply from an alive host
+        results = self.tool.do_process(ADDRESS)
+        self.assertTrue(results.data)
+        self.assertTrue(results.output.startswith(b'Reset from'))
+
+    def test_timeout(self):
+        self.tool.ports = (self.port_full, )
+        started = time.time()
+        self.assertEqual(self.tool.connect([ADDRESS]), {})
+        self.assertGreaterEqual(time.time() - started, TIMEOUT)
+        results = self.tool.do_process(ADDRESS)
+        self.assertFalse(results.data)
+        self.assertIsNone(results.latency)
+
+    def test_next_port(self):
+        # The next port is checked after the timeout
+        self.tool.ports = (self.port_full, self.port_open)
+        self.assertEqual(self.tool.connect([ADDRESS])[ADDRESS][:2],
+                         (self.port_open, True))
+
+    def test_process(self):
+        self.tool.ports = (self.port_full, self.port_closed)
+        self.tool.max_sockets = 1
+        self.tool.prepare()
+        for address in (ADDRESS, '127.0.0.2'):
+            self.tool.execute(address)
+        self.tool.start()
+        results = self.tool.process()
+        self.assertEqual(sorted(results), [ADDRESS, '127.0.0.2'])
+        self.assertTrue(all(result.data for result in results.values()))
+
+    def test_no_ports(self):
+        self.assertEqual(self.tool.connect([ADDRESS]), {})
+        self.assertFalse(self.tool.do_process(ADDRESS).data)
+
+
+class TestParsePorts(unittest.TestCase):
+    def test_ports(self):
+        self.assertEqual(parse_ports('22, 80,8000-8002,80'),
+                         (22, 80, 8000, 8001, 8002))
+
+    def test_invalid(self):
+        for ports in ('', 'http', '0', '65536', '10-x'):
+            self.assertRaises(ValueError, parse_ports, ports)
+
+
+if __name__ == '__main__':
+    unittest.main()